@@ -0,0 +1,163 @@
+"""
+Booking contention stress test.
+
+Runs the previous read-check-then-write booking flow and the atomic claim in
+services.appointments against fresh databases and reports double bookings and
+throughput for two scenarios:
+  hot     every client races for the same handful of popular slots
+  spread  every client books its own slots concurrently (pure booking cost)
+
+    python -m benchmarks.booking_contention --clients 50 --slots 20
+"""
+import argparse
+import json
+import os
+import random
+import tempfile
+import threading
+import time
+from collections import Counter
+from datetime import date, datetime, time as time_type
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database-url", help="Base database URL (default: temporary SQLite files)")
+    parser.add_argument("--clients", type=int, default=50)
+    parser.add_argument("--slots", type=int, default=20, help="Popular slots in the hot scenario")
+    parser.add_argument("--per-client", type=int, default=10, help="Own slots per client in the spread scenario")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", default=os.path.join(RESULTS_DIR, "booking_contention.json"))
+    return parser.parse_args()
+
+def legacy_book(db, database, patient_id, slot_id):
+    """The read-check-then-write flow book_appointment used before the atomic claim"""
+    slot = db.query(database.AppointmentSlot).filter(database.AppointmentSlot.id == slot_id).first()
+    if not slot or not slot.is_available:
+        return False
+    patient = db.query(database.Patient).filter(database.Patient.id == patient_id).first()
+    if not patient:
+        return False
+    existing = db.query(database.Appointment).filter(database.Appointment.slot_id == slot_id).first()
+    if existing:
+        return False
+    appointment = database.Appointment(patient_id=patient_id, slot_id=slot_id, booked_at=datetime.now())
+    db.add(appointment)
+    slot.is_available = False
+    db.flush()
+    database.record_change(db, "appointments", "INSERT", appointment.id)
+    database.record_change(db, "appointment_slots", "UPDATE", slot.id)
+    return True
+
+def atomic_book(db, database, patient_id, slot_id):
+    from fastapi import HTTPException
+    from services.appointments import book_slot
+    try:
+        book_slot(db, patient_id, slot_id)
+        return True
+    except HTTPException:
+        return False
+
+def run(scenario, mode, book, url, args):
+    from sqlalchemy import create_engine, func
+    from sqlalchemy.orm import sessionmaker
+    from db import database
+
+    slot_count = args.slots if scenario == "hot" else args.clients * args.per_client
+    engine = create_engine(url, connect_args={"timeout": 30} if url.startswith("sqlite") else {})
+    database.Base.metadata.drop_all(engine)
+    database.Base.metadata.create_all(engine)
+    Session = sessionmaker(bind=engine)
+
+    with engine.begin() as conn:
+        conn.execute(database.Doctor.__table__.insert(), [{"id": 1, "name": "Dr. Popular", "specialty": "Cardiology"}])
+        conn.execute(database.Patient.__table__.insert(), [
+            {"id": i, "name": f"Patient {i}", "email": f"p{i}@example.com"} for i in range(1, args.clients + 1)
+        ])
+        conn.execute(database.AppointmentSlot.__table__.insert(), [
+            {"id": i, "doctor_id": 1, "date": date(2025, 11, 3), "start_time": time_type(9, 0),
+             "end_time": time_type(9, 20), "is_available": True}
+            for i in range(1, slot_count + 1)
+        ])
+
+    outcomes = Counter()
+    lock = threading.Lock()
+    barrier = threading.Barrier(args.clients)
+
+    def client(patient_id):
+        if scenario == "hot":
+            order = list(range(1, slot_count + 1))
+            random.Random(args.seed + patient_id).shuffle(order)
+        else:
+            first = (patient_id - 1) * args.per_client + 1
+            order = list(range(first, first + args.per_client))
+        barrier.wait()
+        for slot_id in order:
+            db = Session()
+            try:
+                result = "booked" if book(db, database, patient_id, slot_id) else "rejected"
+                db.commit()
+            except Exception:
+                db.rollback()
+                result = "error"
+            finally:
+                db.close()
+            with lock:
+                outcomes[result] += 1
+
+    threads = [threading.Thread(target=client, args=(i,)) for i in range(1, args.clients + 1)]
+    started = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - started
+
+    with Session() as db:
+        per_slot = db.query(database.Appointment.slot_id, func.count(database.Appointment.id)).group_by(
+            database.Appointment.slot_id
+        ).all()
+    engine.dispose()
+
+    attempts = sum(outcomes.values())
+    result = {
+        "scenario": scenario,
+        "mode": mode,
+        "attempts": attempts,
+        "booked": outcomes["booked"],
+        "rejected": outcomes["rejected"],
+        "errors": outcomes["error"],
+        "double_bookings": sum(count - 1 for _, count in per_slot if count > 1),
+        "seconds": round(elapsed, 3),
+        "attempts_per_sec": round(attempts / elapsed, 1),
+        "bookings_per_sec": round(outcomes["booked"] / elapsed, 1),
+    }
+    print(f"   {scenario:<7} {mode:<8} booked={result['booked']:<4} double={result['double_bookings']:<4} "
+          f"errors={result['errors']:<4} {result['attempts_per_sec']:>8} attempts/s")
+    return result
+
+def main():
+    args = parse_args()
+    workdir = tempfile.mkdtemp()
+    os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(workdir, 'app.db')}")
+
+    print(f"🏁 {args.clients} clients, {args.slots} hot slots, {args.per_client} own slots each")
+    results = []
+    for scenario in ["hot", "spread"]:
+        for mode, book in [("legacy", legacy_book), ("atomic", atomic_book)]:
+            url = args.database_url or f"sqlite:///{os.path.join(workdir, f'{scenario}_{mode}.db')}"
+            results.append(run(scenario, mode, book, url, args))
+
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    with open(args.output, "w") as f:
+        json.dump({
+            "clients": args.clients,
+            "hot_slots": args.slots,
+            "per_client": args.per_client,
+            "results": results
+        }, f, indent=2)
+    print(f"✅ Results written to {args.output}")
+
+if __name__ == "__main__":
+    main()
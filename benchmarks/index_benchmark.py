@@ -0,0 +1,211 @@
+"""
+Measure the hot booking/cancellation queries before and after the index
+migration on a seeded database.
+
+Seeds a fresh database without secondary indexes, records query plans and
+latencies, applies db.migrations.migrate() the way an existing deployment
+would, then measures again and writes the comparison as JSON.
+
+    python -m benchmarks.index_benchmark --slots 3000000
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import tempfile
+import time
+from datetime import date, datetime, time as time_type, timedelta
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database-url", help="Target database (default: a temporary SQLite file)")
+    parser.add_argument("--doctors", type=int, default=200)
+    parser.add_argument("--slots", type=int, default=3_000_000)
+    parser.add_argument("--booking-rate", type=float, default=0.4)
+    parser.add_argument("--cancellation-rate", type=float, default=0.1)
+    parser.add_argument("--repeat", type=int, default=20, help="Timed runs per query")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", default=os.path.join(RESULTS_DIR, "index_bench.json"))
+    return parser.parse_args()
+
+def seed(engine, database, args):
+    """Bulk-insert doctors, slots, appointments, cancellations and changes with executemany batches"""
+    rng = random.Random(args.seed)
+    batch = 50_000
+    start_day = date(2025, 1, 1)
+    slots_per_day = 16
+    with engine.begin() as conn:
+        conn.execute(database.Doctor.__table__.insert(), [
+            {"id": i, "name": f"Dr. {i}", "specialty": f"Specialty {i % 12}"}
+            for i in range(1, args.doctors + 1)
+        ])
+        conn.execute(database.Patient.__table__.insert(), [
+            {"id": i, "name": f"Patient {i}", "email": f"patient{i}@example.com"}
+            for i in range(1, args.doctors * 50 + 1)
+        ])
+
+    slot_rows, appointment_rows, cancellation_rows = [], [], []
+    appointment_id = cancellation_id = 0
+    booked_at = datetime(2024, 12, 1)
+
+    def flush(conn):
+        if slot_rows:
+            conn.execute(database.AppointmentSlot.__table__.insert(), slot_rows)
+        if appointment_rows:
+            conn.execute(database.Appointment.__table__.insert(), appointment_rows)
+        if cancellation_rows:
+            conn.execute(database.Cancellation.__table__.insert(), cancellation_rows)
+        slot_rows.clear(); appointment_rows.clear(); cancellation_rows.clear()
+
+    with engine.begin() as conn:
+        for slot_id in range(1, args.slots + 1):
+            index = slot_id - 1
+            doctor_id = index % args.doctors + 1
+            day_index, slot_index = divmod(index // args.doctors, slots_per_day)
+            start = datetime.combine(date.min, time_type(8, 0)) + timedelta(minutes=30 * slot_index)
+            booked = rng.random() < args.booking_rate
+            slot_rows.append({
+                "id": slot_id,
+                "doctor_id": doctor_id,
+                "date": start_day + timedelta(days=day_index),
+                "start_time": start.time(),
+                "end_time": (start + timedelta(minutes=30)).time(),
+                "is_available": not booked
+            })
+            if booked:
+                appointment_id += 1
+                appointment_rows.append({
+                    "id": appointment_id,
+                    "patient_id": rng.randint(1, args.doctors * 50),
+                    "slot_id": slot_id,
+                    "booked_at": booked_at
+                })
+                if rng.random() < args.cancellation_rate:
+                    cancellation_id += 1
+                    cancellation_rows.append({
+                        "id": cancellation_id,
+                        "appointment_id": appointment_id,
+                        "reason": "Benchmark",
+                        "cancelled_at": booked_at
+                    })
+            if len(slot_rows) >= batch:
+                flush(conn)
+        flush(conn)
+        conn.execute(database.Change.__table__.insert(), [
+            {"table_name": rng.choice(["doctors", "patients", "appointment_slots", "appointments", "cancellations"]),
+             "action": "UPDATE", "record_id": i}
+            for i in range(1, 200_001)
+        ])
+    return {"appointments": appointment_id, "cancellations": cancellation_id}
+
+def hot_queries(args, counts):
+    """The query shapes used by get_doctor_slots, book_appointment, check_cancellation and the change feed"""
+    last_day = date(2025, 1, 1) + timedelta(days=args.slots // (args.doctors * 16))
+    mid_day = date(2025, 1, 1) + timedelta(days=(last_day - date(2025, 1, 1)).days // 2)
+    return {
+        "doctor_slots": (
+            "SELECT id, date, start_time, end_time, is_available FROM appointment_slots "
+            "WHERE doctor_id = :doctor_id AND date >= :start AND date <= :end AND is_available = 1 "
+            "ORDER BY date, start_time",
+            {"doctor_id": args.doctors // 2, "start": mid_day, "end": mid_day + timedelta(days=14)}
+        ),
+        "available_on_date": (
+            "SELECT COUNT(*) FROM appointment_slots WHERE is_available = 1 AND date = :day",
+            {"day": mid_day}
+        ),
+        "appointment_by_slot": (
+            "SELECT id FROM appointments WHERE slot_id = :slot_id",
+            {"slot_id": args.slots // 2}
+        ),
+        "cancellation_by_appointment": (
+            "SELECT id FROM cancellations WHERE appointment_id = :appointment_id",
+            {"appointment_id": max(counts["appointments"] // 2, 1)}
+        ),
+        "change_feed": (
+            "SELECT id, action, record_id, payload FROM changes "
+            "WHERE table_name = :table_name AND id > :last_id ORDER BY id LIMIT 501",
+            {"table_name": "appointments", "last_id": 199_000}
+        ),
+    }
+
+def explain(conn, sql, params):
+    from sqlalchemy import text
+    prefix = "EXPLAIN QUERY PLAN " if conn.dialect.name == "sqlite" else "EXPLAIN "
+    return [" | ".join(str(v) for v in row) for row in conn.execute(text(prefix + sql), params)]
+
+def measure(engine, queries, repeat):
+    from sqlalchemy import text
+    results = {}
+    with engine.connect() as conn:
+        for name, (sql, params) in queries.items():
+            timings = []
+            for _ in range(repeat):
+                started = time.perf_counter()
+                conn.execute(text(sql), params).fetchall()
+                timings.append((time.perf_counter() - started) * 1000)
+            results[name] = {
+                "plan": explain(conn, sql, params),
+                "p50_ms": round(statistics.median(timings), 3),
+                "max_ms": round(max(timings), 3),
+            }
+            print(f"   {name:<28} p50={results[name]['p50_ms']:>10.3f} ms")
+    return results
+
+def main():
+    args = parse_args()
+    database_url = args.database_url
+    if not database_url:
+        database_url = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'index_bench.db')}"
+    os.environ["DATABASE_URL"] = database_url
+
+    from db import database, migrations
+    engine = database.init_engine(database_url)
+    database.Base.metadata.create_all(engine)
+
+    # Start from the pre-index schema an existing deployment would have
+    with engine.begin() as conn:
+        for table in database.Base.metadata.sorted_tables:
+            for index in table.indexes:
+                index.drop(conn, checkfirst=True)
+    print(f"🌱 Seeding {args.slots:,} slots into {database_url}")
+    started = time.perf_counter()
+    counts = seed(engine, database, args)
+    seed_seconds = time.perf_counter() - started
+    print(f"   seeded in {seed_seconds:.1f}s")
+
+    queries = hot_queries(args, counts)
+    print("📉 Before migration")
+    before = measure(engine, queries, args.repeat)
+
+    started = time.perf_counter()
+    applied = migrations.migrate(engine)
+    migrate_seconds = time.perf_counter() - started
+
+    print("📈 After migration")
+    after = measure(engine, queries, args.repeat)
+
+    report = {
+        "database": engine.dialect.name,
+        "scale": {"doctors": args.doctors, "slots": args.slots, **counts},
+        "seed_seconds": round(seed_seconds, 2),
+        "migrations_applied": applied,
+        "migrate_seconds": round(migrate_seconds, 2),
+        "queries": {
+            name: {
+                "before": before[name],
+                "after": after[name],
+                "speedup": round(before[name]["p50_ms"] / after[name]["p50_ms"], 1) if after[name]["p50_ms"] else None
+            }
+            for name in queries
+        }
+    }
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"✅ Results written to {args.output}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,354 @@
+"""
+Load test for the scheduling API.
+
+Seeds a SQLite database at the requested scale with db.seed, starts the
+app under uvicorn in a separate process and drives it with concurrent HTTP
+clients running a weighted mix of availability searches, bookings, cancellations,
+list pages and analytics. Reports throughput and p50/p95/p99 latency per
+operation and writes them as JSON, tagged with the git commit, so runs can
+be compared across commits:
+
+    python -m benchmarks.load_test --slots 2000000 --concurrency 32 --duration 60
+    python -m benchmarks.load_test --compare benchmarks/results/load_test_old.json
+
+Pass --database-url with --skip-seed to reuse a seeded database, and
+--base-url to drive a server that is already running against it.
+"""
+import argparse
+import asyncio
+import json
+import math
+import os
+import platform
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join(ROOT, "benchmarks", "results")
+
+# Operation -> relative weight in the default mix
+DEFAULT_MIX = {
+    "search_availability": 15,
+    "doctor_slots": 10,
+    "next_available": 5,
+    "book": 15,
+    "cancel": 5,
+    "list_doctors": 5,
+    "list_slots": 10,
+    "appointments_view": 15,
+    "cancellation_analytics": 5,
+    "dashboard": 10,
+    "capacity": 5,
+}
+
+def parse_mix(value):
+    mix = dict(DEFAULT_MIX)
+    for item in filter(None, value.split(",")):
+        name, _, weight = item.partition("=")
+        if name not in DEFAULT_MIX:
+            raise argparse.ArgumentTypeError(f"unknown operation {name!r}; choose from {', '.join(DEFAULT_MIX)}")
+        mix[name] = float(weight)
+    return {name: weight for name, weight in mix.items() if weight > 0}
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database-url", help="SQLite database to seed and serve (default: a temporary file)")
+    parser.add_argument("--skip-seed", action="store_true", help="Reuse the data already in --database-url")
+    parser.add_argument("--base-url", help="Drive a server that is already running instead of starting one")
+    parser.add_argument("--doctors", type=int, default=100)
+    parser.add_argument("--patients", type=int, default=5000)
+    parser.add_argument("--slots", type=int, default=200_000)
+    parser.add_argument("--history-days", type=int, default=14,
+                        help="Days of past schedule; the rest of --slots is bookable")
+    parser.add_argument("--booking-rate", type=float, help="Default: db.seed's")
+    parser.add_argument("--cancellation-rate", type=float, help="Default: db.seed's")
+    parser.add_argument("--concurrency", type=int, default=16, help="Concurrent clients")
+    parser.add_argument("--duration", type=float, default=30, help="Measured seconds")
+    parser.add_argument("--warmup", type=float, default=3, help="Seconds of load before measuring")
+    parser.add_argument("--mix", type=parse_mix, default=dict(DEFAULT_MIX),
+                        help="Weight overrides, e.g. book=30,dashboard=0")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", default=os.path.join(RESULTS_DIR, "load_test.json"))
+    parser.add_argument("--compare", help="Earlier result file to print deltas against")
+    return parser.parse_args()
+
+def scale(engine, database):
+    from sqlalchemy import select, func
+    with engine.connect() as conn:
+        counts = {
+            name: conn.execute(select(func.count()).select_from(model.__table__)).scalar()
+            for name, model in [("doctors", database.Doctor), ("patients", database.Patient),
+                                ("slots", database.AppointmentSlot), ("appointments", database.Appointment),
+                                ("cancellations", database.Cancellation)]
+        }
+        last_day = conn.execute(select(func.max(database.AppointmentSlot.date))).scalar()
+    return counts, last_day
+
+def prepare(args):
+    """Seed (unless skipped) and collect the ids and dates the clients pick from"""
+    from sqlalchemy import select
+    from db import database, seed
+    engine = database.init_engine(os.environ["DATABASE_URL"])
+    database.init_db(engine)
+    if not args.skip_seed:
+        print(f"🌱 Seeding {args.doctors} doctors, {args.patients} patients, {args.slots:,} slots")
+        counts, seconds = seed.load(engine, seed.default_options(
+            seed=args.seed,
+            doctors=args.doctors,
+            patients=args.patients,
+            slots=args.slots,
+            history_days=args.history_days,
+            booking_rate=args.booking_rate,
+            cancellation_rate=args.cancellation_rate
+        ))
+        print(f"   seeded {sum(counts.values()):,} rows in {seconds:.1f}s")
+
+    counts, last_day = scale(engine, database)
+    rng = random.Random(args.seed)
+    slots = database.AppointmentSlot.__table__
+    appointments = database.Appointment.__table__
+    cancellations = database.Cancellation.__table__
+    with engine.connect() as conn:
+        free_slots = conn.execute(
+            select(slots.c.id).where(slots.c.is_available == True, slots.c.date > date.today())
+        ).scalars().all()
+        open_appointments = conn.execute(
+            select(appointments.c.id).where(
+                appointments.c.id.notin_(select(cancellations.c.appointment_id))
+            )
+        ).scalars().all()
+        specialties = sorted(set(conn.execute(select(database.Doctor.specialty)).scalars()))
+    engine.dispose()
+    rng.shuffle(free_slots)
+    rng.shuffle(open_appointments)
+    return {
+        "scale": counts,
+        "first_day": date.today() + timedelta(days=1),
+        "last_day": last_day or date.today(),
+        "doctors": counts["doctors"],
+        "patients": counts["patients"],
+        "specialties": specialties or ["General Practice"],
+        "reasons": [reason for reason, _ in seed.CANCELLATION_REASONS if reason],
+        "free_slots": free_slots,
+        "open_appointments": open_appointments,
+    }
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def start_server(database_url, log_path):
+    port = free_port()
+    env = dict(os.environ, DATABASE_URL=database_url)
+    log = open(log_path, "w")
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning"],
+        cwd=ROOT, env=env, stdout=log, stderr=subprocess.STDOUT
+    )
+    return process, f"http://127.0.0.1:{port}"
+
+async def wait_ready(client, base_url, process=None, timeout=120):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process is not None and process.poll() is not None:
+            raise RuntimeError("server exited during startup")
+        try:
+            if (await client.get(f"{base_url}/pool-stats")).status_code == 200:
+                return
+        except Exception:
+            pass
+        await asyncio.sleep(0.2)
+    raise RuntimeError(f"server at {base_url} not ready after {timeout}s")
+
+def request_for(op, rng, state):
+    """(method, path, params, form data) for one operation, or None if it has nothing left to act on"""
+    span = max((state["last_day"] - state["first_day"]).days, 0)
+    day = state["first_day"] + timedelta(days=rng.randint(0, span))
+    week = {"start_date": str(day), "end_date": str(day + timedelta(days=7))}
+    specialty = rng.choice(state["specialties"])
+    doctor_id = rng.randint(1, max(state["doctors"], 1))
+    if op == "search_availability":
+        return "GET", "/booking/search-availability", {"specialty": specialty, **week}, None
+    if op == "doctor_slots":
+        return "GET", f"/booking/doctor-slots/{doctor_id}", week, None
+    if op == "next_available":
+        return "GET", "/booking/next-available", {"specialty": specialty}, None
+    if op == "book":
+        if not state["free_slots"]:
+            return None
+        data = {"patient_id": rng.randint(1, max(state["patients"], 1)), "slot_id": state["free_slots"].pop()}
+        return "POST", "/booking/book-appointment", None, data
+    if op == "cancel":
+        if not state["open_appointments"]:
+            return None
+        data = {"appointment_id": state["open_appointments"].pop(), "reason": rng.choice(state["reasons"])}
+        return "POST", "/appointments/cancel", None, data
+    if op == "list_doctors":
+        return "GET", "/doctors/list", {"limit": 50, "specialty": specialty}, None
+    if op == "list_slots":
+        return "GET", "/appointment_slots/list", {"limit": 50, "doctor_id": doctor_id}, None
+    if op == "appointments_view":
+        return "GET", "/appointments/view", {"limit": 50, "start_date": week["start_date"]}, None
+    if op == "cancellation_analytics":
+        return "GET", "/cancellations/analytics", None, None
+    if op == "dashboard":
+        return "GET", "/dashboard/summary", None, None
+    if op == "capacity":
+        return "GET", "/booking/capacity-analysis", week, None
+    raise ValueError(op)
+
+async def worker(number, client, base_url, args, state, samples, measure_from, stop_at):
+    rng = random.Random(args.seed * 1000 + number)
+    ops, weights = list(args.mix), list(args.mix.values())
+    while time.monotonic() < stop_at:
+        op = rng.choices(ops, weights)[0]
+        request = request_for(op, rng, state)
+        if request is None:
+            continue
+        method, path, params, data = request
+        started = time.monotonic()
+        try:
+            response = await client.request(method, base_url + path, params=params, data=data)
+            await response.aread()
+            status = response.status_code
+        except Exception:
+            status = None
+        finished = time.monotonic()
+        if op == "book" and status == 200:
+            state["open_appointments"].append(response.json()["appointment_id"])
+        if started >= measure_from:
+            samples[op].append((finished - started, status))
+
+async def drive(args, state, base_url, process=None):
+    import httpx
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    async with httpx.AsyncClient(limits=limits, timeout=60) as client:
+        await wait_ready(client, base_url, process)
+        samples = defaultdict(list)
+        start = time.monotonic()
+        measure_from = start + args.warmup
+        stop_at = measure_from + args.duration
+        print(f"🚦 {args.concurrency} clients for {args.warmup:g}s warmup + {args.duration:g}s against {base_url}")
+        await asyncio.gather(*[
+            worker(i, client, base_url, args, state, samples, measure_from, stop_at)
+            for i in range(args.concurrency)
+        ])
+        return samples, time.monotonic() - measure_from
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an ascending list"""
+    if not sorted_values:
+        return 0.0
+    rank = math.ceil(pct / 100 * len(sorted_values))
+    return sorted_values[min(max(rank, 1), len(sorted_values)) - 1]
+
+def summarize(samples, elapsed):
+    operations = {}
+    for op in sorted(samples):
+        latencies = sorted(latency * 1000 for latency, _ in samples[op])
+        statuses = [status for _, status in samples[op]]
+        operations[op] = {
+            "requests": len(statuses),
+            "ok": sum(1 for s in statuses if s is not None and s < 400),
+            # 4xx are expected outcomes under load (e.g. a slot taken by another client)
+            "rejected": sum(1 for s in statuses if s is not None and 400 <= s < 500),
+            "errors": sum(1 for s in statuses if s is None or s >= 500),
+            "rps": round(len(statuses) / elapsed, 1),
+            "mean_ms": round(sum(latencies) / len(latencies), 2),
+            "p50_ms": round(percentile(latencies, 50), 2),
+            "p95_ms": round(percentile(latencies, 95), 2),
+            "p99_ms": round(percentile(latencies, 99), 2),
+            "max_ms": round(latencies[-1], 2),
+        }
+    total = sum(o["requests"] for o in operations.values())
+    return {
+        "requests": total,
+        "errors": sum(o["errors"] for o in operations.values()),
+        "rps": round(total / elapsed, 1),
+        "seconds": round(elapsed, 2),
+    }, operations
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except Exception:
+        return None
+
+def print_report(totals, operations):
+    print(f"   {'operation':<24}{'req':>8}{'rps':>9}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'errors':>8}")
+    for op, o in operations.items():
+        print(f"   {op:<24}{o['requests']:>8}{o['rps']:>9}{o['p50_ms']:>10}{o['p95_ms']:>10}{o['p99_ms']:>10}{o['errors']:>8}")
+    print(f"   {'total':<24}{totals['requests']:>8}{totals['rps']:>9}{'':>30}{totals['errors']:>8}")
+
+def print_comparison(report, path):
+    with open(path) as f:
+        previous = json.load(f)
+
+    def change(new, old):
+        return f"{(new - old) / old * 100:+.1f}%" if old else "n/a"
+
+    print(f"📊 Against {previous.get('commit')} ({path})")
+    print(f"   {'operation':<24}{'rps':>10}{'p95':>10}{'p99':>10}")
+    for op, o in report["operations"].items():
+        old = previous.get("operations", {}).get(op)
+        if old:
+            print(f"   {op:<24}{change(o['rps'], old['rps']):>10}"
+                  f"{change(o['p95_ms'], old['p95_ms']):>10}{change(o['p99_ms'], old['p99_ms']):>10}")
+    print(f"   {'total':<24}{change(report['totals']['rps'], previous['totals']['rps']):>10}")
+
+def main():
+    args = parse_args()
+    workdir = tempfile.mkdtemp()
+    database_url = args.database_url or f"sqlite:///{os.path.join(workdir, 'load_test.db')}"
+    os.environ["DATABASE_URL"] = database_url
+    sys.path.insert(0, ROOT)
+
+    state = prepare(args)
+    process = None
+    base_url = args.base_url
+    if not base_url:
+        log_path = os.path.join(workdir, "server.log")
+        process, base_url = start_server(database_url, log_path)
+        print(f"🚀 Server log: {log_path}")
+    try:
+        samples, elapsed = asyncio.run(drive(args, state, base_url, process))
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait(timeout=30)
+
+    totals, operations = summarize(samples, elapsed)
+    print_report(totals, operations)
+    report = {
+        "commit": git_commit(),
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "database": database_url.split(":", 1)[0],
+        "scale": state["scale"],
+        "config": {
+            "concurrency": args.concurrency,
+            "duration": args.duration,
+            "warmup": args.warmup,
+            "mix": args.mix,
+            "seed": args.seed,
+        },
+        "totals": totals,
+        "operations": operations,
+    }
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"✅ Results written to {args.output}")
+    if args.compare:
+        print_comparison(report, args.compare)
+
+if __name__ == "__main__":
+    main()
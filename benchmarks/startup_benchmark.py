@@ -0,0 +1,117 @@
+"""
+Import and startup time of the app, the cost every worker pays before it
+can serve a request.
+
+Prepares a database once (schema, plus --slots of sample data from db.seed),
+then starts fresh interpreters that import db.database, import main and run
+the app lifespan (schema check, broadcast, slot index), timing each step.
+Reports the median and worst run per step and writes them as JSON, tagged
+with the git commit:
+
+    python -m benchmarks.startup_benchmark --runs 10
+    python -m benchmarks.startup_benchmark --slots 200000
+
+Pass --database-url to measure against an existing database (it is not
+seeded).
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+from datetime import datetime
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join(ROOT, "benchmarks", "results")
+STEPS = ["import_database", "import_app", "startup"]
+
+# Runs in a fresh interpreter; prints the step timings as its last line
+CHILD = """
+import asyncio, json, time
+started = time.perf_counter()
+import db.database
+imported_database = time.perf_counter()
+import main
+imported_app = time.perf_counter()
+
+async def start():
+    async with main.lifespan(main.app):
+        return time.perf_counter()
+
+ready = asyncio.run(start())
+print(json.dumps({
+    "import_database": imported_database - started,
+    "import_app": imported_app - imported_database,
+    "startup": ready - imported_app,
+}))
+"""
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database-url", help="Database to start against (default: a temporary SQLite file)")
+    parser.add_argument("--runs", type=int, default=5, help="Fresh interpreters to start")
+    parser.add_argument("--slots", type=int, default=0, help="Sample slots to seed first; the slot index loads them")
+    parser.add_argument("--output", default=os.path.join(RESULTS_DIR, "startup.json"))
+    return parser.parse_args()
+
+def prepare(database_url, slots):
+    from db import database, seed
+    engine = database.init_engine(database_url)
+    database.init_db(engine)
+    if slots:
+        counts, seconds = seed.load(engine, seed.default_options(slots=slots))
+        print(f"🌱 Seeded {sum(counts.values()):,} rows in {seconds:.1f}s")
+    engine.dispose()
+
+def run_once(database_url):
+    env = dict(os.environ, DATABASE_URL=database_url)
+    result = subprocess.run([sys.executable, "-c", CHILD], cwd=ROOT, env=env,
+                            capture_output=True, text=True, check=True)
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except Exception:
+        return None
+
+def main():
+    args = parse_args()
+    database_url = args.database_url
+    sys.path.insert(0, ROOT)
+    if not database_url:
+        database_url = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'startup.db')}"
+        prepare(database_url, args.slots)
+
+    print(f"🏁 {args.runs} starts against {database_url.split(':', 1)[0]}")
+    runs = [run_once(database_url) for _ in range(args.runs)]
+    steps = {}
+    for step in STEPS + ["total"]:
+        values = [sum(r.values()) if step == "total" else r[step] for r in runs]
+        steps[step] = {
+            "median_ms": round(statistics.median(values) * 1000, 1),
+            "max_ms": round(max(values) * 1000, 1),
+        }
+    print(f"   {'step':<18}{'median ms':>11}{'max ms':>10}")
+    for step, s in steps.items():
+        print(f"   {step:<18}{s['median_ms']:>11}{s['max_ms']:>10}")
+
+    report = {
+        "commit": git_commit(),
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "database": database_url.split(":", 1)[0],
+        "config": {"runs": args.runs, "slots": args.slots},
+        "steps": steps,
+    }
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"✅ Results written to {args.output}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,149 @@
+"""
+Incrementally maintained capacity rollup behind /booking/capacity-analysis.
+
+doctor_day_capacity keeps, per doctor and day:
+  total_slots             slots on that day
+  available_slots         slots with is_available true
+  booked_slots            slots with is_available false
+  confirmed_appointments  appointment rows pointing at those slots
+
+Every write that creates, moves, books, releases or deletes slots or
+appointments calls adjust()/apply() in its own transaction, so the rollup
+commits or rolls back together with the write. rebuild() recomputes it
+from the raw tables:
+
+    python -m db.capacity
+"""
+from collections import defaultdict
+from sqlalchemy import select, func, case, update, insert, delete, and_, or_
+from db import database
+
+COUNTERS = ["total_slots", "available_slots", "booked_slots", "confirmed_appointments"]
+
+def slot_deltas(is_available, sign=1):
+    """Counter changes for adding (sign=1) or removing (sign=-1) one slot"""
+    return {
+        "total_slots": sign,
+        "available_slots": sign if is_available is True else 0,
+        "booked_slots": sign if is_available is False else 0,
+    }
+
+def new_deltas():
+    return defaultdict(lambda: dict.fromkeys(COUNTERS, 0))
+
+def add(deltas, doctor_id, day, **changes):
+    """Accumulate counter changes for (doctor_id, day) into a deltas mapping"""
+    if doctor_id is None or day is None:
+        return
+    for counter, value in changes.items():
+        deltas[(doctor_id, day)][counter] += value
+
+def adjust(db, doctor_id, day, **changes):
+    """Apply counter changes for one doctor-day in the caller's transaction"""
+    deltas = new_deltas()
+    add(deltas, doctor_id, day, **changes)
+    apply(db, deltas)
+
+def _upsert(dialect_name, table):
+    """One-statement upsert that adds the bound deltas to the existing counters"""
+    if dialect_name == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert as dialect_insert
+        stmt = dialect_insert(table)
+        return stmt.on_conflict_do_update(
+            index_elements=[table.c.doctor_id, table.c.date],
+            set_={c: table.c[c] + stmt.excluded[c] for c in COUNTERS}
+        )
+    if dialect_name in ("mysql", "mariadb"):
+        from sqlalchemy.dialects.mysql import insert as dialect_insert
+        stmt = dialect_insert(table)
+        return stmt.on_duplicate_key_update({c: table.c[c] + stmt.inserted[c] for c in COUNTERS})
+    return None
+
+def apply(db, deltas):
+    """Apply accumulated deltas ({(doctor_id, day): {counter: change}}) in the caller's transaction"""
+    rows = [
+        {"doctor_id": doctor_id, "date": day, **changes}
+        for (doctor_id, day), changes in deltas.items()
+        if any(changes.values())
+    ]
+    if not rows:
+        return
+    table = database.DoctorDayCapacity.__table__
+    stmt = _upsert(db.get_bind().dialect.name, table)
+    if stmt is not None:
+        db.execute(stmt, rows)
+    else:
+        # Portable fallback: update the existing row, insert it if there was none
+        for row in rows:
+            result = db.execute(
+                update(table).where(
+                    table.c.doctor_id == row["doctor_id"],
+                    table.c.date == row["date"]
+                ).values({c: table.c[c] + row[c] for c in COUNTERS})
+            )
+            if result.rowcount == 0:
+                db.execute(insert(table).values(row))
+    # Drop doctor-days left without slots, so the rollup doesn't keep
+    # referencing a doctor who is deleted later
+    emptied = [row for row in rows if row["total_slots"] < 0]
+    if emptied:
+        db.execute(delete(table).where(
+            *[table.c[c] == 0 for c in COUNTERS],
+            or_(*[and_(table.c.doctor_id == row["doctor_id"], table.c.date == row["date"]) for row in emptied])
+        ))
+
+def clear_doctor(db, doctor_id):
+    """Remove a doctor's rollup rows in the caller's transaction, before the doctor is deleted"""
+    table = database.DoctorDayCapacity.__table__
+    db.execute(delete(table).where(table.c.doctor_id == doctor_id))
+
+def availability_changed(db, doctor_id, day, old, new):
+    """Move one slot between the available and booked counters"""
+    if old == new:
+        return
+    changes = slot_deltas(new)
+    for counter, value in slot_deltas(old, -1).items():
+        changes[counter] += value
+    adjust(db, doctor_id, day, **changes)
+
+def appointment_count(db, slot_id):
+    return db.execute(
+        select(func.count(database.Appointment.id)).where(database.Appointment.slot_id == slot_id)
+    ).scalar() or 0
+
+def rebuild(conn):
+    """Recompute the whole rollup from slots and appointments"""
+    slots = database.AppointmentSlot.__table__
+    appointments = database.Appointment.__table__
+    table = database.DoctorDayCapacity.__table__
+
+    deltas = new_deltas()
+    for row in conn.execute(
+        select(
+            slots.c.doctor_id,
+            slots.c.date,
+            func.count(slots.c.id),
+            func.sum(case((slots.c.is_available == True, 1), else_=0)),
+            func.sum(case((slots.c.is_available == False, 1), else_=0))
+        ).where(slots.c.doctor_id.isnot(None)).group_by(slots.c.doctor_id, slots.c.date)
+    ):
+        add(deltas, row[0], row[1], total_slots=row[2], available_slots=row[3] or 0, booked_slots=row[4] or 0)
+    for row in conn.execute(
+        select(slots.c.doctor_id, slots.c.date, func.count(appointments.c.id)).join(
+            appointments, appointments.c.slot_id == slots.c.id
+        ).where(slots.c.doctor_id.isnot(None)).group_by(slots.c.doctor_id, slots.c.date)
+    ):
+        add(deltas, row[0], row[1], confirmed_appointments=row[2])
+
+    conn.execute(table.delete())
+    rows = [{"doctor_id": d, "date": day, **changes} for (d, day), changes in deltas.items()]
+    for i in range(0, len(rows), 5000):
+        conn.execute(table.insert(), rows[i:i + 5000])
+    return len(rows)
+
+if __name__ == "__main__":
+    engine = database.get_engine()
+    database.init_db(engine)
+    with engine.begin() as conn:
+        count = rebuild(conn)
+    print(f"✅ Rebuilt capacity rollup: {count} doctor-days")
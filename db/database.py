@@ -1,14 +1,18 @@
-from sqlalchemy import create_engine, Column, Integer, String, DateTime, Boolean, ForeignKey, Date, Time
+from sqlalchemy import create_engine, Column, Integer, String, DateTime, Boolean, ForeignKey, Date, Time, Text, Index
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import sessionmaker, Session
+from sqlalchemy import event, inspect
 from sqlalchemy.sql import func
+from threading import RLock
 from dotenv import load_dotenv
+from db import pool
+import json
 import os
 
-load_dotenv('.env.local')
-DATABASE_URL = os.getenv('DATABASE_URL')
-
-engine = create_engine(DATABASE_URL)
+# Created on first use (get_engine) or explicitly with init_engine, so importing
+# this module needs neither a database nor its settings
+engine = None
+_engine_lock = RLock()
 Base = declarative_base()
 
 class Doctor(Base):
@@ -32,6 +36,15 @@ class AppointmentSlot(Base):
     end_time = Column(Time, nullable=False)
     is_available = Column(Boolean, default=True)
 
+    __table_args__ = (
+        # get_doctor_slots: doctor + date range, ordered by date/start_time
+        Index('ix_appointment_slots_doctor_date_start', 'doctor_id', 'date', 'start_time'),
+        # availability searches by day
+        Index('ix_appointment_slots_available_date', 'is_available', 'date'),
+        # schedule-ordered appointment views and date-range filters
+        Index('ix_appointment_slots_date_start', 'date', 'start_time'),
+    )
+
 class Appointment(Base):
     __tablename__ = 'appointments'
     id = Column(Integer, primary_key=True)
@@ -39,6 +52,10 @@ class Appointment(Base):
     slot_id = Column(Integer, ForeignKey('appointment_slots.id'))
     booked_at = Column(DateTime, nullable=False)
 
+    __table_args__ = (
+        Index('ix_appointments_slot_id', 'slot_id'),
+    )
+
 class Cancellation(Base):
     __tablename__ = 'cancellations'
     id = Column(Integer, primary_key=True)
@@ -46,17 +63,201 @@ class Cancellation(Base):
     reason = Column(String(255))
     cancelled_at = Column(DateTime, nullable=False)
 
+    __table_args__ = (
+        # An appointment can only be cancelled once
+        Index('uq_cancellations_appointment_id', 'appointment_id', unique=True),
+    )
+
+class DoctorDayCapacity(Base):
+    """Per-doctor, per-day slot counts kept current by every slot/booking write (see db/capacity.py)"""
+    __tablename__ = 'doctor_day_capacity'
+    doctor_id = Column(Integer, ForeignKey('doctors.id'), primary_key=True)
+    date = Column(Date, primary_key=True)
+    total_slots = Column(Integer, nullable=False, default=0)
+    available_slots = Column(Integer, nullable=False, default=0)
+    booked_slots = Column(Integer, nullable=False, default=0)
+    confirmed_appointments = Column(Integer, nullable=False, default=0)
+
 class Change(Base):
     __tablename__ = 'changes'
     id = Column(Integer, primary_key=True)
     table_name = Column(String(50), nullable=False)
     action = Column(String(20), nullable=False)
     record_id = Column(Integer, nullable=False)
+    payload = Column(Text)
     timestamp = Column(DateTime, server_default=func.now())
 
-Base.metadata.create_all(engine)
+    __table_args__ = (
+        # Change feed: WHERE table_name = ? AND id > ?
+        Index('ix_changes_table_id', 'table_name', 'id'),
+    )
+
+def init_engine(url=None):
+    """
+    Create the engine for `url` (default DATABASE_URL, read from the
+    environment or .env.local) and make it the one every session uses.
+    Replaces and disposes of any engine created before, so tests and tools
+    can point the app at another database.
+    """
+    global engine
+    if url is None:
+        load_dotenv('.env.local')
+        url = os.getenv('DATABASE_URL')
+        if not url:
+            raise RuntimeError("DATABASE_URL is not set (see .env.example)")
+    with _engine_lock:
+        previous, engine = engine, create_engine(url, **pool.engine_options(url))
+    if previous is not None:
+        previous.dispose()
+    return engine
+
+def get_engine():
+    """The app's engine, created from DATABASE_URL on first use"""
+    if engine is None:
+        with _engine_lock:
+            if engine is None:
+                init_engine()
+    return engine
+
+def init_db(bind=None):
+    """
+    Create missing tables and apply pending migrations; returns the applied
+    migration versions. Called once at app startup and by the db
+    command-line tools. A database that is already up to date costs a few
+    queries (the table list and the schema version) rather than a check per
+    table.
+    """
+    from db import migrations
+    bind = bind or get_engine()
+    existing = set(inspect(bind).get_table_names())
+    missing = [t for t in Base.metadata.sorted_tables if t.name not in existing]
+    if missing:
+        Base.metadata.create_all(bind, tables=missing, checkfirst=False)
+    return migrations.migrate(bind)
+
+class AppSession(Session):
+    """Uses the app's current engine unless given a bind"""
+
+    def get_bind(self, mapper=None, **kwargs):
+        if self.bind is None:
+            self.bind = get_engine()
+        return super().get_bind(mapper, **kwargs)
+
+SessionLocal = sessionmaker(class_=AppSession)
 
-SessionLocal = sessionmaker(bind=engine)
+def get_db():
+    """
+    Request-scoped session dependency (Depends(get_db)). The session is closed
+    when the request is finished, even if the handler raised, so its
+    connection always goes back to the pool and uncommitted work is rolled
+    back.
+    """
+    db = SessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+def pool_stats():
+    return pool.stats(get_engine().pool)
+
+def record_change(db, table_name, action, record_id, data=None):
+    """
+    Add a row to the changes table in the caller's transaction, so the change
+    is only published if the write itself commits. `data` is the row as the
+    /list endpoint would return it and is pushed to WebSocket clients.
+    """
+    change = Change(
+        table_name=table_name,
+        action=action,
+        record_id=record_id,
+        payload=json.dumps(data) if data is not None else None
+    )
+    db.add(change)
+    db.info.setdefault("pending_changes", []).append((change, table_name, action, record_id, data))
+    return change
+
+def record_changes(db, changes):
+    """
+    record_change for a list of (table_name, action, record_id, data), with
+    one multi-row INSERT where the dialect can return the new ids and a row
+    at a time otherwise. Each (table_name, record_id) may appear once.
+    """
+    table = Change.__table__
+    rows = [
+        {"table_name": t, "action": a, "record_id": r, "payload": json.dumps(d) if d is not None else None}
+        for t, a, r, d in changes
+    ]
+    if not rows:
+        return
+    if db.get_bind().dialect.insert_executemany_returning:
+        # Returned rows are not in parameter order; match them up by key
+        inserted = db.execute(table.insert().returning(table.c.id, table.c.table_name, table.c.record_id), rows)
+        ids = {(r.table_name, r.record_id): r.id for r in inserted}
+        change_ids = [ids[(t, r)] for t, _, r, _ in changes]
+    else:
+        change_ids = [db.execute(table.insert().values(row)).inserted_primary_key[0] for row in rows]
+    db.info.setdefault("pending_changes", []).extend(
+        (change_id, t, a, r, d) for change_id, (t, a, r, d) in zip(change_ids, changes)
+    )
+
+_commit_listeners = []
+
+def on_commit(listener):
+    """
+    Register listener(changes) to run in this process after every commit that
+    recorded changes. `changes` is a list of (change_id, table_name, action,
+    record_id, data) tuples in the order they were recorded. Used for
+    in-process caches; other processes hear about the same changes through
+    services/broadcast.py or the changes table.
+    """
+    _commit_listeners.append(listener)
+    return listener
+
+@event.listens_for(Session, "after_commit")
+def _publish_committed_changes(session):
+    pending = session.info.pop("pending_changes", None)
+    if not pending:
+        return
+    # Flushed before the commit, so each change's id is in its identity key
+    # (record_changes already knows the ids)
+    changes = [(change if isinstance(change, int) else inspect(change).identity[0], table_name, action, record_id, data)
+               for change, table_name, action, record_id, data in pending]
+    for listener in _commit_listeners:
+        try:
+            listener(changes)
+        except Exception as e:
+            print(f"❌ Commit listener {listener.__name__} failed: {str(e)}")
+
+@event.listens_for(Session, "after_soft_rollback")
+def _discard_pending_changes(session, previous_transaction):
+    session.info.pop("pending_changes", None)
+
+# A late-committing change this many ids below its table's latest is still
+# counted in change_version()
+VERSION_WINDOW = 1000
+
+def change_version(db, *table_names):
+    """
+    A cheap version stamp for caching anything derived from the given tables:
+    per table, the highest change id and the number of changes within
+    VERSION_WINDOW ids of it. Concurrent transactions can commit their change
+    rows out of id order (MySQL hands out ids at insert, not at commit), so
+    the highest id alone would not move when a lower one commits late; the
+    count does, unless it lands more than VERSION_WINDOW ids behind. Both
+    parts are seeks on ix_changes_table_id, in one statement.
+    """
+    from sqlalchemy import select
+    columns = []
+    for name in table_names:
+        latest = select(func.max(Change.id)).where(Change.table_name == name).correlate(None).scalar_subquery()
+        columns.append(latest)
+        columns.append(select(func.count(Change.id)).where(
+            Change.table_name == name,
+            Change.id > latest - VERSION_WINDOW
+        ).scalar_subquery())
+    row = db.execute(select(*columns)).one()
+    return tuple(zip(row[::2], row[1::2]))
 
 # def init_triggers():
 #     with engine.connect() as conn:
@@ -94,29 +295,5 @@ SessionLocal = sessionmaker(bind=engine)
 #             """)
 #         conn.commit()
 
-# def seed_data():
-#     db = SessionLocal()
-#     try:
-#         # Check if doctors table is empty
-#         if db.query(Doctor).count() == 0:
-#             doctors = [
-#                 Doctor(name="Dr. John Smith", specialty="Cardiology"),
-#                 Doctor(name="Dr. Jane Doe", specialty="Pediatrics"),
-#             ]
-#             db.add_all(doctors)
-#         # Check if patients table is empty
-#         if db.query(Patient).count() == 0:
-#             patients = [
-#                 Patient(name="Alice Brown", email="alice@example.com"),
-#                 Patient(name="Bob White", email="bob@example.com"),
-#             ]
-#             db.add_all(patients)
-#         db.commit()
-#     except Exception as e:
-#         db.rollback()
-#         print(f"Error seeding data: {e}")
-#     finally:
-#         db.close()
-
 # init_triggers()
-# seed_data()
\ No newline at end of file
+# Sample data: python -m db.seed (see db/seed.py)
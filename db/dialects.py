@@ -0,0 +1,53 @@
+"""
+SQL expressions that differ between the dialects we run on.
+
+SQLite (local development and tests) and MySQL (production) spell date
+arithmetic differently. Each construct here compiles to the native form for
+the active dialect, so queries can use them without branching on the engine.
+"""
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql.expression import FunctionElement
+from sqlalchemy.types import Float, Integer
+
+class hour_of(FunctionElement):
+    """Hour of day (0-23) of a datetime column"""
+    type = Integer()
+    inherit_cache = True
+    name = "hour_of"
+
+@compiles(hour_of)
+def _hour_of_default(element, compiler, **kw):
+    return "EXTRACT(HOUR FROM %s)" % compiler.process(element.clauses, **kw)
+
+@compiles(hour_of, "sqlite")
+def _hour_of_sqlite(element, compiler, **kw):
+    return "CAST(strftime('%%H', %s) AS INTEGER)" % compiler.process(element.clauses, **kw)
+
+@compiles(hour_of, "mysql")
+def _hour_of_mysql(element, compiler, **kw):
+    return "HOUR(%s)" % compiler.process(element.clauses, **kw)
+
+class days_between(FunctionElement):
+    """Fractional days from the first datetime to the second"""
+    type = Float()
+    inherit_cache = True
+    name = "days_between"
+
+def _arguments(element, compiler, **kw):
+    start, end = list(element.clauses)
+    return compiler.process(start, **kw), compiler.process(end, **kw)
+
+@compiles(days_between)
+def _days_between_default(element, compiler, **kw):
+    start, end = _arguments(element, compiler, **kw)
+    return "(EXTRACT(EPOCH FROM (%s - %s)) / 86400.0)" % (end, start)
+
+@compiles(days_between, "sqlite")
+def _days_between_sqlite(element, compiler, **kw):
+    start, end = _arguments(element, compiler, **kw)
+    return "(julianday(%s) - julianday(%s))" % (end, start)
+
+@compiles(days_between, "mysql")
+def _days_between_mysql(element, compiler, **kw):
+    start, end = _arguments(element, compiler, **kw)
+    return "(TIMESTAMPDIFF(SECOND, %s, %s) / 86400.0)" % (start, end)
@@ -0,0 +1,102 @@
+"""
+Versioned schema migrations for databases created before a schema change.
+
+`Base.metadata.create_all` only creates missing tables, so columns and
+indexes added to existing tables are applied here. Each migration runs once,
+in order, and is recorded in the schema_migrations table. Migrations check
+the live schema before changing it, so they are safe on databases that
+create_all already built with the latest models.
+
+Run manually with:  python -m db.migrations
+"""
+from sqlalchemy import inspect, text, Table, Column, Integer, String, DateTime, MetaData
+from sqlalchemy.sql import func
+from datetime import datetime
+
+migration_metadata = MetaData()
+
+schema_migrations = Table(
+    'schema_migrations', migration_metadata,
+    Column('version', Integer, primary_key=True),
+    Column('description', String(255), nullable=False),
+    Column('applied_at', DateTime, nullable=False, server_default=func.now())
+)
+
+def _has_column(conn, table, column):
+    return column in [c['name'] for c in inspect(conn).get_columns(table)]
+
+def _index_names(conn, table):
+    return {i['name'] for i in inspect(conn).get_indexes(table)}
+
+def _create_indexes(conn, table, names):
+    from db.database import Base
+    existing = _index_names(conn, table)
+    for index in Base.metadata.tables[table].indexes:
+        if index.name in names and index.name not in existing:
+            print(f"   creating index {index.name} on {table}")
+            index.create(conn)
+
+def add_change_payload(conn):
+    if not _has_column(conn, 'changes', 'payload'):
+        conn.execute(text("ALTER TABLE changes ADD COLUMN payload TEXT"))
+
+def add_hot_path_indexes(conn):
+    duplicates = conn.execute(text(
+        "SELECT appointment_id FROM cancellations GROUP BY appointment_id HAVING COUNT(*) > 1"
+    )).fetchall()
+    if duplicates:
+        ids = ', '.join(str(d[0]) for d in duplicates)
+        raise RuntimeError(f"Cannot add unique index: appointments cancelled more than once ({ids})")
+    _create_indexes(conn, 'appointment_slots', {
+        'ix_appointment_slots_doctor_date_start',
+        'ix_appointment_slots_available_date',
+    })
+    _create_indexes(conn, 'appointments', {'ix_appointments_slot_id'})
+    _create_indexes(conn, 'cancellations', {'uq_cancellations_appointment_id'})
+    _create_indexes(conn, 'changes', {'ix_changes_table_id'})
+
+def add_capacity_rollup(conn):
+    from db.database import DoctorDayCapacity
+    from db import capacity
+    DoctorDayCapacity.__table__.create(conn, checkfirst=True)
+    print(f"   backfilled {capacity.rebuild(conn)} doctor-days")
+
+def add_schedule_index(conn):
+    _create_indexes(conn, 'appointment_slots', {'ix_appointment_slots_date_start'})
+
+# (version, description, function). Append only; never renumber.
+MIGRATIONS = [
+    (1, "Add changes.payload for row-level change deltas", add_change_payload),
+    (2, "Add hot-path indexes and unique cancellation per appointment", add_hot_path_indexes),
+    (3, "Add doctor_day_capacity rollup and backfill it", add_capacity_rollup),
+    (4, "Add appointment_slots (date, start_time) index for schedule views", add_schedule_index),
+]
+
+def current_version(engine):
+    migration_metadata.create_all(engine)
+    with engine.connect() as conn:
+        return conn.execute(text("SELECT MAX(version) FROM schema_migrations")).scalar() or 0
+
+def migrate(engine):
+    """Apply every pending migration in order. Returns the list of applied versions."""
+    applied = []
+    version = current_version(engine)
+    for number, description, upgrade in MIGRATIONS:
+        if number <= version:
+            continue
+        print(f"⏳ Applying migration {number}: {description}")
+        with engine.begin() as conn:
+            upgrade(conn)
+            conn.execute(schema_migrations.insert().values(
+                version=number,
+                description=description,
+                applied_at=datetime.now()
+            ))
+        applied.append(number)
+    return applied
+
+if __name__ == "__main__":
+    from db import database
+    engine = database.get_engine()
+    applied = database.init_db(engine)
+    print(f"✅ Schema at version {current_version(engine)} ({len(applied)} migration(s) applied)")
@@ -0,0 +1,123 @@
+"""
+Connection pool settings and metrics.
+
+Settings come from the environment:
+  DB_POOL_SIZE      connections kept open (default 10)
+  DB_MAX_OVERFLOW   extra connections opened under burst load (default 30)
+  DB_POOL_TIMEOUT   seconds a checkout waits before failing (default 30)
+  DB_POOL_RECYCLE   seconds before a connection is replaced (default 1800)
+  DB_POOL_PRE_PING  test each connection on checkout (default true)
+
+DB_POOL_SIZE + DB_MAX_OVERFLOW should cover THREADPOOL_SIZE plus the
+background tasks, or handlers queue for connections under load.
+
+MeteredQueuePool records how long every checkout waited, how many
+checkouts opened an overflow connection and how many timed out; stats()
+combines those with the pool's current in-use and idle counts.
+"""
+from sqlalchemy import exc
+from sqlalchemy.engine import make_url
+from sqlalchemy.pool import QueuePool
+from threading import Lock
+import os
+import time
+
+POOL_SIZE = int(os.getenv('DB_POOL_SIZE', '10'))
+MAX_OVERFLOW = int(os.getenv('DB_MAX_OVERFLOW', '30'))
+POOL_TIMEOUT = float(os.getenv('DB_POOL_TIMEOUT', '30'))
+POOL_RECYCLE = int(os.getenv('DB_POOL_RECYCLE', '1800'))
+POOL_PRE_PING = os.getenv('DB_POOL_PRE_PING', 'true').lower() in ('1', 'true', 'yes')
+
+# Upper bounds (seconds) of the checkout wait histogram
+WAIT_BUCKETS = [0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5, 10, 30]
+
+class PoolMetrics:
+    def __init__(self):
+        self._lock = Lock()
+        self.checkouts = 0
+        self.overflow_checkouts = 0
+        self.timeouts = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+        self.wait_counts = [0] * len(WAIT_BUCKETS)
+
+    def record_wait(self, waited):
+        with self._lock:
+            self.wait_total += waited
+            self.wait_max = max(self.wait_max, waited)
+            for i, bound in enumerate(WAIT_BUCKETS):
+                if waited <= bound:
+                    self.wait_counts[i] += 1
+                    break
+
+    def record_checkout(self, waited, overflowed):
+        self.record_wait(waited)
+        with self._lock:
+            self.checkouts += 1
+            self.overflow_checkouts += 1 if overflowed else 0
+
+    def record_timeout(self, waited):
+        self.record_wait(waited)
+        with self._lock:
+            self.timeouts += 1
+
+    def snapshot(self):
+        with self._lock:
+            waits = self.checkouts + self.timeouts
+            return {
+                "checkouts": self.checkouts,
+                "overflow_checkouts": self.overflow_checkouts,
+                "timeouts": self.timeouts,
+                "wait_seconds_total": round(self.wait_total, 6),
+                "wait_seconds_avg": round(self.wait_total / waits, 6) if waits else 0,
+                "wait_seconds_max": round(self.wait_max, 6),
+                "wait_buckets": dict(zip(WAIT_BUCKETS, self.wait_counts))
+            }
+
+metrics = PoolMetrics()
+
+class MeteredQueuePool(QueuePool):
+    """QueuePool that times every checkout and counts overflow and timeouts"""
+
+    def _do_get(self):
+        start = time.perf_counter()
+        overflow = self.overflow()
+        try:
+            connection = super()._do_get()
+        except exc.TimeoutError:
+            metrics.record_timeout(time.perf_counter() - start)
+            print(f"❌ Connection pool exhausted: {self.checkedout()} in use "
+                  f"(size {self.size()}, overflow {max(self.overflow(), 0)}/{self._max_overflow})")
+            raise
+        metrics.record_checkout(time.perf_counter() - start, self.overflow() > max(overflow, 0))
+        return connection
+
+def engine_options(database_url):
+    """create_engine keyword arguments for the configured pool"""
+    url = make_url(database_url)
+    if url.get_backend_name() == "sqlite" and url.database in (None, "", ":memory:"):
+        # In-memory SQLite lives in a single connection; keep SQLAlchemy's default pool
+        return {}
+    return {
+        "poolclass": MeteredQueuePool,
+        "pool_size": POOL_SIZE,
+        "max_overflow": MAX_OVERFLOW,
+        "pool_timeout": POOL_TIMEOUT,
+        "pool_recycle": POOL_RECYCLE,
+        "pool_pre_ping": POOL_PRE_PING
+    }
+
+def stats(pool):
+    """Current occupancy of `pool` plus the checkout metrics"""
+    result = {"pool": type(pool).__name__}
+    if isinstance(pool, QueuePool):
+        result.update({
+            "size": pool.size(),
+            "max_overflow": pool._max_overflow,
+            "timeout": pool._timeout,
+            "checked_out": pool.checkedout(),
+            "idle": pool.checkedin(),
+            "overflow": max(pool.overflow(), 0)
+        })
+    result.update(metrics.snapshot())
+    return result
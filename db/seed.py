@@ -0,0 +1,338 @@
+"""
+Deterministic dataset generator for local benchmarks and capacity tests.
+
+The same seed and options always produce the same rows, ids included:
+
+  doctors        weighted specialties, each doctor with a weekly schedule
+                 (working days, hours, slot length by specialty) and a
+                 popularity factor
+  patients       names and unique emails
+  slots          every doctor's schedule expanded day by day from
+                 start_date, the same shapes /appointment_slots/generate
+                 produces
+  appointments   booked at booking_rate, scaled by doctor popularity and
+                 time of day; future slots fill up less the further out
+                 they are, and booking lead times are exponential
+  cancellations  at cancellation_rate, with weighted reasons, mostly in the
+                 last days before the appointment; the slot is released as
+                 /appointments/cancel does
+
+Slots before as_of are history, later ones are the open calendar. Rows are
+inserted with Core executemany batches, then the capacity rollup is rebuilt
+and one BULK_INSERT change per table is recorded so caches and ETags move.
+
+Like the other db commands it targets DATABASE_URL:
+
+    python -m db.seed --doctors 500 --slots 3000000
+    python -m db.seed --as-of 2025-06-02 --reset   # same data on any day
+"""
+from datetime import date, datetime, time, timedelta
+from sqlalchemy import select, func, text, Date, Time
+from db import database, capacity
+from services.slots import expand_schedule
+import json
+import math
+import random
+
+BATCH_SIZE = 10_000
+
+# specialty -> (share of doctors, slot minutes)
+SPECIALTIES = {
+    "General Practice": (0.22, 15),
+    "Pediatrics": (0.12, 20),
+    "Cardiology": (0.08, 30),
+    "Dermatology": (0.08, 20),
+    "Orthopedics": (0.08, 30),
+    "Obstetrics": (0.07, 30),
+    "Psychiatry": (0.06, 45),
+    "Neurology": (0.06, 30),
+    "Ophthalmology": (0.06, 20),
+    "Gastroenterology": (0.05, 30),
+    "Oncology": (0.05, 40),
+    "Radiology": (0.04, 15),
+    "Urology": (0.03, 30),
+}
+# (reason, weight); None is a cancellation without a reason
+CANCELLATION_REASONS = [
+    ("Schedule conflict", 28),
+    ("Feeling better", 18),
+    ("Work commitment", 14),
+    ("Rescheduled", 12),
+    ("Transportation issue", 8),
+    ("Emergency", 6),
+    ("Illness", 6),
+    ("Cost concerns", 3),
+    (None, 5),
+]
+FIRST_NAMES = ["James", "Mary", "Robert", "Patricia", "John", "Jennifer", "Michael", "Linda", "David",
+               "Elizabeth", "William", "Barbara", "Richard", "Susan", "Joseph", "Jessica", "Thomas",
+               "Sarah", "Ahmed", "Fatima", "Wei", "Mei", "Carlos", "Sofia", "Raj", "Priya", "Kenji",
+               "Yuki", "Olu", "Amara", "Ivan", "Olga", "Liam", "Emma", "Noah", "Ava", "Omar", "Layla"]
+LAST_NAMES = ["Smith", "Johnson", "Williams", "Brown", "Jones", "Garcia", "Miller", "Davis", "Rodriguez",
+              "Martinez", "Hernandez", "Lopez", "Wilson", "Anderson", "Taylor", "Thomas", "Moore",
+              "Khan", "Rahman", "Chen", "Wang", "Kim", "Nguyen", "Patel", "Singh", "Tanaka", "Okafor",
+              "Ivanova", "Murphy", "Kowalski", "Haddad", "Silva", "Rossi", "Schmidt", "Dubois"]
+# Daily hours, and (working weekdays, weight) with Monday as 0
+HOURS = [(time(8, 0), time(16, 0)), (time(9, 0), time(17, 0)), (time(10, 0), time(18, 0)), (time(8, 0), time(12, 0))]
+WEEKLY_PATTERNS = [({0, 1, 2, 3, 4}, 6), ({0, 1, 2, 3}, 2), ({1, 2, 3, 4, 5}, 1), ({0, 2, 4}, 1)]
+FUTURE_FILL_DAYS = 21    # future booking probability decays with this scale
+MEAN_LEAD_DAYS = 10      # mean days between booking and appointment
+MEAN_NOTICE_HOURS = 40   # mean hours between cancellation and appointment
+
+def default_options(**overrides):
+    options = {
+        "seed": 42,
+        "doctors": 200,
+        "patients": 20_000,
+        "slots": None,        # stop after this many slots (None: fill `days`)
+        "days": 180,
+        "history_days": 90,   # how many of `days` lie before as_of
+        "as_of": date.today(),
+        "booking_rate": 0.7,
+        "cancellation_rate": 0.12,
+    }
+    options.update({k: v for k, v in overrides.items() if v is not None})
+    if overrides.get("slots") is not None and overrides.get("days") is None:
+        options["days"] = 100 * 365  # the slot limit ends generation
+    return options
+
+def _weighted(rng, choices):
+    items, weights = zip(*choices)
+    return rng.choices(items, weights)[0]
+
+def make_doctors(rng, count):
+    """Doctor rows plus the schedule profile each one's slots are generated from"""
+    specialties = [(name, share) for name, (share, _) in SPECIALTIES.items()]
+    doctors = []
+    for i in range(1, count + 1):
+        specialty = _weighted(rng, specialties)
+        weekdays = _weighted(rng, WEEKLY_PATTERNS)
+        day_start, day_end = rng.choice(HOURS)
+        doctors.append({
+            "row": {
+                "id": i,
+                "name": f"Dr. {rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}",
+                "specialty": specialty
+            },
+            "weekdays": weekdays,
+            "day_start": day_start,
+            "day_end": day_end,
+            "slot_minutes": SPECIALTIES[specialty][1],
+            # lognormal with mean ~1: a few doctors are in much higher demand
+            "popularity": rng.lognormvariate(0, 0.4) / math.exp(0.08)
+        })
+    return doctors
+
+def make_patients(rng, count):
+    for i in range(1, count + 1):
+        first, last = rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+        yield {"id": i, "name": f"{first} {last}", "email": f"{first}.{last}{i}@example.com".lower()}
+
+def _daily_times(doctor, day):
+    return [(start, end) for _, start, end in expand_schedule(
+        day, day, {day.weekday()}, doctor["day_start"], doctor["day_end"], doctor["slot_minutes"], set()
+    )]
+
+def _time_of_day_factor(start):
+    return 1.15 if start.hour < 12 else 0.8 if start.hour >= 16 else 1.0
+
+def generate(options):
+    """
+    Yield (table, row) in insert order: all doctors and patients, then slots
+    day by day, each followed by its appointment and cancellation.
+    """
+    rng = random.Random(options["seed"])
+    doctors = make_doctors(rng, options["doctors"])
+    for doctor in doctors:
+        yield "doctors", doctor["row"]
+    for patient in make_patients(rng, options["patients"]):
+        yield "patients", patient
+
+    now = datetime.combine(options["as_of"], time(12, 0))
+    first_day = options["as_of"] - timedelta(days=options["history_days"])
+    reasons = CANCELLATION_REASONS
+    slot_id = appointment_id = cancellation_id = 0
+    schedules = {}  # (doctor id, weekday) -> [(start, end)]
+    for offset in range(options["days"]):
+        day = first_day + timedelta(days=offset)
+        days_ahead = (day - options["as_of"]).days
+        fill = 1.0 if days_ahead <= 0 else math.exp(-days_ahead / FUTURE_FILL_DAYS)
+        for doctor in doctors:
+            if day.weekday() not in doctor["weekdays"]:
+                continue
+            key = (doctor["row"]["id"], day.weekday())
+            if key not in schedules:
+                schedules[key] = _daily_times(doctor, day)
+            for start, end in schedules[key]:
+                if options["slots"] is not None and slot_id >= options["slots"]:
+                    return
+                slot_id += 1
+                slot_at = datetime.combine(day, start)
+                chance = options["booking_rate"] * doctor["popularity"] * _time_of_day_factor(start) * fill
+                booked = rng.random() < min(chance, 0.98)
+                cancelled = booked and rng.random() < options["cancellation_rate"]
+                yield "appointment_slots", {
+                    "id": slot_id,
+                    "doctor_id": doctor["row"]["id"],
+                    "date": day,
+                    "start_time": start,
+                    "end_time": end,
+                    # cancelling releases the slot, as /appointments/cancel does
+                    "is_available": not booked or cancelled
+                }
+                if not booked:
+                    continue
+                appointment_id += 1
+                booked_at = slot_at - timedelta(hours=rng.expovariate(1 / (MEAN_LEAD_DAYS * 24)) + 1)
+                if booked_at > now:
+                    booked_at = now - timedelta(hours=rng.uniform(0, 48))
+                yield "appointments", {
+                    "id": appointment_id,
+                    # a long tail of frequent patients
+                    "patient_id": 1 + int(options["patients"] * rng.random() ** 1.5),
+                    "slot_id": slot_id,
+                    "booked_at": booked_at.replace(microsecond=0)
+                }
+                if not cancelled:
+                    continue
+                cancellation_id += 1
+                if slot_at <= now:
+                    cancelled_at = slot_at - timedelta(hours=rng.expovariate(1 / MEAN_NOTICE_HOURS))
+                    cancelled_at = max(cancelled_at, booked_at)
+                else:
+                    # still ahead of as_of: cancelled some time since booking
+                    cancelled_at = booked_at + (now - booked_at) * rng.random()
+                yield "cancellations", {
+                    "id": cancellation_id,
+                    "appointment_id": appointment_id,
+                    "reason": _weighted(rng, reasons),
+                    "cancelled_at": cancelled_at.replace(microsecond=0)
+                }
+
+TABLES = {
+    "doctors": database.Doctor.__table__,
+    "patients": database.Patient.__table__,
+    "appointment_slots": database.AppointmentSlot.__table__,
+    "appointments": database.Appointment.__table__,
+    "cancellations": database.Cancellation.__table__,
+}
+
+class BulkWriter:
+    """
+    executemany straight to the driver. Core would run every value through
+    its type's bind processor; here each distinct date and time is rendered
+    once, which is most of the cost of inserting slots.
+    """
+
+    def __init__(self, conn, table):
+        self.conn = conn
+        compiled = table.insert().compile(dialect=conn.dialect, column_keys=[c.key for c in table.c])
+        self.sql = str(compiled)
+        self.positional = compiled.positional
+        self.keys = list(compiled.positiontup) if self.positional else [c.key for c in table.c]
+        self.processors = []
+        for key in self.keys:
+            column_type = table.c[key].type
+            process = column_type.dialect_impl(conn.dialect).bind_processor(conn.dialect)
+            if process and isinstance(column_type, (Date, Time)):
+                process = _memoized(process)
+            self.processors.append(process)
+
+    def write(self, rows):
+        pairs = list(zip(self.keys, self.processors))
+        if self.positional:
+            params = [tuple(p(row[k]) if p else row[k] for k, p in pairs) for row in rows]
+        else:
+            params = [{k: p(row[k]) if p else row[k] for k, p in pairs} for row in rows]
+        self.conn.exec_driver_sql(self.sql, params)
+
+def _memoized(process):
+    rendered = {}
+
+    def render(value):
+        if value not in rendered:
+            rendered[value] = process(value)
+        return rendered[value]
+    return render
+
+def existing_rows(conn):
+    return {name: conn.execute(select(func.count()).select_from(table)).scalar() for name, table in TABLES.items()}
+
+def load(engine, options, reset=False):
+    """Insert the generated dataset; returns {table: rows} and the seconds taken"""
+    started = datetime.now()
+    if reset:
+        database.Base.metadata.drop_all(engine, tables=list(TABLES.values()) + [
+            database.DoctorDayCapacity.__table__, database.Change.__table__
+        ])
+        database.Base.metadata.create_all(engine)
+    with engine.connect() as conn:
+        occupied = {name: n for name, n in existing_rows(conn).items() if n}
+    if occupied:
+        raise ValueError(f"Tables are not empty: {occupied}; pass reset=True (--reset) to replace them")
+
+    counts = dict.fromkeys(TABLES, 0)
+    indexes = [index for table in TABLES.values() for index in table.indexes]
+    with engine.begin() as conn:
+        if conn.dialect.name == "sqlite":
+            # Bulk load: a crash mid-seed just means seeding again
+            conn.execute(text("PRAGMA synchronous = OFF"))
+        # Building each index once at the end beats maintaining it per row
+        for index in indexes:
+            index.drop(conn, checkfirst=True)
+        writers = {name: BulkWriter(conn, table) for name, table in TABLES.items()}
+        pending = {name: [] for name in TABLES}
+
+        def flush():
+            # Parents first, so foreign keys hold on engines that enforce them
+            for name, rows in pending.items():
+                if rows:
+                    writers[name].write(rows)
+                    counts[name] += len(rows)
+                    rows.clear()
+
+        for name, row in generate(options):
+            pending[name].append(row)
+            if len(pending[name]) >= BATCH_SIZE:
+                flush()
+        flush()
+        for index in indexes:
+            index.create(conn)
+        capacity.rebuild(conn)
+        conn.execute(database.Change.__table__.insert(), [
+            {"table_name": name, "action": "BULK_INSERT", "record_id": 0, "payload": json.dumps({"count": n})}
+            for name, n in counts.items()
+        ])
+    return counts, (datetime.now() - started).total_seconds()
+
+def main():
+    import argparse
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--seed", type=int)
+    parser.add_argument("--doctors", type=int)
+    parser.add_argument("--patients", type=int)
+    parser.add_argument("--slots", type=int, help="Stop after this many slots; --days grows to reach it")
+    parser.add_argument("--days", type=int, help="Days of schedule to generate")
+    parser.add_argument("--history-days", type=int, help="Days of schedule before --as-of")
+    parser.add_argument("--as-of", type=date.fromisoformat, help="Day that splits history from the open calendar (default today)")
+    parser.add_argument("--booking-rate", type=float)
+    parser.add_argument("--cancellation-rate", type=float)
+    parser.add_argument("--reset", action="store_true", help="Drop and recreate the tables first")
+    args = parser.parse_args()
+
+    options = default_options(**{k: v for k, v in vars(args).items() if k != "reset"})
+    engine = database.get_engine()
+    database.init_db(engine)
+    print(f"🌱 Seeding {engine.url.render_as_string(hide_password=True)} with seed {options['seed']}")
+    try:
+        counts, seconds = load(engine, options, reset=args.reset)
+    except ValueError as e:
+        print(f"❌ {e}")
+        raise SystemExit(1)
+    for name, n in counts.items():
+        print(f"   {name:<18} {n:>12,}")
+    total = sum(counts.values())
+    print(f"✅ Seeded {total:,} rows in {seconds:.1f}s ({total / seconds:,.0f} rows/s)")
+
+if __name__ == "__main__":
+    main()
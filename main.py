@@ -1,114 +1,84 @@
-from fastapi import FastAPI, Request, WebSocket
-from fastapi.templating import Jinja2Templates
+from fastapi import FastAPI, Request, Depends
 from fastapi.staticfiles import StaticFiles
-from db.database import SessionLocal
-from services import doctors, patients, slots, appointments, cancellations, booking
-import asyncio
-import uvicorn
-
-app = FastAPI()
+from contextlib import asynccontextmanager
+from functools import lru_cache
+from anyio import to_thread
+from dotenv import load_dotenv
+from sqlalchemy.orm import Session
+import os
+
+# Settings are read from the environment as modules are imported, so load them first
+load_dotenv('.env.local')
+
+from db.database import get_db, pool_stats
+from db import database
+from services import doctors, patients, slots, appointments, cancellations, booking, realtime, broadcast, bulk, slot_index, dashboard, metrics
+
+# Route handlers that touch the database are plain `def` functions, so FastAPI
+# runs them in this threadpool and blocking DB calls never stall the event loop
+THREADPOOL_SIZE = int(os.getenv('THREADPOOL_SIZE', '40'))
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    to_thread.current_default_thread_limiter().total_tokens = THREADPOOL_SIZE
+    # The engine and schema are set up here, not at import, so importing the app is cheap
+    database.init_db()
+    # Committed changes from every worker, fanned out to WebSocket clients
+    await broadcast.start()
+    await slot_index.start_slot_index()
+    yield
+    await slot_index.stop_slot_index()
+    await broadcast.stop()
+
+app = FastAPI(lifespan=lifespan)
+# Per-route latency, status and SQL metrics, scraped from /metrics
+app.add_middleware(metrics.MetricsMiddleware)
 app.mount("/static", StaticFiles(directory="static"), name="static")
-templates = Jinja2Templates(directory="templates")
-
-class WebSocketManager:
-    def __init__(self):
-        self.active_connections = []
-
-    async def connect(self, websocket: WebSocket):
-        await websocket.accept()
-        self.active_connections.append(websocket)
-
-    async def disconnect(self, websocket: WebSocket):
-        self.active_connections.remove(websocket)
-
-    async def broadcast(self, message: str):
-        for connection in self.active_connections:
-            await connection.send_text(message)
-
-manager = WebSocketManager()
-
-async def websocket_endpoint(websocket: WebSocket, table_name: str):
-    await manager.connect(websocket)
-    try:
-        db = SessionLocal()
-        last_change_id = 0
-        while True:
-            changes = db.query(db.database.Change).filter(
-                db.database.Change.id > last_change_id,
-                db.database.Change.table_name == table_name
-            ).all()
-            if changes:
-                last_change_id = max(change.id for change in changes)
-                await manager.broadcast(f"update_{table_name}")
-            await asyncio.sleep(1)
-    except Exception:
-        await manager.disconnect(websocket)
-    finally:
-        db.close()
-
-@app.websocket("/ws/doctors")
-async def websocket_doctors(websocket: WebSocket):
-    await websocket_endpoint(websocket, "doctors")
-
-@app.websocket("/ws/patients")
-async def websocket_patients(websocket: WebSocket):
-    await websocket_endpoint(websocket, "patients")
-
-@app.websocket("/ws/appointment_slots")
-async def websocket_slots(websocket: WebSocket):
-    await websocket_endpoint(websocket, "appointment_slots")
-
-@app.websocket("/ws/appointments")
-async def websocket_appointments(websocket: WebSocket):
-    await websocket_endpoint(websocket, "appointments")
-
-@app.websocket("/ws/cancellations")
-async def websocket_cancellations(websocket: WebSocket):
-    await websocket_endpoint(websocket, "cancellations")
+
+@lru_cache(maxsize=None)
+def templates():
+    # Jinja2 is only loaded once a page is rendered, not on every worker start
+    from fastapi.templating import Jinja2Templates
+    return Jinja2Templates(directory="templates")
 
 @app.get("/")
 async def home(request: Request):
-    return templates.TemplateResponse("home.html", {"request": request})
+    return templates().TemplateResponse("home.html", {"request": request})
 
 @app.get("/booking")
 async def booking_page(request: Request):
     """New advanced booking interface"""
-    return templates.TemplateResponse("booking.html", {"request": request})
+    return templates().TemplateResponse("booking.html", {"request": request})
 
 @app.get("/doctors")
-async def doctors_page(request: Request):
-    db = SessionLocal()
+def doctors_page(request: Request, db: Session = Depends(get_db)):
     doctor_list = doctors.get_doctors(db)
-    db.close()
-    return templates.TemplateResponse("doctors.html", {"request": request, "doctors": doctor_list})
+    return templates().TemplateResponse("doctors.html", {"request": request, "doctors": doctor_list})
 
 @app.get("/patients")
-async def patients_page(request: Request):
-    db = SessionLocal()
+def patients_page(request: Request, db: Session = Depends(get_db)):
     patient_list = patients.get_patients(db)
-    db.close()
-    return templates.TemplateResponse("patients.html", {"request": request, "patients": patient_list})
+    return templates().TemplateResponse("patients.html", {"request": request, "patients": patient_list})
 
 @app.get("/slots")
-async def slots_page(request: Request):
-    db = SessionLocal()
+def slots_page(request: Request, db: Session = Depends(get_db)):
     slot_list = slots.get_slots(db)
-    db.close()
-    return templates.TemplateResponse("slots.html", {"request": request, "slots": slot_list})
+    return templates().TemplateResponse("slots.html", {"request": request, "slots": slot_list})
 
 @app.get("/appointments")
-async def appointments_page(request: Request):
-    db = SessionLocal()
+def appointments_page(request: Request, db: Session = Depends(get_db)):
     appointment_list = appointments.get_appointments(db)
-    db.close()
-    return templates.TemplateResponse("appointments.html", {"request": request, "appointments": appointment_list})
+    return templates().TemplateResponse("appointments.html", {"request": request, "appointments": appointment_list})
 
 @app.get("/cancellations")
-async def cancellations_page(request: Request):
-    db = SessionLocal()
+def cancellations_page(request: Request, db: Session = Depends(get_db)):
     cancellation_list = cancellations.get_cancellations(db)
-    db.close()
-    return templates.TemplateResponse("cancellations.html", {"request": request, "cancellations": cancellation_list})
+    return templates().TemplateResponse("cancellations.html", {"request": request, "cancellations": cancellation_list})
+
+@app.get("/pool-stats")
+def connection_pool_stats():
+    """Connection pool occupancy, checkout wait times, overflow and timeouts"""
+    return pool_stats()
 
 # Include all routers
 app.include_router(doctors.router, prefix="/doctors", tags=["doctors"])
@@ -117,6 +87,19 @@ app.include_router(slots.router, prefix="/appointment_slots", tags=["slots"])
 app.include_router(appointments.router, prefix="/appointments", tags=["appointments"])
 app.include_router(cancellations.router, prefix="/cancellations", tags=["cancellations"])
 app.include_router(booking.router, prefix="/booking", tags=["booking"])  # New booking router
+app.include_router(bulk.router, prefix="/bulk", tags=["bulk"])
+app.include_router(dashboard.router, prefix="/dashboard", tags=["dashboard"])
+app.include_router(realtime.router, prefix="/ws")
+app.include_router(metrics.router, tags=["metrics"])
 
 if __name__ == "__main__":
-    uvicorn.run(app, host="localhost", port=8080)
\ No newline at end of file
+    import uvicorn
+    workers = int(os.getenv('WORKERS', '1'))
+    if workers > 1:
+        # Workers only see each other's changes through a shared broadcast backend
+        os.environ.setdefault('BROADCAST_BACKEND', 'unix')
+        if os.environ['BROADCAST_BACKEND'] == 'memory':
+            print("❌ BROADCAST_BACKEND=memory with several workers: live updates stay within one worker")
+        uvicorn.run("main:app", host="localhost", port=8080, workers=workers)
+    else:
+        uvicorn.run(app, host="localhost", port=8080)
\ No newline at end of file
@@ -0,0 +1,178 @@
+"""
+Cancellation analytics engine behind /cancellations/analytics, /trends and
+/patterns.
+
+Every statistic those endpoints report comes from one grouped scan of
+cancellations joined to their appointment, slot, doctor and patient, plus a
+count of appointments. Date arithmetic uses the portable constructs in
+db/dialects.py, so the same query runs natively on SQLite and MySQL.
+
+The computed snapshot is cached and reused until a change is recorded for
+any table it reads (or the day rolls over), so repeated dashboard loads cost
+one indexed lookup on the changes table.
+"""
+from collections import Counter
+from datetime import date, datetime, timedelta
+from threading import Lock
+from sqlalchemy import select, func
+from db import database
+from db.dialects import hour_of, days_between
+
+# Tables whose changes can alter any reported number
+SOURCE_TABLES = ["cancellations", "appointments", "appointment_slots", "doctors", "patients"]
+DAY_NAMES = ['Sunday', 'Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday']
+
+_cache = {"key": None, "snapshot": None}
+_lock = Lock()
+
+def _as_date(value):
+    if value is None or isinstance(value, date):
+        return value
+    return date.fromisoformat(str(value)[:10])
+
+def scan(db):
+    """
+    The single grouped pass. Each row is one combination of reason, doctor,
+    patient, day and hour with its cancellation count and the summed days
+    between booking and cancellation.
+    """
+    c = database.Cancellation.__table__
+    a = database.Appointment.__table__
+    s = database.AppointmentSlot.__table__
+    d = database.Doctor.__table__
+    p = database.Patient.__table__
+    day = func.date(c.c.cancelled_at)
+    hour = hour_of(c.c.cancelled_at)
+    keys = [c.c.reason, d.c.id, d.c.name, d.c.specialty, p.c.id, p.c.name, p.c.email, day, hour]
+    query = select(
+        *keys,
+        func.count(c.c.id),
+        func.count(a.c.id),
+        func.sum(days_between(a.c.booked_at, c.c.cancelled_at))
+    ).select_from(
+        c.outerjoin(a, a.c.id == c.c.appointment_id)
+        .outerjoin(s, s.c.id == a.c.slot_id)
+        .outerjoin(d, d.c.id == s.c.doctor_id)
+        .outerjoin(p, p.c.id == a.c.patient_id)
+    ).group_by(*keys)
+    return db.execute(query)
+
+def compute(db, today=None):
+    """Aggregate the scan into every statistic the three endpoints need"""
+    today = today or datetime.now().date()
+    week_start = today - timedelta(days=7)
+    month_start = today - timedelta(days=30)
+
+    total = 0
+    with_appointment = 0
+    days_sum = 0.0
+    this_week = this_month = 0
+    reasons = Counter()
+    doctors, doctor_counts = {}, Counter()
+    patients, patient_counts = {}, Counter()
+    daily, weekdays, hours = Counter(), Counter(), Counter()
+
+    for (reason, doctor_id, doctor_name, specialty, patient_id, patient_name, email,
+         day, hour, count, appointment_count, days) in scan(db):
+        total += count
+        with_appointment += appointment_count
+        days_sum += days or 0
+        reasons[reason] += count
+        if doctor_id is not None:
+            doctors[doctor_id] = (doctor_name, specialty)
+            doctor_counts[doctor_id] += count
+        if patient_id is not None:
+            patients[patient_id] = (patient_name, email)
+            patient_counts[patient_id] += count
+        day = _as_date(day)
+        if day is not None:
+            if day >= week_start:
+                this_week += count
+            if day >= month_start:
+                this_month += count
+                daily[day] += count
+            weekdays[(day.weekday() + 1) % 7] += count
+        if hour is not None:
+            hours[int(hour)] += count
+
+    total_appointments = db.execute(select(func.count(database.Appointment.id))).scalar() or 0
+
+    return {
+        "total": total,
+        "total_appointments": total_appointments,
+        "this_week": this_week,
+        "this_month": this_month,
+        "avg_days_to_cancel": days_sum / with_appointment if with_appointment else 0,
+        "reasons": reasons,
+        "doctors": [(doctors[i], doctor_counts[i]) for i in sorted(doctors)],
+        "patients": [(patients[i], patient_counts[i]) for i in sorted(patients)],
+        "daily": sorted(daily.items()),
+        "weekdays": sorted(weekdays.items()),
+        "hours": sorted(hours.items()),
+    }
+
+def snapshot(db):
+    """The cached aggregate, recomputed only when a source table has changed"""
+    key = (database.change_version(db, *SOURCE_TABLES), datetime.now().date())
+    with _lock:
+        if _cache["key"] == key:
+            return _cache["snapshot"]
+    result = compute(db, key[1])
+    with _lock:
+        _cache["key"], _cache["snapshot"] = key, result
+    return result
+
+def analytics(db):
+    stats = snapshot(db)
+    rate = stats["total"] / stats["total_appointments"] * 100 if stats["total_appointments"] > 0 else 0
+    return {
+        "total_cancellations": stats["total"],
+        "cancellation_rate": round(rate, 2),
+        "this_week": stats["this_week"],
+        "this_month": stats["this_month"],
+        "avg_days_to_cancel": round(stats["avg_days_to_cancel"], 1),
+        "by_reason": [
+            {"reason": reason or "No reason provided", "count": count}
+            for reason, count in stats["reasons"].items()
+        ],
+        "by_doctor": [
+            {"doctor_name": name, "specialty": specialty, "cancellations": count}
+            for (name, specialty), count in stats["doctors"]
+        ],
+        "by_patient": [
+            {"patient_name": name, "email": email, "cancellations": count}
+            for (name, email), count in stats["patients"]
+        ]
+    }
+
+def trends(db):
+    stats = snapshot(db)
+    return {
+        "daily_trends": [
+            {"date": str(day), "count": count}
+            for day, count in stats["daily"]
+        ],
+        "by_day_of_week": [
+            {"day": DAY_NAMES[day], "count": count}
+            for day, count in stats["weekdays"]
+        ]
+    }
+
+def patterns(db):
+    stats = snapshot(db)
+    top_reasons = Counter({r: n for r, n in stats["reasons"].items() if r})
+    return {
+        "peak_hours": [
+            {"hour": f"{hour:02d}:00", "count": count}
+            for hour, count in stats["hours"]
+        ],
+        "top_reasons": [
+            {"reason": reason, "count": count}
+            for reason, count in top_reasons.most_common(5)
+        ],
+        "frequent_cancellers": [
+            {"patient_name": name, "email": email, "cancellations": count}
+            for (name, email), count in sorted(stats["patients"], key=lambda p: -p[1])
+            if count > 1
+        ]
+    }
@@ -1,60 +1,362 @@
-from fastapi import APIRouter, HTTPException, Form
-from db.database import SessionLocal
-from db import database
-from datetime import datetime
+from fastapi import APIRouter, HTTPException, Form, Request, Response, Depends
+from sqlalchemy import update, select, literal, func, or_, Integer, DateTime
+from db.database import get_db
+from sqlalchemy.orm import Session
+from db import database, capacity
+from datetime import datetime, date, timedelta
+from services.slots import serialize_slot
+from services.cancellations import serialize_cancellation
+from services.listing import paginate, stream_list, paginate_keyset, parse_fields, project, page_response
+from services import conditional
 
 router = APIRouter()
 
 def get_appointments(db):
     return db.query(database.Appointment).all()
 
+def serialize_appointment(a):
+    return {"id": a.id, "patient_id": a.patient_id, "slot_id": a.slot_id, "booked_at": str(a.booked_at)}
+
+def claim_slot(db, slot_id):
+    """
+    Atomically mark a slot as booked. The UPDATE only matches while the slot is
+    still available, so when many requests race for the same slot exactly one
+    of them gets a row back; no lock or read-before-write is needed for safety.
+    A plain read first lets requests for already-taken slots (most of them under
+    contention) fail without taking a write lock.
+    Returns the claimed slot row.
+    """
+    slots = database.AppointmentSlot.__table__
+    current = db.execute(select(slots.c.is_available).where(slots.c.id == slot_id)).first()
+    if current is None:
+        raise HTTPException(status_code=404, detail="Slot not found")
+    if not current.is_available:
+        raise HTTPException(status_code=400, detail="Slot is no longer available")
+
+    claim = update(slots).where(
+        slots.c.id == slot_id,
+        slots.c.is_available == True
+    ).values(is_available=False)
+    if db.get_bind().dialect.update_returning:
+        slot = db.execute(claim.returning(*slots.c)).first()
+    else:
+        slot = None
+        if db.execute(claim).rowcount == 1:
+            slot = db.execute(select(*slots.c).where(slots.c.id == slot_id)).first()
+    if slot is None:
+        # Another request claimed it between the read and the update
+        raise HTTPException(status_code=400, detail="Slot is no longer available")
+    capacity.availability_changed(db, slot.doctor_id, slot.date, True, False)
+    return slot
+
+def book_slot(db, patient_id, slot_id):
+    """
+    Claim a slot and create its appointment in the caller's transaction.
+    The appointment is inserted with INSERT ... SELECT from patients, so a
+    missing patient inserts nothing and the caller's rollback frees the slot.
+    """
+    slot = claim_slot(db, slot_id)
+    patients = database.Patient.__table__
+    booked_at = datetime.now()
+    result = db.execute(database.Appointment.__table__.insert().from_select(
+        ["patient_id", "slot_id", "booked_at"],
+        select(
+            patients.c.id,
+            literal(slot_id, Integer),
+            literal(booked_at, DateTime)
+        ).where(patients.c.id == patient_id)
+    ))
+    if result.rowcount != 1:
+        raise HTTPException(status_code=404, detail="Patient not found")
+    capacity.adjust(db, slot.doctor_id, slot.date, confirmed_appointments=1)
+
+    appointment = {"id": result.lastrowid, "patient_id": patient_id, "slot_id": slot_id, "booked_at": str(booked_at)}
+    database.record_change(db, "appointments", "INSERT", appointment["id"], appointment)
+    database.record_change(db, "appointment_slots", "UPDATE", slot_id, serialize_slot(slot))
+    return appointment
+
+def parse_booking_pairs(value):
+    """'patient_id:slot_id,patient_id:slot_id' as posted by forms, as a list of int pairs"""
+    pairs = []
+    for item in value.split(","):
+        if item.strip():
+            patient_id, _, slot_id = item.partition(":")
+            pairs.append((int(patient_id), int(slot_id)))
+    return pairs
+
+def book_slots(db, pairs, all_or_nothing=True):
+    """
+    Book several (patient_id, slot_id) pairs in the caller's transaction with
+    set-based statements: one read of the slots and one of the patients, one
+    conditional UPDATE claiming every slot that is still free, one batched
+    appointment INSERT and one capacity upsert, however many pairs there are.
+
+    Returns a result per pair, in order, with status "booked" or "failed".
+    With all_or_nothing, either every pair is booked or none is, and the
+    caller must roll back in the latter case to release any claimed slots.
+    """
+    slots = database.AppointmentSlot.__table__
+    patients = database.Patient.__table__
+    returning = db.get_bind().dialect.update_returning
+    query = select(*slots.c).where(slots.c.id.in_({slot_id for _, slot_id in pairs}))
+    if not returning:
+        # Without UPDATE ... RETURNING the rows we claim can't be told apart
+        # from rows another transaction claims, so lock them while reading
+        query = query.with_for_update()
+    found = {s.id: s for s in db.execute(query)}
+    known_patients = set(db.execute(
+        select(patients.c.id).where(patients.c.id.in_({patient_id for patient_id, _ in pairs}))
+    ).scalars())
+
+    errors = {}
+    requested = set()
+    for i, (patient_id, slot_id) in enumerate(pairs):
+        if slot_id in requested:
+            errors[i] = "Slot requested more than once"
+        elif slot_id not in found:
+            errors[i] = "Slot not found"
+        elif patient_id not in known_patients:
+            errors[i] = "Patient not found"
+        elif not found[slot_id].is_available:
+            errors[i] = "Slot is no longer available"
+        else:
+            requested.add(slot_id)
+
+    claimed = {}
+    wanted = {slot_id for i, (_, slot_id) in enumerate(pairs) if i not in errors}
+    if wanted and not (errors and all_or_nothing):
+        claim = update(slots).where(
+            slots.c.id.in_(wanted),
+            slots.c.is_available == True
+        ).values(is_available=False)
+        if returning:
+            claimed = {s.id: s for s in db.execute(claim.returning(*slots.c))}
+        else:
+            db.execute(claim)
+            claimed = {slot_id: found[slot_id] for slot_id in wanted}
+        for i, (_, slot_id) in enumerate(pairs):
+            if i not in errors and slot_id not in claimed:
+                # Another request claimed it between the read and the update
+                errors[i] = "Slot is no longer available"
+
+    if not claimed or (errors and all_or_nothing):
+        return [
+            {"patient_id": patient_id, "slot_id": slot_id, "status": "failed",
+             "error": errors.get(i, "Not booked: another booking in the batch failed")}
+            for i, (patient_id, slot_id) in enumerate(pairs)
+        ]
+
+    booked_at = datetime.now()
+    table = database.Appointment.__table__
+    rows = [
+        {"patient_id": patient_id, "slot_id": slot_id, "booked_at": booked_at}
+        for i, (patient_id, slot_id) in enumerate(pairs) if i not in errors
+    ]
+    if db.get_bind().dialect.insert_executemany_returning:
+        inserted = db.execute(table.insert().returning(table.c.id, table.c.slot_id), rows)
+    else:
+        db.execute(table.insert(), rows)
+        # We hold every claimed slot, so its newest appointment is the one just inserted
+        inserted = db.execute(select(table.c.id, table.c.slot_id).where(
+            table.c.id.in_(select(func.max(table.c.id)).where(table.c.slot_id.in_(claimed)).group_by(table.c.slot_id))
+        ))
+    appointment_ids = {r.slot_id: r.id for r in inserted}
+
+    deltas = capacity.new_deltas()
+    changes = []
+    results = []
+    for i, (patient_id, slot_id) in enumerate(pairs):
+        if i in errors:
+            results.append({"patient_id": patient_id, "slot_id": slot_id, "status": "failed", "error": errors[i]})
+            continue
+        appointment = {"id": appointment_ids[slot_id], "patient_id": patient_id, "slot_id": slot_id, "booked_at": str(booked_at)}
+        slot = claimed[slot_id]
+        capacity.add(deltas, slot.doctor_id, slot.date, available_slots=-1, booked_slots=1, confirmed_appointments=1)
+        changes.append(("appointments", "INSERT", appointment["id"], appointment))
+        changes.append(("appointment_slots", "UPDATE", slot_id, {**serialize_slot(slot), "is_available": False}))
+        results.append({"patient_id": patient_id, "slot_id": slot_id, "status": "booked",
+                        "appointment_id": appointment["id"], "booked_at": appointment["booked_at"]})
+    capacity.apply(db, deltas)
+    database.record_changes(db, changes)
+    return results
+
+APPOINTMENT_FIELDS = ["id", "patient_id", "slot_id", "booked_at"]
+
 @router.get("/list")
-async def list_appointments():
-    db = SessionLocal()
-    appointments = get_appointments(db)
-    db.close()
-    return [{"id": a.id, "patient_id": a.patient_id, "slot_id": a.slot_id, "booked_at": str(a.booked_at)} for a in appointments]
+def list_appointments(
+    request: Request,
+    response: Response,
+    patient_id: int = None,
+    doctor_id: int = None,
+    start_date: str = None,
+    end_date: str = None,
+    cursor: str = None,
+    limit: int = None,
+    fields: str = None,
+    db: Session = Depends(get_db)
+):
+    """List appointments, optionally filtered by patient, doctor or booking date"""
+    try:
+        # The doctor filter joins slots, so slot changes can alter the result
+        tables = ["appointments", "appointment_slots"] if doctor_id is not None else ["appointments"]
+        not_modified = conditional.check(db, request, response, tables)
+        if not_modified:
+            return not_modified
+        fields = parse_fields(fields, APPOINTMENT_FIELDS)
+        query = db.query(database.Appointment)
+        if patient_id is not None:
+            query = query.filter(database.Appointment.patient_id == patient_id)
+        if doctor_id is not None:
+            query = query.join(
+                database.AppointmentSlot,
+                database.Appointment.slot_id == database.AppointmentSlot.id
+            ).filter(database.AppointmentSlot.doctor_id == doctor_id)
+        if start_date:
+            query = query.filter(database.Appointment.booked_at >= datetime.fromisoformat(start_date))
+        if end_date:
+            # end_date is inclusive of the whole day
+            query = query.filter(database.Appointment.booked_at < datetime.combine(
+                date.fromisoformat(end_date) + timedelta(days=1), datetime.min.time()
+            ))
+        if limit is None:
+            return stream_list(query, database.Appointment.id, cursor, serialize_appointment, fields, response.headers)
+        appointments, next_cursor = paginate(query, database.Appointment.id, cursor, limit)
+        return page_response([project(serialize_appointment(a), fields) for a in appointments], next_cursor, limit)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
-@router.post("/")
-async def create_appointment(patient_id: int = Form(...), slot_id: int = Form(...)):
-    db = SessionLocal()
+# Everything /appointments/view joins
+VIEW_TABLES = ["appointments", "appointment_slots", "patients", "doctors", "cancellations"]
+
+def serialize_appointment_view(r):
+    return {
+        "id": r.id,
+        "patient_id": r.patient_id,
+        "patient_name": r.patient_name,
+        "patient_email": r.patient_email,
+        "slot_id": r.slot_id,
+        "doctor_id": r.doctor_id,
+        "doctor_name": r.doctor_name,
+        "specialty": r.specialty,
+        "date": str(r.date),
+        "start_time": str(r.start_time),
+        "end_time": str(r.end_time),
+        "booked_at": str(r.booked_at),
+        "cancelled": r.cancellation_id is not None,
+        "cancellation_reason": r.cancellation_reason,
+        "cancelled_at": str(r.cancelled_at) if r.cancelled_at else None
+    }
+
+@router.get("/view")
+def view_appointments(
+    request: Request,
+    response: Response,
+    patient_id: int = None,
+    doctor_id: int = None,
+    search: str = None,
+    start_date: str = None,
+    end_date: str = None,
+    status: str = None,
+    order: str = "desc",
+    cursor: str = None,
+    limit: int = 50,
+    db: Session = Depends(get_db)
+):
+    """
+    Appointments joined with their patient, doctor, slot and cancellation, in
+    schedule order (slot date, start time, id) with keyset pagination. One
+    query per page: the joins are primary-key/indexed lookups and the order
+    and date filters follow ix_appointment_slots_date_start.
+    search matches patient or doctor name; status is active or cancelled.
+    """
+    if order not in ("asc", "desc"):
+        raise HTTPException(status_code=400, detail="order must be 'asc' or 'desc'")
+    if status not in (None, "active", "cancelled"):
+        raise HTTPException(status_code=400, detail="status must be 'active' or 'cancelled'")
     try:
-        # Check if slot is available
-        slot = db.query(database.AppointmentSlot).filter(
-            database.AppointmentSlot.id == slot_id
-        ).first()
-        
-        if not slot:
-            raise HTTPException(status_code=404, detail="Slot not found")
-        
-        if not slot.is_available:
-            raise HTTPException(status_code=400, detail="Slot is not available")
-        
-        # Check if patient exists
-        patient = db.query(database.Patient).filter(
-            database.Patient.id == patient_id
-        ).first()
-        
-        if not patient:
-            raise HTTPException(status_code=404, detail="Patient not found")
-        
-        # Create appointment
-        appointment = database.Appointment(
-            patient_id=patient_id, 
-            slot_id=slot_id, 
-            booked_at=datetime.now()
+        not_modified = conditional.check(db, request, response, VIEW_TABLES)
+        if not_modified:
+            return not_modified
+        query = db.query(
+            database.Appointment.id,
+            database.Appointment.patient_id,
+            database.Patient.name.label('patient_name'),
+            database.Patient.email.label('patient_email'),
+            database.Appointment.slot_id,
+            database.AppointmentSlot.doctor_id,
+            database.Doctor.name.label('doctor_name'),
+            database.Doctor.specialty,
+            database.AppointmentSlot.date,
+            database.AppointmentSlot.start_time,
+            database.AppointmentSlot.end_time,
+            database.Appointment.booked_at,
+            database.Cancellation.id.label('cancellation_id'),
+            database.Cancellation.reason.label('cancellation_reason'),
+            database.Cancellation.cancelled_at
+        ).join(
+            database.AppointmentSlot, database.AppointmentSlot.id == database.Appointment.slot_id
+        ).outerjoin(
+            database.Patient, database.Patient.id == database.Appointment.patient_id
+        ).outerjoin(
+            database.Doctor, database.Doctor.id == database.AppointmentSlot.doctor_id
+        ).outerjoin(
+            database.Cancellation, database.Cancellation.appointment_id == database.Appointment.id
         )
-        db.add(appointment)
-        
-        # Mark slot as unavailable
-        slot.is_available = False
-        
+        if patient_id is not None:
+            query = query.filter(database.Appointment.patient_id == patient_id)
+        if doctor_id is not None:
+            query = query.filter(database.AppointmentSlot.doctor_id == doctor_id)
+        if start_date:
+            query = query.filter(database.AppointmentSlot.date >= date.fromisoformat(start_date))
+        if end_date:
+            query = query.filter(database.AppointmentSlot.date <= date.fromisoformat(end_date))
+        if search and search.strip():
+            pattern = f"%{search.strip()}%"
+            query = query.filter(or_(database.Patient.name.ilike(pattern), database.Doctor.name.ilike(pattern)))
+        if status == "active":
+            query = query.filter(database.Cancellation.id.is_(None))
+        elif status == "cancelled":
+            query = query.filter(database.Cancellation.id.isnot(None))
+
+        rows, next_cursor = paginate_keyset(
+            query,
+            [database.AppointmentSlot.date, database.AppointmentSlot.start_time, database.Appointment.id],
+            cursor,
+            limit,
+            descending=order == "desc"
+        )
+        return {"items": [serialize_appointment_view(r) for r in rows], "next_cursor": next_cursor}
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@router.get("/view-stats")
+def appointment_view_stats(request: Request, response: Response, db: Session = Depends(get_db)):
+    """Header counts for the appointments page, from the capacity rollup"""
+    not_modified = conditional.check(db, request, response, ["appointments", "appointment_slots"], date.today())
+    if not_modified:
+        return not_modified
+    rollup = database.DoctorDayCapacity
+    today = date.today()
+
+    def booked(*conditions):
+        return db.query(func.coalesce(func.sum(rollup.confirmed_appointments), 0)).filter(*conditions).scalar()
+
+    return {
+        "total": db.query(func.count(database.Appointment.id)).scalar(),
+        "today": booked(rollup.date == today),
+        "upcoming": booked(rollup.date > today),
+        "this_week": booked(rollup.date >= today, rollup.date <= today + timedelta(days=7))
+    }
+
+@router.post("/")
+def create_appointment(patient_id: int = Form(...), slot_id: int = Form(...), db: Session = Depends(get_db)):
+    try:
+        appointment = book_slot(db, patient_id, slot_id)
         db.commit()
-        db.refresh(appointment)
         
-        print(f"✅ Appointment created: ID={appointment.id}, Patient={patient_id}, Slot={slot_id}")
+        print(f"✅ Appointment created: ID={appointment['id']}, Patient={patient_id}, Slot={slot_id}")
         
-        return {"status": "success", "appointment_id": appointment.id}
+        return {"status": "success", "appointment_id": appointment["id"]}
     except HTTPException:
         db.rollback()
         raise
@@ -62,16 +364,14 @@ async def create_appointment(patient_id: int = Form(...), slot_id: int = Form(..
         db.rollback()
         print(f"❌ Error creating appointment: {str(e)}")
         raise HTTPException(status_code=400, detail=str(e))
-    finally:
-        db.close()
 
 @router.post("/update")
-async def update_appointment(
+def update_appointment(
     appointment_id: int = Form(...), 
     patient_id: int = Form(...), 
-    slot_id: int = Form(...)
+    slot_id: int = Form(...),
+    db: Session = Depends(get_db)
 ):
-    db = SessionLocal()
     try:
         # Get the existing appointment
         appointment = db.query(database.Appointment).filter(
@@ -97,16 +397,11 @@ async def update_appointment(
         
         # If changing to a new slot
         if old_slot_id != slot_id:
-            # Check if new slot is available
-            new_slot = db.query(database.AppointmentSlot).filter(
-                database.AppointmentSlot.id == slot_id
-            ).first()
-            
-            if not new_slot:
-                raise HTTPException(status_code=404, detail="New slot not found")
-            
-            if not new_slot.is_available:
-                raise HTTPException(status_code=400, detail="New slot is not available")
+            # Claim the new slot before releasing the old one
+            new_slot = claim_slot(db, slot_id)
+            database.record_change(db, "appointment_slots", "UPDATE", new_slot.id, serialize_slot(new_slot))
+            capacity.adjust(db, new_slot.doctor_id, new_slot.date, confirmed_appointments=1)
+            print(f"✅ Booked new slot: ID={slot_id}")
             
             # Release old slot
             old_slot = db.query(database.AppointmentSlot).filter(
@@ -114,17 +409,17 @@ async def update_appointment(
             ).first()
             
             if old_slot:
+                capacity.adjust(db, old_slot.doctor_id, old_slot.date, confirmed_appointments=-1)
+                capacity.availability_changed(db, old_slot.doctor_id, old_slot.date, old_slot.is_available, True)
                 old_slot.is_available = True
+                database.record_change(db, "appointment_slots", "UPDATE", old_slot.id, serialize_slot(old_slot))
                 print(f"✅ Released old slot: ID={old_slot_id}")
-            
-            # Mark new slot as unavailable
-            new_slot.is_available = False
-            print(f"✅ Booked new slot: ID={slot_id}")
         
         # Update appointment
         appointment.patient_id = patient_id
         appointment.slot_id = slot_id
         appointment.booked_at = datetime.now()
+        database.record_change(db, "appointments", "UPDATE", appointment.id, serialize_appointment(appointment))
         
         db.commit()
         
@@ -138,17 +433,14 @@ async def update_appointment(
         db.rollback()
         print(f"❌ Error updating appointment: {str(e)}")
         raise HTTPException(status_code=400, detail=str(e))
-    finally:
-        db.close()
 
 @router.post("/delete")
-async def delete_appointment(appointment_id: int = Form(...)):
+def delete_appointment(appointment_id: int = Form(...), db: Session = Depends(get_db)):
     """
     Delete an appointment without creating a cancellation record.
     This is a hard delete - use with caution!
     For cancellations with tracking, use the /cancellations/cancel-and-delete endpoint instead.
     """
-    db = SessionLocal()
     try:
         # Get the appointment
         appointment = db.query(database.Appointment).filter(
@@ -163,6 +455,7 @@ async def delete_appointment(appointment_id: int = Form(...)):
         
         # Delete the appointment
         db.delete(appointment)
+        database.record_change(db, "appointments", "DELETE", appointment_id, {"id": appointment_id})
         
         # Release the slot (make it available again)
         slot = db.query(database.AppointmentSlot).filter(
@@ -170,7 +463,10 @@ async def delete_appointment(appointment_id: int = Form(...)):
         ).first()
         
         if slot:
+            capacity.adjust(db, slot.doctor_id, slot.date, confirmed_appointments=-1)
+            capacity.availability_changed(db, slot.doctor_id, slot.date, slot.is_available, True)
             slot.is_available = True
+            database.record_change(db, "appointment_slots", "UPDATE", slot.id, serialize_slot(slot))
             print(f"✅ Released slot after appointment deletion: Slot ID={slot_id}")
         
         db.commit()
@@ -188,14 +484,13 @@ async def delete_appointment(appointment_id: int = Form(...)):
         db.rollback()
         print(f"❌ Error deleting appointment: {str(e)}")
         raise HTTPException(status_code=400, detail=str(e))
-    finally:
-        db.close()
 
 @router.post("/cancel")
-async def cancel_appointment(
+def cancel_appointment(
     appointment_id: int = Form(...),
     reason: str = Form(None),
-    delete_appointment: bool = Form(False)
+    delete_appointment: bool = Form(False),
+    db: Session = Depends(get_db)
 ):
     """
     Cancel an appointment with proper tracking.
@@ -205,7 +500,6 @@ async def cancel_appointment(
         reason: Reason for cancellation
         delete_appointment: If True, deletes the appointment after recording cancellation
     """
-    db = SessionLocal()
     try:
         # Check if appointment exists
         appointment = db.query(database.Appointment).filter(
@@ -240,18 +534,23 @@ async def cancel_appointment(
         )
         db.add(cancellation)
         db.flush()
+        database.record_change(db, "cancellations", "INSERT", cancellation.id, serialize_cancellation(cancellation))
         
         # Optionally delete the appointment
         if delete_appointment:
             db.delete(appointment)
+            database.record_change(db, "appointments", "DELETE", appointment_id, {"id": appointment_id})
         
         # Release the slot
         if slot:
+            if delete_appointment:
+                capacity.adjust(db, slot.doctor_id, slot.date, confirmed_appointments=-1)
+            capacity.availability_changed(db, slot.doctor_id, slot.date, slot.is_available, True)
             slot.is_available = True
+            database.record_change(db, "appointment_slots", "UPDATE", slot.id, serialize_slot(slot))
             print(f"✅ Slot released after cancellation: Slot ID={slot_id}")
         
         db.commit()
-        db.refresh(cancellation)
         
         print(f"✅ Appointment cancelled: ID={appointment_id}, Cancellation ID={cancellation.id}")
         
@@ -271,25 +570,19 @@ async def cancel_appointment(
         db.rollback()
         print(f"❌ Error cancelling appointment: {str(e)}")
         raise HTTPException(status_code=400, detail=str(e))
-    finally:
-        db.close()
 
 @router.get("/check-cancellation/{appointment_id}")
-async def check_cancellation(appointment_id: int):
+def check_cancellation(appointment_id: int, db: Session = Depends(get_db)):
     """Check if an appointment has been cancelled"""
-    db = SessionLocal()
-    try:
-        cancellation = db.query(database.Cancellation).filter(
-            database.Cancellation.appointment_id == appointment_id
-        ).first()
-        
-        return {
-            "is_cancelled": cancellation is not None,
-            "cancellation": {
-                "id": cancellation.id,
-                "reason": cancellation.reason,
-                "cancelled_at": str(cancellation.cancelled_at)
-            } if cancellation else None
-        }
-    finally:
-        db.close()
\ No newline at end of file
+    cancellation = db.query(database.Cancellation).filter(
+        database.Cancellation.appointment_id == appointment_id
+    ).first()
+        
+    return {
+        "is_cancelled": cancellation is not None,
+        "cancellation": {
+            "id": cancellation.id,
+            "reason": cancellation.reason,
+            "cancelled_at": str(cancellation.cancelled_at)
+        } if cancellation else None
+    }
\ No newline at end of file
@@ -1,196 +1,267 @@
-from fastapi import APIRouter, HTTPException, Form
-from sqlalchemy import func, and_, or_, case
-from db.database import SessionLocal
+from fastapi import APIRouter, HTTPException, Form, Depends
+from sqlalchemy import func, and_, case
+from db.database import get_db
+from sqlalchemy.orm import Session
 from db import database
 from datetime import datetime, date, time, timedelta
+from services.appointments import book_slot, book_slots, parse_booking_pairs
+from services.cache import ResultCache, caches
+from services.slot_index import slot_index
+from services import broadcast
 
 router = APIRouter()
 
+availability_cache = ResultCache("availability")
+
+BATCH_MODES = ("all_or_nothing", "best_effort")
+MAX_BATCH_BOOKINGS = 100
+
+def _text_filter(value):
+    value = (value or "").strip().lower()
+    return value or None
+
+def _date_filter(value):
+    return date.fromisoformat(value) if value else None
+
+def _matches(needle, value):
+    """Python equivalent of the ilike('%needle%') filters; wildcards match anything"""
+    if needle is None:
+        return True
+    if "%" in needle or "_" in needle:
+        return True
+    return needle in (value or "").lower()
+
+def _search_matches_doctor(key, doctor):
+    _, specialty, doctor_name, _, _ = key
+    return _matches(specialty, doctor.get("specialty")) and _matches(doctor_name, doctor.get("name"))
+
+@broadcast.subscribe
+@database.on_commit
+def invalidate_availability(changes):
+    """
+    Drop cached availability results affected by committed changes: this
+    process's writes right at commit, other workers' writes when the
+    broadcast delivers them. Slot changes carry their doctor; appointments
+    only matter through the slot availability updates recorded alongside them.
+    """
+    for _, table, action, record_id, data in changes:
+        if action == broadcast.REFRESH:
+            availability_cache.clear()
+            return
+        data = data or {}
+        if table == "appointment_slots":
+            doctor_ids = {data.get("doctor_id"), data.get("previous_doctor_id"), *data.get("doctor_ids", [])} - {None}
+            if not doctor_ids:
+                availability_cache.clear()
+                return
+            for doctor_id in doctor_ids:
+                availability_cache.invalidate_tag(f"doctor:{doctor_id}")
+        elif table == "doctors":
+            availability_cache.invalidate_tag(f"doctor:{record_id}")
+            if "name" in data or "specialty" in data:
+                availability_cache.invalidate_where(
+                    lambda key: key[0] == "search" and _search_matches_doctor(key, data)
+                )
+            elif action != "DELETE":
+                availability_cache.invalidate_where(lambda key: key[0] == "search")
+
 @router.get("/search-availability")
-async def search_availability(
+def search_availability(
     specialty: str = None,
     doctor_name: str = None,
     start_date: str = None,
-    end_date: str = None
+    end_date: str = None,
+    db: Session = Depends(get_db)
 ):
     """
     Complex query to search for doctor availability with multiple filters
     Returns doctors with their available slots count and details
     """
-    db = SessionLocal()
     try:
-        # Build complex query with joins and aggregations
-        query = db.query(
-            database.Doctor.id.label('doctor_id'),
-            database.Doctor.name.label('doctor_name'),
-            database.Doctor.specialty.label('specialty'),
-            func.count(database.AppointmentSlot.id).label('total_slots'),
-            func.sum(
-                case(
-                    (database.AppointmentSlot.is_available == True, 1),
-                    else_=0
-                )
-            ).label('available_slots'),
-            func.min(database.AppointmentSlot.date).label('earliest_date'),
-            func.max(database.AppointmentSlot.date).label('latest_date')
-        ).outerjoin(
-            database.AppointmentSlot,
-            database.Doctor.id == database.AppointmentSlot.doctor_id
-        ).group_by(
-            database.Doctor.id,
-            database.Doctor.name,
-            database.Doctor.specialty
-        )
-        
-        # Apply filters
-        if specialty:
-            query = query.filter(database.Doctor.specialty.ilike(f'%{specialty}%'))
-        
-        if doctor_name:
-            query = query.filter(database.Doctor.name.ilike(f'%{doctor_name}%'))
-        
-        if start_date:
-            query = query.filter(
-                or_(
-                    database.AppointmentSlot.date >= start_date,
-                    database.AppointmentSlot.date.is_(None)
-                )
-            )
-        
-        if end_date:
-            query = query.filter(
-                or_(
-                    database.AppointmentSlot.date <= end_date,
-                    database.AppointmentSlot.date.is_(None)
-                )
+        key = ("search", _text_filter(specialty), _text_filter(doctor_name), _date_filter(start_date), _date_filter(end_date))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return availability_cache.get_or_compute(
+        key,
+        lambda: _search_availability(db, *key[1:]),
+        tags=lambda results: [f"doctor:{r['doctor_id']}" for r in results]
+    )
+
+def _search_availability(db, specialty, doctor_name, start_date, end_date):
+    # Date filters are part of the join, so every doctor matching the
+    # text filters is listed (with zero counts if nothing is in range)
+    join_on = [database.Doctor.id == database.AppointmentSlot.doctor_id]
+    if start_date:
+        join_on.append(database.AppointmentSlot.date >= start_date)
+    if end_date:
+        join_on.append(database.AppointmentSlot.date <= end_date)
+
+    # Build complex query with joins and aggregations
+    query = db.query(
+        database.Doctor.id.label('doctor_id'),
+        database.Doctor.name.label('doctor_name'),
+        database.Doctor.specialty.label('specialty'),
+        func.count(database.AppointmentSlot.id).label('total_slots'),
+        func.sum(
+            case(
+                (database.AppointmentSlot.is_available == True, 1),
+                else_=0
             )
-        
-        results = query.all()
-        
-        return [
-            {
-                "doctor_id": r.doctor_id,
-                "doctor_name": r.doctor_name,
-                "specialty": r.specialty,
-                "total_slots": r.total_slots or 0,
-                "available_slots": r.available_slots or 0,
-                "earliest_date": str(r.earliest_date) if r.earliest_date else None,
-                "latest_date": str(r.latest_date) if r.latest_date else None
-            }
-            for r in results
-        ]
-    finally:
-        db.close()
+        ).label('available_slots'),
+        func.min(database.AppointmentSlot.date).label('earliest_date'),
+        func.max(database.AppointmentSlot.date).label('latest_date')
+    ).outerjoin(
+        database.AppointmentSlot,
+        and_(*join_on)
+    ).group_by(
+        database.Doctor.id,
+        database.Doctor.name,
+        database.Doctor.specialty
+    )
+    
+    # Apply filters
+    if specialty:
+        query = query.filter(database.Doctor.specialty.ilike(f'%{specialty}%'))
+    
+    if doctor_name:
+        query = query.filter(database.Doctor.name.ilike(f'%{doctor_name}%'))
+    
+    results = query.all()
+    
+    return [
+        {
+            "doctor_id": r.doctor_id,
+            "doctor_name": r.doctor_name,
+            "specialty": r.specialty,
+            "total_slots": r.total_slots or 0,
+            "available_slots": r.available_slots or 0,
+            "earliest_date": str(r.earliest_date) if r.earliest_date else None,
+            "latest_date": str(r.latest_date) if r.latest_date else None
+        }
+        for r in results
+    ]
 
 @router.get("/doctor-slots/{doctor_id}")
-async def get_doctor_slots(
+def get_doctor_slots(
     doctor_id: int,
     start_date: str = None,
     end_date: str = None,
-    available_only: bool = True
+    available_only: bool = True,
+    db: Session = Depends(get_db)
 ):
     """
     Get detailed slots for a specific doctor with filtering
     """
-    db = SessionLocal()
     try:
-        query = db.query(
-            database.AppointmentSlot.id,
-            database.AppointmentSlot.date,
-            database.AppointmentSlot.start_time,
-            database.AppointmentSlot.end_time,
-            database.AppointmentSlot.is_available,
-            database.Doctor.name.label('doctor_name'),
-            database.Doctor.specialty
-        ).join(
-            database.Doctor,
-            database.AppointmentSlot.doctor_id == database.Doctor.id
-        ).filter(
-            database.AppointmentSlot.doctor_id == doctor_id
-        )
-        
-        if available_only:
-            query = query.filter(database.AppointmentSlot.is_available == True)
-        
-        if start_date:
-            query = query.filter(database.AppointmentSlot.date >= start_date)
-        
-        if end_date:
-            query = query.filter(database.AppointmentSlot.date <= end_date)
-        
-        query = query.order_by(
-            database.AppointmentSlot.date,
-            database.AppointmentSlot.start_time
-        )
-        
-        results = query.all()
-        
-        return [
-            {
-                "slot_id": r.id,
-                "date": str(r.date),
-                "start_time": str(r.start_time),
-                "end_time": str(r.end_time),
-                "is_available": r.is_available,
-                "doctor_name": r.doctor_name,
-                "specialty": r.specialty
-            }
-            for r in results
-        ]
-    finally:
-        db.close()
+        key = ("doctor-slots", doctor_id, _date_filter(start_date), _date_filter(end_date), available_only)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return availability_cache.get_or_compute(
+        key,
+        lambda: _doctor_slots(db, *key[1:]),
+        tags=lambda results: [f"doctor:{doctor_id}"]
+    )
+
+def _doctor_slots(db, doctor_id, start_date, end_date, available_only):
+    query = db.query(
+        database.AppointmentSlot.id,
+        database.AppointmentSlot.date,
+        database.AppointmentSlot.start_time,
+        database.AppointmentSlot.end_time,
+        database.AppointmentSlot.is_available,
+        database.Doctor.name.label('doctor_name'),
+        database.Doctor.specialty
+    ).join(
+        database.Doctor,
+        database.AppointmentSlot.doctor_id == database.Doctor.id
+    ).filter(
+        database.AppointmentSlot.doctor_id == doctor_id
+    )
+    
+    if available_only:
+        query = query.filter(database.AppointmentSlot.is_available == True)
+    
+    if start_date:
+        query = query.filter(database.AppointmentSlot.date >= start_date)
+    
+    if end_date:
+        query = query.filter(database.AppointmentSlot.date <= end_date)
+    
+    query = query.order_by(
+        database.AppointmentSlot.date,
+        database.AppointmentSlot.start_time
+    )
+    
+    results = query.all()
+    
+    return [
+        {
+            "slot_id": r.id,
+            "date": str(r.date),
+            "start_time": str(r.start_time),
+            "end_time": str(r.end_time),
+            "is_available": r.is_available,
+            "doctor_name": r.doctor_name,
+            "specialty": r.specialty
+        }
+        for r in results
+    ]
+
+@router.get("/next-available")
+def next_available(
+    specialty: str = None,
+    doctor_id: int = None,
+    after: str = None,
+    limit: int = 10
+):
+    """
+    The next `limit` free slots for a specialty (or one doctor) at or after
+    `after` (ISO date or datetime, default now), answered from the in-memory
+    slot index without a database query.
+    """
+    if specialty is None and doctor_id is None:
+        raise HTTPException(status_code=400, detail="specialty or doctor_id is required")
+    if limit < 1 or limit > 100:
+        raise HTTPException(status_code=400, detail="limit must be between 1 and 100")
+    try:
+        after = datetime.fromisoformat(after) if after else None
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return slot_index.next_available(doctor_id=doctor_id, specialty=specialty, after=after, limit=limit)
+
+@router.get("/cache-stats")
+def cache_stats():
+    """Hit/miss counters for the availability result cache"""
+    return {name: cache.stats() for name, cache in caches.items()}
 
 @router.get("/capacity-analysis")
-async def capacity_analysis(start_date: str = None, end_date: str = None):
+def capacity_analysis(start_date: str = None, end_date: str = None, db: Session = Depends(get_db)):
     """
-    Complex analytical query showing doctor capacity utilization
+    Doctor capacity utilization, read from the doctor_day_capacity rollup.
+    The rollup is kept current by every slot, booking and cancellation write,
+    so this sums a few rows per doctor-day instead of scanning every slot and
+    appointment in the range.
     """
-    db = SessionLocal()
     try:
-        # Complex query with subqueries and calculations
+        rollup = database.DoctorDayCapacity
+        join_on = [rollup.doctor_id == database.Doctor.id]
+        if start_date:
+            join_on.append(rollup.date >= date.fromisoformat(start_date))
+        if end_date:
+            join_on.append(rollup.date <= date.fromisoformat(end_date))
+
+        # Range filters live in the join so doctors without slots still appear
         query = db.query(
             database.Doctor.id,
             database.Doctor.name,
             database.Doctor.specialty,
-            func.count(database.AppointmentSlot.id).label('total_slots'),
-            func.sum(
-                case(
-                    (database.AppointmentSlot.is_available == True, 1),
-                    else_=0
-                )
-            ).label('available_slots'),
-            func.sum(
-                case(
-                    (database.AppointmentSlot.is_available == False, 1),
-                    else_=0
-                )
-            ).label('booked_slots'),
-            func.count(database.Appointment.id).label('confirmed_appointments')
+            func.sum(rollup.total_slots).label('total_slots'),
+            func.sum(rollup.available_slots).label('available_slots'),
+            func.sum(rollup.booked_slots).label('booked_slots'),
+            func.sum(rollup.confirmed_appointments).label('confirmed_appointments')
         ).outerjoin(
-            database.AppointmentSlot,
-            database.Doctor.id == database.AppointmentSlot.doctor_id
-        ).outerjoin(
-            database.Appointment,
-            database.AppointmentSlot.id == database.Appointment.slot_id
-        )
-        
-        if start_date:
-            query = query.filter(
-                or_(
-                    database.AppointmentSlot.date >= start_date,
-                    database.AppointmentSlot.date.is_(None)
-                )
-            )
-        
-        if end_date:
-            query = query.filter(
-                or_(
-                    database.AppointmentSlot.date <= end_date,
-                    database.AppointmentSlot.date.is_(None)
-                )
-            )
-        
-        query = query.group_by(
+            rollup, and_(*join_on)
+        ).group_by(
             database.Doctor.id,
             database.Doctor.name,
             database.Doctor.specialty
@@ -214,71 +285,31 @@ async def capacity_analysis(start_date: str = None, end_date: str = None):
             }
             for r in results
         ]
-    finally:
-        db.close()
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
 @router.post("/book-appointment")
-async def book_appointment(
+def book_appointment(
     patient_id: int = Form(...),
-    slot_id: int = Form(...)
+    slot_id: int = Form(...),
+    db: Session = Depends(get_db)
 ):
     """
-    Book appointment with transaction safety and slot availability check
+    Book appointment with an atomic slot claim: one conditional UPDATE decides
+    which concurrent request wins the slot, so double bookings are impossible
     """
-    db = SessionLocal()
     try:
-        # Start by checking if slot exists and is available
-        slot = db.query(database.AppointmentSlot).filter(
-            database.AppointmentSlot.id == slot_id
-        ).first()
-        
-        if not slot:
-            raise HTTPException(status_code=404, detail="Slot not found")
-        
-        if not slot.is_available:
-            raise HTTPException(status_code=400, detail="Slot is no longer available")
-        
-        # Check if patient exists
-        patient = db.query(database.Patient).filter(
-            database.Patient.id == patient_id
-        ).first()
-        
-        if not patient:
-            raise HTTPException(status_code=404, detail="Patient not found")
-        
-        # Check if there's already an appointment for this slot
-        existing_appointment = db.query(database.Appointment).filter(
-            database.Appointment.slot_id == slot_id
-        ).first()
-        
-        if existing_appointment:
-            raise HTTPException(status_code=400, detail="This slot already has an appointment")
-        
-        # Create appointment FIRST
-        appointment = database.Appointment(
-            patient_id=patient_id,
-            slot_id=slot_id,
-            booked_at=datetime.now()
-        )
-        db.add(appointment)
-        
-        # Mark slot as unavailable AFTER creating appointment
-        slot.is_available = False
-        
-        # Commit both changes together
+        appointment = book_slot(db, patient_id, slot_id)
         db.commit()
         
-        # Refresh to get the ID
-        db.refresh(appointment)
-        
-        print(f"✅ Appointment created successfully: ID={appointment.id}, Patient={patient_id}, Slot={slot_id}")
+        print(f"✅ Appointment created successfully: ID={appointment['id']}, Patient={patient_id}, Slot={slot_id}")
         
         return {
             "status": "success",
-            "appointment_id": appointment.id,
+            "appointment_id": appointment["id"],
             "patient_id": patient_id,
             "slot_id": slot_id,
-            "booked_at": str(appointment.booked_at),
+            "booked_at": appointment["booked_at"],
             "message": "Appointment booked successfully"
         }
         
@@ -289,5 +320,53 @@ async def book_appointment(
         db.rollback()
         print(f"❌ Error booking appointment: {str(e)}")
         raise HTTPException(status_code=400, detail=f"Failed to book appointment: {str(e)}")
-    finally:
-        db.close()
\ No newline at end of file
+
+@router.post("/book-batch")
+def book_batch(
+    bookings: str = Form(...),
+    mode: str = Form("all_or_nothing"),
+    db: Session = Depends(get_db)
+):
+    """
+    Book several slots in one transaction, e.g. a consult, a scan and a
+    follow-up. `bookings` is a comma-separated list of patient_id:slot_id
+    pairs. mode=all_or_nothing books nothing unless every pair can be
+    booked; mode=best_effort books the pairs that can be. Returns a result
+    per pair. The statement count does not grow with the number of pairs.
+    """
+    try:
+        if mode not in BATCH_MODES:
+            raise HTTPException(status_code=400, detail=f"mode must be one of {', '.join(BATCH_MODES)}")
+        try:
+            pairs = parse_booking_pairs(bookings)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="bookings must be comma-separated patient_id:slot_id pairs")
+        if not pairs:
+            raise HTTPException(status_code=400, detail="No bookings given")
+        if len(pairs) > MAX_BATCH_BOOKINGS:
+            raise HTTPException(status_code=400, detail=f"At most {MAX_BATCH_BOOKINGS} bookings per batch")
+
+        results = book_slots(db, pairs, all_or_nothing=mode == "all_or_nothing")
+        booked = sum(1 for r in results if r["status"] == "booked")
+        if booked == 0:
+            db.rollback()
+            raise HTTPException(status_code=400, detail={"message": "No appointments were booked", "results": results})
+        db.commit()
+
+        print(f"✅ Batch booked {booked} of {len(pairs)} appointments ({mode})")
+
+        return {
+            "status": "success" if booked == len(pairs) else "partial",
+            "mode": mode,
+            "booked": booked,
+            "failed": len(pairs) - booked,
+            "results": results
+        }
+
+    except HTTPException:
+        db.rollback()
+        raise
+    except Exception as e:
+        db.rollback()
+        print(f"❌ Error batch booking appointments: {str(e)}")
+        raise HTTPException(status_code=400, detail=f"Failed to book appointments: {str(e)}")
\ No newline at end of file
@@ -0,0 +1,304 @@
+"""
+Delivery of committed changes to every app process.
+
+Each process hands the changes it commits (database.on_commit) to the
+broadcast backend, and gets back, on its event loop, the changes committed
+by every process sharing the backend, its own included. Subscribers fan
+them out to WebSocket clients and drop stale entries from in-process caches.
+
+Set BROADCAST_BACKEND to pick the backend:
+  memory    this process only (default; a single worker)
+  database  every process polls the changes table once per
+            BROADCAST_POLL_INTERVAL; works across hosts and also picks up
+            writes made by other tools
+  unix      pushed over a Unix domain socket at BROADCAST_SOCKET, for
+            workers on one host. The first process to bind the socket
+            relays for the others; if it exits, another one takes over, and
+            every process fills the gap from the changes table when it
+            reconnects.
+
+Changes are (change_id, table_name, action, record_id, data) tuples. A
+subscriber may see the same change twice (e.g. pushed and then replayed
+after a reconnect), so applying one has to be idempotent.
+"""
+from contextlib import contextmanager
+from starlette.concurrency import run_in_threadpool
+from sqlalchemy import func
+from db.database import SessionLocal
+from db import database
+import asyncio
+import fcntl
+import json
+import os
+import socket
+import tempfile
+
+BROADCAST_BACKEND = os.getenv('BROADCAST_BACKEND', 'memory')
+BROADCAST_SOCKET = os.getenv('BROADCAST_SOCKET', os.path.join(tempfile.gettempdir(), 'clinic-broadcast.sock'))
+BROADCAST_POLL_INTERVAL = float(os.getenv('BROADCAST_POLL_INTERVAL', '1.0'))
+RECONNECT_DELAY = 0.2
+# Read from the changes table at most this many at a time; more means "reload"
+MAX_BATCH = 500
+REFRESH = "REFRESH"
+
+_subscribers = []
+
+def subscribe(listener):
+    """Register listener(changes), plain or async, to run on the event loop for every delivered batch"""
+    _subscribers.append(listener)
+    return listener
+
+def deliver(changes):
+    for listener in _subscribers:
+        try:
+            result = listener(changes)
+            if asyncio.iscoroutine(result):
+                asyncio.ensure_future(result)
+        except Exception as e:
+            print(f"❌ Broadcast subscriber {listener.__name__} failed: {str(e)}")
+
+def latest_change_id():
+    db = SessionLocal()
+    try:
+        return db.query(func.max(database.Change.id)).scalar() or 0
+    finally:
+        db.close()
+
+def changes_since(last_change_id):
+    """
+    Changes recorded after `last_change_id`, in id order. If there are more
+    than MAX_BATCH, returns one REFRESH change per table instead, with the
+    latest id, so subscribers reload rather than replay them.
+    """
+    db = SessionLocal()
+    try:
+        rows = db.query(
+            database.Change.id,
+            database.Change.table_name,
+            database.Change.action,
+            database.Change.record_id,
+            database.Change.payload
+        ).filter(database.Change.id > last_change_id).order_by(database.Change.id).limit(MAX_BATCH + 1).all()
+        if len(rows) > MAX_BATCH:
+            latest = db.query(func.max(database.Change.id)).scalar()
+            tables = db.query(database.Change.table_name).filter(
+                database.Change.id > last_change_id
+            ).distinct().all()
+            return [(latest, t.table_name, REFRESH, 0, None) for t in tables]
+        return [(c.id, c.table_name, c.action, c.record_id, json.loads(c.payload) if c.payload else None)
+                for c in rows]
+    finally:
+        db.close()
+
+class MemoryBroadcast:
+    """Changes committed by this process, delivered on its event loop"""
+
+    def __init__(self, deliver):
+        self.deliver = deliver
+        self.loop = None
+
+    async def start(self):
+        self.loop = asyncio.get_running_loop()
+
+    async def stop(self):
+        self.loop = None
+
+    def publish(self, changes):
+        # Commits happen in threadpool workers; hop onto the event loop
+        if self.loop is not None:
+            self.loop.call_soon_threadsafe(self.deliver, changes)
+
+class DatabaseBroadcast:
+    """One poll of the changes table per interval, for every table and every writer"""
+
+    def __init__(self, deliver, interval=BROADCAST_POLL_INTERVAL):
+        self.deliver = deliver
+        self.interval = interval
+        self.last_change_id = 0
+        self.task = None
+
+    async def start(self):
+        # Only changes made after startup are delivered
+        self.last_change_id = await run_in_threadpool(latest_change_id)
+        self.task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        if self.task:
+            self.task.cancel()
+            await asyncio.gather(self.task, return_exceptions=True)
+            self.task = None
+
+    def publish(self, changes):
+        pass  # already in the changes table
+
+    async def poll(self):
+        changes = await run_in_threadpool(changes_since, self.last_change_id)
+        if changes:
+            self.last_change_id = max(c[0] for c in changes)
+            self.deliver(changes)
+
+    async def run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.poll()
+            except Exception as e:
+                print(f"❌ Broadcast poll error: {str(e)}")
+
+class UnixSocketBroadcast:
+    """
+    Newline-delimited JSON batches over a Unix domain socket. Whichever
+    process binds `path` first is the hub: it delivers what its peers send
+    and relays it to the other peers. Every other process is a peer of the
+    hub. A peer that loses the hub runs the election again.
+    """
+
+    def __init__(self, deliver, path=BROADCAST_SOCKET, catch_up=True):
+        self.deliver = deliver
+        self.path = path
+        self.catch_up = catch_up  # fill gaps from the changes table
+        self.loop = None
+        self.task = None
+        self.server = None
+        self.peers = set()  # hub: writers to connected peers
+        self.hub = None     # peer: writer to the hub
+        self.last_change_id = 0
+        self.connected = asyncio.Event()
+
+    async def start(self):
+        self.loop = asyncio.get_running_loop()
+        if self.catch_up:
+            self.last_change_id = await run_in_threadpool(latest_change_id)
+        self.task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        if self.task:
+            self.task.cancel()
+            await asyncio.gather(self.task, return_exceptions=True)
+            self.task = None
+        self.loop = None
+
+    @property
+    def is_hub(self):
+        return self.server is not None
+
+    def publish(self, changes):
+        if self.loop is not None:
+            self.loop.call_soon_threadsafe(self._send, changes)
+
+    def _send(self, changes):
+        self._receive(changes)
+        line = (json.dumps(changes, default=str) + "\n").encode()
+        for writer in list(self.peers) + ([self.hub] if self.hub else []):
+            writer.write(line)
+
+    def _receive(self, changes):
+        changes = [tuple(c) for c in changes]
+        self.last_change_id = max([self.last_change_id] + [c[0] for c in changes if c[0] is not None])
+        self.deliver(changes)
+
+    @contextmanager
+    def _election_lock(self):
+        with open(self.path + ".lock", "w") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def _elect(self):
+        """A listening socket if this process becomes the hub, None if a live hub holds the path"""
+        with self._election_lock():
+            probe = socket.socket(socket.AF_UNIX)
+            try:
+                probe.connect(self.path)
+                return None
+            except (FileNotFoundError, ConnectionRefusedError):
+                pass
+            finally:
+                probe.close()
+            if os.path.exists(self.path):
+                os.unlink(self.path)  # left behind by a hub that died
+            listener = socket.socket(socket.AF_UNIX)
+            listener.bind(self.path)
+            listener.listen(128)
+            return listener
+
+    async def _fill_gap(self):
+        if self.catch_up:
+            changes = await run_in_threadpool(changes_since, self.last_change_id)
+            if changes:
+                self._receive(changes)
+
+    async def run(self):
+        while True:
+            try:
+                listener = await run_in_threadpool(self._elect)
+                if listener is not None:
+                    await self._serve(listener)
+                else:
+                    await self._join()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"❌ Broadcast socket error: {str(e)}")
+            self.connected.clear()
+            await asyncio.sleep(RECONNECT_DELAY)
+
+    async def _serve(self, listener):
+        self.server = await asyncio.start_unix_server(self._handle_peer, sock=listener)
+        print(f"✅ Broadcast hub listening on {self.path}")
+        self.connected.set()
+        try:
+            await self._fill_gap()
+            await self.server.serve_forever()
+        finally:
+            with self._election_lock():
+                self.server.close()
+                if os.path.exists(self.path):
+                    os.unlink(self.path)
+            self.server = None
+            # Peers see EOF and elect a new hub
+            for writer in list(self.peers):
+                writer.close()
+            self.peers.clear()
+
+    async def _handle_peer(self, reader, writer):
+        self.peers.add(writer)
+        try:
+            while line := await reader.readline():
+                self._receive(json.loads(line))
+                for peer in list(self.peers):
+                    if peer is not writer:
+                        peer.write(line)
+        except (ConnectionError, ValueError):
+            pass
+        finally:
+            self.peers.discard(writer)
+            writer.close()
+
+    async def _join(self):
+        reader, self.hub = await asyncio.open_unix_connection(self.path)
+        self.connected.set()
+        try:
+            await self._fill_gap()
+            while line := await reader.readline():
+                self._receive(json.loads(line))
+        finally:
+            self.hub.close()
+            self.hub = None
+
+BACKENDS = {"memory": MemoryBroadcast, "database": DatabaseBroadcast, "unix": UnixSocketBroadcast}
+
+if BROADCAST_BACKEND not in BACKENDS:
+    raise ValueError(f"BROADCAST_BACKEND must be one of {', '.join(BACKENDS)}, not {BROADCAST_BACKEND!r}")
+
+backend = BACKENDS[BROADCAST_BACKEND](deliver)
+database.on_commit(backend.publish)
+
+async def start():
+    """Start delivering changes (called from the app lifespan)"""
+    await backend.start()
+
+async def stop():
+    await backend.stop()
@@ -0,0 +1,225 @@
+from fastapi import APIRouter, HTTPException, UploadFile, File
+from fastapi.responses import StreamingResponse
+from sqlalchemy import select
+from db.database import SessionLocal
+from db import database, capacity
+from services.doctors import serialize_doctor, DOCTOR_FIELDS
+from services.patients import serialize_patient, PATIENT_FIELDS
+from services.slots import serialize_slot, SLOT_FIELDS
+from services.listing import stream_rows
+from datetime import date as date_type, time as time_type
+import codecs
+import csv
+import io
+import json
+
+router = APIRouter()
+
+CHUNK_SIZE = 1000
+BATCH_SIZE = 1000
+
+def _text(value):
+    value = (value or "").strip() if isinstance(value, str) else value
+    if not value:
+        raise ValueError("must not be empty")
+    return value
+
+def _optional_int(value):
+    return int(value) if value not in (None, "") else None
+
+def _bool(value):
+    if isinstance(value, bool):
+        return value
+    if value in (None, ""):
+        return True
+    if str(value).strip().lower() in ("1", "true", "yes"):
+        return True
+    if str(value).strip().lower() in ("0", "false", "no"):
+        return False
+    raise ValueError(f"invalid boolean {value!r}")
+
+def _iso(parse):
+    return lambda value: value if not isinstance(value, str) else parse(value.strip())
+
+# table -> (model, serializer, exported fields, importers per column)
+TRANSFERS = {
+    "doctors": (database.Doctor, serialize_doctor, DOCTOR_FIELDS, {
+        "id": _optional_int, "name": _text, "specialty": _text
+    }),
+    "patients": (database.Patient, serialize_patient, PATIENT_FIELDS, {
+        "id": _optional_int, "name": _text, "email": _text
+    }),
+    "appointment_slots": (database.AppointmentSlot, serialize_slot, SLOT_FIELDS, {
+        "id": _optional_int,
+        "doctor_id": int,
+        "date": _iso(date_type.fromisoformat),
+        "start_time": _iso(time_type.fromisoformat),
+        "end_time": _iso(time_type.fromisoformat),
+        "is_available": _bool
+    }),
+}
+
+def get_transfer(table):
+    if table not in TRANSFERS:
+        raise HTTPException(status_code=404, detail=f"Unknown table: {table}")
+    return TRANSFERS[table]
+
+def table_rows(model, chunk_size=CHUNK_SIZE):
+    table = model.__table__
+    return stream_rows(select(*table.c).order_by(table.c.id), chunk_size)
+
+def export_ndjson(model, serialize):
+    for rows in table_rows(model):
+        yield "".join(json.dumps(serialize(r)) + "\n" for r in rows)
+
+def export_csv(model, serialize, fields):
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=fields)
+    writer.writeheader()
+    for rows in table_rows(model):
+        for r in rows:
+            writer.writerow(serialize(r))
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    yield buffer.getvalue()
+
+@router.get("/{table}/export")
+def export_table(table: str, format: str = "ndjson"):
+    """Stream a whole table as NDJSON or CSV in constant memory"""
+    model, serialize, fields, _ = get_transfer(table)
+    if format == "ndjson":
+        return StreamingResponse(
+            export_ndjson(model, serialize),
+            media_type="application/x-ndjson",
+            headers={"Content-Disposition": f'attachment; filename="{table}.ndjson"'}
+        )
+    if format == "csv":
+        return StreamingResponse(
+            export_csv(model, serialize, fields),
+            media_type="text/csv",
+            headers={"Content-Disposition": f'attachment; filename="{table}.csv"'}
+        )
+    raise HTTPException(status_code=400, detail="format must be 'ndjson' or 'csv'")
+
+def read_records(upload, format):
+    """Yield (line_number, record) from an uploaded NDJSON or CSV stream, one line at a time"""
+    text = codecs.getreader("utf-8")(upload.file)
+    if format == "csv":
+        reader = csv.DictReader(text)
+        for record in reader:
+            yield reader.line_num, record
+    else:
+        for line_number, line in enumerate(text, start=1):
+            if line.strip():
+                yield line_number, line
+
+def convert(record, importers):
+    if isinstance(record, str):
+        record = json.loads(record)
+        if not isinstance(record, dict):
+            raise ValueError("expected a JSON object")
+    row = {}
+    for column, parse in importers.items():
+        try:
+            value = parse(record.get(column))
+        except (TypeError, ValueError) as e:
+            raise ValueError(f"{column}: {e}")
+        if value is not None:
+            row[column] = value
+    return row
+
+def insert_rows(db, table, rows):
+    """
+    An executemany needs the same keys in every row, but convert() leaves out
+    empty columns so the database fills their defaults. Insert each key set
+    separately, rows with explicit ids first so generated ids can't take them.
+    """
+    groups = {}
+    for row in rows:
+        groups.setdefault(frozenset(row), []).append(row)
+    for keys in sorted(groups, key=lambda keys: "id" not in keys):
+        db.execute(table.insert(), groups[keys])
+
+def insert_batch(table, model, rows, first_line):
+    """Insert one batch in its own transaction so a bad batch doesn't sink the rest"""
+    db = SessionLocal()
+    try:
+        insert_rows(db, model.__table__, rows)
+        if model is database.AppointmentSlot:
+            deltas = capacity.new_deltas()
+            for row in rows:
+                capacity.add(deltas, row["doctor_id"], row["date"], **capacity.slot_deltas(row.get("is_available", True)))
+            capacity.apply(db, deltas)
+        summary = {"count": len(rows), "first_line": first_line}
+        if model is database.AppointmentSlot:
+            # Lets the slot index and availability cache refresh just these doctors
+            summary["doctor_ids"] = sorted({row["doctor_id"] for row in rows if row.get("doctor_id") is not None})
+        database.record_change(db, table, "BULK_INSERT", 0, summary)
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+@router.post("/{table}/import")
+def import_table(table: str, file: UploadFile = File(...), format: str = "ndjson"):
+    """
+    Import an uploaded NDJSON or CSV stream with batched bulk INSERTs.
+    Each batch commits on its own; the response reports every batch, with the
+    line and reason for any that failed.
+    """
+    model, _, _, importers = get_transfer(table)
+    if format not in ("ndjson", "csv"):
+        raise HTTPException(status_code=400, detail="format must be 'ndjson' or 'csv'")
+
+    batches = []
+    imported = 0
+
+    def flush(rows, first_line, last_line, error):
+        nonlocal imported
+        report = {"batch": len(batches) + 1, "first_line": first_line, "last_line": last_line, "rows": len(rows)}
+        if error is None:
+            try:
+                insert_batch(table, model, rows, first_line)
+                imported += len(rows)
+            except Exception as e:
+                error = str(getattr(e, "orig", e))
+        report["status"] = "error" if error else "success"
+        if error:
+            report["error"] = error
+        batches.append(report)
+
+    rows, first_line, last_line, error = [], None, None, None
+    try:
+        for line_number, record in read_records(file, format):
+            if first_line is None:
+                first_line = line_number
+            last_line = line_number
+            if error is None:
+                try:
+                    rows.append(convert(record, importers))
+                except ValueError as e:
+                    # The whole batch is skipped; report the first bad line
+                    error = f"line {line_number}: {e}"
+                    rows.append(None)
+            else:
+                rows.append(None)
+            if len(rows) >= BATCH_SIZE:
+                flush(rows, first_line, last_line, error)
+                rows, first_line, error = [], None, None
+    except (UnicodeDecodeError, csv.Error) as e:
+        # The stream itself is unreadable past this point
+        error = f"after line {last_line or 0}: {e}"
+    if rows or error:
+        flush(rows, first_line or (last_line or 0) + 1, last_line or 0, error)
+
+    print(f"✅ Imported {imported} rows into {table} in {len(batches)} batches")
+
+    return {
+        "status": "success" if all(b["status"] == "success" for b in batches) else "partial",
+        "imported": imported,
+        "failed_batches": sum(1 for b in batches if b["status"] == "error"),
+        "batches": batches
+    }
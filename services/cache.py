@@ -0,0 +1,117 @@
+"""
+In-process query-result cache.
+
+Entries are bounded by count (least recently used evicted first) and by age
+(TTL), and carry tags such as "doctor:3" so writers can drop exactly the
+entries a change affects. The TTL also bounds staleness for writes this
+process never hears about (other workers on the memory broadcast backend,
+tools writing to the database directly).
+"""
+from collections import OrderedDict, defaultdict
+from threading import RLock
+import os
+import time
+
+RESULT_CACHE_SIZE = int(os.getenv('RESULT_CACHE_SIZE', '1024'))
+RESULT_CACHE_TTL = float(os.getenv('RESULT_CACHE_TTL', '30'))
+
+caches = {}
+
+class ResultCache:
+    def __init__(self, name, max_entries=RESULT_CACHE_SIZE, ttl=RESULT_CACHE_TTL):
+        self.name = name
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()  # key -> (expires_at, value, tags)
+        self._tagged = defaultdict(set)  # tag -> keys
+        self._lock = RLock()
+        self._generation = 0  # bumped by every invalidation
+        self.hits = self.misses = self.evictions = self.expirations = self.invalidations = 0
+        caches[name] = self
+
+    def get(self, key):
+        """Return (True, value) on a fresh hit, (False, None) otherwise"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] < time.monotonic():
+                self._remove(key)
+                self.expirations += 1
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return False, None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return True, entry[1]
+
+    def set(self, key, value, tags=()):
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (time.monotonic() + self.ttl, value, tuple(tags))
+            for tag in tags:
+                self._tagged[tag].add(key)
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def get_or_compute(self, key, compute, tags=lambda value: ()):
+        found, value = self.get(key)
+        if not found:
+            generation = self._generation
+            value = compute()
+            with self._lock:
+                # A write committed while computing may have made the value stale
+                if generation == self._generation:
+                    self.set(key, value, tags(value))
+        return value
+
+    def invalidate_tag(self, tag):
+        with self._lock:
+            self._generation += 1
+            keys = list(self._tagged.get(tag, ()))
+            for key in keys:
+                self._remove(key)
+            self.invalidations += len(keys)
+            return len(keys)
+
+    def invalidate_where(self, predicate):
+        """Drop every entry whose key matches predicate(key)"""
+        with self._lock:
+            self._generation += 1
+            keys = [key for key in self._entries if predicate(key)]
+            for key in keys:
+                self._remove(key)
+            self.invalidations += len(keys)
+            return len(keys)
+
+    def clear(self):
+        with self._lock:
+            self._generation += 1
+            self.invalidations += len(self._entries)
+            self._entries.clear()
+            self._tagged.clear()
+
+    def _remove(self, key):
+        _, _, tags = self._entries.pop(key)
+        for tag in tags:
+            keys = self._tagged.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._tagged[tag]
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "invalidations": self.invalidations
+            }
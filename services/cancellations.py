@@ -1,13 +1,22 @@
-from fastapi import APIRouter, HTTPException, Form
-from db.database import SessionLocal
-from db import database
-from datetime import datetime
-from sqlalchemy import func, case, and_, or_
+from fastapi import APIRouter, HTTPException, Form, Request, Response, Depends
+from db.database import get_db
+from sqlalchemy.orm import Session
+from db import database, capacity
+from datetime import datetime, date, timedelta
+from services import analytics, conditional
+from services.slots import serialize_slot
+from services.listing import paginate, stream_list, parse_fields, project, page_response
 
 router = APIRouter()
 
+def serialize_cancellation(c):
+    return {"id": c.id, "appointment_id": c.appointment_id, "reason": c.reason, "cancelled_at": str(c.cancelled_at)}
+
 def get_cancellations(db):
     """Get all cancellations with related data"""
+    return cancellations_query(db).all()
+
+def cancellations_query(db):
     return db.query(
         database.Cancellation,
         database.Appointment,
@@ -26,172 +35,126 @@ def get_cancellations(db):
     ).outerjoin(
         database.Doctor,
         database.AppointmentSlot.doctor_id == database.Doctor.id
-    ).all()
+    )
+
+def cancellation_details_query(db):
+    """The same joins as cancellations_query, as flat labelled columns"""
+    return db.query(
+        database.Cancellation.id,
+        database.Cancellation.appointment_id,
+        database.Cancellation.reason,
+        database.Cancellation.cancelled_at,
+        database.Patient.id.label('patient_id'),
+        database.Patient.name.label('patient_name'),
+        database.Patient.email.label('patient_email'),
+        database.Doctor.id.label('doctor_id'),
+        database.Doctor.name.label('doctor_name'),
+        database.Doctor.specialty.label('doctor_specialty'),
+        database.AppointmentSlot.date.label('slot_date'),
+        database.AppointmentSlot.start_time.label('slot_time'),
+        database.Appointment.booked_at
+    ).join(
+        database.Appointment,
+        database.Cancellation.appointment_id == database.Appointment.id
+    ).join(
+        database.Patient,
+        database.Appointment.patient_id == database.Patient.id
+    ).outerjoin(
+        database.AppointmentSlot,
+        database.Appointment.slot_id == database.AppointmentSlot.id
+    ).outerjoin(
+        database.Doctor,
+        database.AppointmentSlot.doctor_id == database.Doctor.id
+    )
+
+def serialize_cancellation_details(c):
+    return {
+        "id": c.id,
+        "appointment_id": c.appointment_id,
+        "reason": c.reason,
+        "cancelled_at": str(c.cancelled_at),
+        "patient_id": c.patient_id,
+        "patient_name": c.patient_name if c.patient_id is not None else "Unknown",
+        "patient_email": c.patient_email if c.patient_id is not None else "N/A",
+        "doctor_id": c.doctor_id,
+        "doctor_name": c.doctor_name if c.doctor_id is not None else "Unknown",
+        "doctor_specialty": c.doctor_specialty if c.doctor_id is not None else "N/A",
+        "slot_date": str(c.slot_date) if c.slot_date is not None else None,
+        "slot_time": str(c.slot_time) if c.slot_time is not None else None,
+        "booked_at": str(c.booked_at)
+    }
+
+CANCELLATION_FIELDS = [
+    "id", "appointment_id", "reason", "cancelled_at", "patient_id", "patient_name",
+    "patient_email", "doctor_id", "doctor_name", "doctor_specialty", "slot_date",
+    "slot_time", "booked_at"
+]
 
 @router.get("/list")
-async def list_cancellations():
-    """List all cancellations with detailed information"""
-    db = SessionLocal()
+def list_cancellations(
+    request: Request,
+    response: Response,
+    doctor_id: int = None,
+    patient_id: int = None,
+    start_date: str = None,
+    end_date: str = None,
+    cursor: str = None,
+    limit: int = None,
+    fields: str = None,
+    db: Session = Depends(get_db)
+):
+    """List cancellations with detailed information"""
     try:
-        cancellations = get_cancellations(db)
-        
-        return [{
-            "id": c.Cancellation.id,
-            "appointment_id": c.Cancellation.appointment_id,
-            "reason": c.Cancellation.reason,
-            "cancelled_at": str(c.Cancellation.cancelled_at),
-            "patient_id": c.Patient.id if c.Patient else None,
-            "patient_name": c.Patient.name if c.Patient else "Unknown",
-            "patient_email": c.Patient.email if c.Patient else "N/A",
-            "doctor_id": c.Doctor.id if c.Doctor else None,
-            "doctor_name": c.Doctor.name if c.Doctor else "Unknown",
-            "doctor_specialty": c.Doctor.specialty if c.Doctor else "N/A",
-            "slot_date": str(c.AppointmentSlot.date) if c.AppointmentSlot else None,
-            "slot_time": str(c.AppointmentSlot.start_time) if c.AppointmentSlot else None,
-            "booked_at": str(c.Appointment.booked_at) if c.Appointment else None
-        } for c in cancellations]
-    finally:
-        db.close()
+        not_modified = conditional.check(db, request, response, analytics.SOURCE_TABLES)
+        if not_modified:
+            return not_modified
+        fields = parse_fields(fields, CANCELLATION_FIELDS)
+        query = cancellation_details_query(db)
+        if doctor_id is not None:
+            query = query.filter(database.Doctor.id == doctor_id)
+        if patient_id is not None:
+            query = query.filter(database.Patient.id == patient_id)
+        if start_date:
+            query = query.filter(database.Cancellation.cancelled_at >= datetime.fromisoformat(start_date))
+        if end_date:
+            # end_date is inclusive of the whole day
+            query = query.filter(database.Cancellation.cancelled_at < datetime.combine(
+                date.fromisoformat(end_date) + timedelta(days=1), datetime.min.time()
+            ))
+        if limit is None:
+            return stream_list(query, database.Cancellation.id, cursor, serialize_cancellation_details, fields, response.headers)
+        cancellations, next_cursor = paginate(query, database.Cancellation.id, cursor, limit)
+        return page_response(
+            [project(serialize_cancellation_details(c), fields) for c in cancellations],
+            next_cursor,
+            limit
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
 @router.get("/analytics")
-async def cancellation_analytics():
+def cancellation_analytics(request: Request, response: Response, db: Session = Depends(get_db)):
     """Get comprehensive cancellation analytics"""
-    db = SessionLocal()
-    try:
-        # Total cancellations
-        total_cancellations = db.query(func.count(database.Cancellation.id)).scalar()
-        
-        # Cancellations by reason
-        reason_stats = db.query(
-            database.Cancellation.reason,
-            func.count(database.Cancellation.id).label('count')
-        ).group_by(database.Cancellation.reason).all()
-        
-        # Cancellations by doctor
-        doctor_stats = db.query(
-            database.Doctor.name,
-            database.Doctor.specialty,
-            func.count(database.Cancellation.id).label('cancellations')
-        ).join(
-            database.AppointmentSlot,
-            database.Doctor.id == database.AppointmentSlot.doctor_id
-        ).join(
-            database.Appointment,
-            database.AppointmentSlot.id == database.Appointment.slot_id
-        ).join(
-            database.Cancellation,
-            database.Appointment.id == database.Cancellation.appointment_id
-        ).group_by(database.Doctor.id, database.Doctor.name, database.Doctor.specialty).all()
-        
-        # Cancellations by patient
-        patient_stats = db.query(
-            database.Patient.name,
-            database.Patient.email,
-            func.count(database.Cancellation.id).label('cancellations')
-        ).join(
-            database.Appointment,
-            database.Patient.id == database.Appointment.patient_id
-        ).join(
-            database.Cancellation,
-            database.Appointment.id == database.Cancellation.appointment_id
-        ).group_by(database.Patient.id, database.Patient.name, database.Patient.email).all()
-        
-        # Cancellations by time period
-        today = datetime.now().date()
-        this_week = db.query(func.count(database.Cancellation.id)).filter(
-            func.date(database.Cancellation.cancelled_at) >= func.date('now', '-7 days')
-        ).scalar()
-        
-        this_month = db.query(func.count(database.Cancellation.id)).filter(
-            func.date(database.Cancellation.cancelled_at) >= func.date('now', '-30 days')
-        ).scalar()
-        
-        # Cancellation rate (cancellations vs total appointments)
-        total_appointments = db.query(func.count(database.Appointment.id)).scalar()
-        cancellation_rate = (total_cancellations / total_appointments * 100) if total_appointments > 0 else 0
-        
-        # Average time between booking and cancellation
-        avg_time_to_cancel = db.query(
-            func.avg(
-                func.julianday(database.Cancellation.cancelled_at) - 
-                func.julianday(database.Appointment.booked_at)
-            ).label('avg_days')
-        ).join(
-            database.Appointment,
-            database.Cancellation.appointment_id == database.Appointment.id
-        ).scalar() or 0
-        
-        return {
-            "total_cancellations": total_cancellations,
-            "cancellation_rate": round(cancellation_rate, 2),
-            "this_week": this_week or 0,
-            "this_month": this_month or 0,
-            "avg_days_to_cancel": round(avg_time_to_cancel, 1),
-            "by_reason": [
-                {"reason": r.reason or "No reason provided", "count": r.count}
-                for r in reason_stats
-            ],
-            "by_doctor": [
-                {
-                    "doctor_name": d.name,
-                    "specialty": d.specialty,
-                    "cancellations": d.cancellations
-                }
-                for d in doctor_stats
-            ],
-            "by_patient": [
-                {
-                    "patient_name": p.name,
-                    "email": p.email,
-                    "cancellations": p.cancellations
-                }
-                for p in patient_stats
-            ]
-        }
-    finally:
-        db.close()
+    not_modified = conditional.check(db, request, response, analytics.SOURCE_TABLES, date.today())
+    if not_modified:
+        return not_modified
+    return analytics.analytics(db)
 
 @router.get("/trends")
-async def cancellation_trends():
+def cancellation_trends(request: Request, response: Response, db: Session = Depends(get_db)):
     """Get cancellation trends over time"""
-    db = SessionLocal()
-    try:
-        # Cancellations by date for the last 30 days
-        trends = db.query(
-            func.date(database.Cancellation.cancelled_at).label('date'),
-            func.count(database.Cancellation.id).label('count')
-        ).filter(
-            func.date(database.Cancellation.cancelled_at) >= func.date('now', '-30 days')
-        ).group_by(func.date(database.Cancellation.cancelled_at)).all()
-        
-        # Cancellations by day of week
-        day_of_week = db.query(
-            func.strftime('%w', database.Cancellation.cancelled_at).label('day'),
-            func.count(database.Cancellation.id).label('count')
-        ).group_by(func.strftime('%w', database.Cancellation.cancelled_at)).all()
-        
-        day_names = ['Sunday', 'Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday']
-        
-        return {
-            "daily_trends": [
-                {"date": str(t.date), "count": t.count}
-                for t in trends
-            ],
-            "by_day_of_week": [
-                {"day": day_names[int(d.day)], "count": d.count}
-                for d in day_of_week
-            ]
-        }
-    finally:
-        db.close()
+    not_modified = conditional.check(db, request, response, analytics.SOURCE_TABLES, date.today())
+    if not_modified:
+        return not_modified
+    return analytics.trends(db)
 
 @router.post("/")
-async def create_cancellation(
+def create_cancellation(
     appointment_id: int = Form(...), 
-    reason: str = Form(None)
+    reason: str = Form(None),
+    db: Session = Depends(get_db)
 ):
     """Create a cancellation and release the slot"""
-    db = SessionLocal()
     try:
         # Check if appointment exists
         appointment = db.query(database.Appointment).filter(
@@ -216,6 +179,8 @@ async def create_cancellation(
             cancelled_at=datetime.now()
         )
         db.add(cancellation)
+        db.flush()
+        database.record_change(db, "cancellations", "INSERT", cancellation.id, serialize_cancellation(cancellation))
         
         # Release the slot
         slot = db.query(database.AppointmentSlot).filter(
@@ -223,11 +188,12 @@ async def create_cancellation(
         ).first()
         
         if slot:
+            capacity.availability_changed(db, slot.doctor_id, slot.date, slot.is_available, True)
             slot.is_available = True
+            database.record_change(db, "appointment_slots", "UPDATE", slot.id, serialize_slot(slot))
             print(f"✅ Released slot after cancellation: Slot ID={slot.id}")
         
         db.commit()
-        db.refresh(cancellation)
         
         print(f"✅ Cancellation created: ID={cancellation.id}, Appointment={appointment_id}")
         
@@ -243,17 +209,15 @@ async def create_cancellation(
         db.rollback()
         print(f"❌ Error creating cancellation: {str(e)}")
         raise HTTPException(status_code=400, detail=str(e))
-    finally:
-        db.close()
 
 @router.post("/update")
-async def update_cancellation(
+def update_cancellation(
     cancellation_id: int = Form(...),
     appointment_id: int = Form(...),
-    reason: str = Form(None)
+    reason: str = Form(None),
+    db: Session = Depends(get_db)
 ):
     """Update cancellation details"""
-    db = SessionLocal()
     try:
         cancellation = db.query(database.Cancellation).filter(
             database.Cancellation.id == cancellation_id
@@ -265,6 +229,7 @@ async def update_cancellation(
         cancellation.appointment_id = appointment_id
         cancellation.reason = reason
         cancellation.cancelled_at = datetime.now()
+        database.record_change(db, "cancellations", "UPDATE", cancellation.id, serialize_cancellation(cancellation))
         
         db.commit()
         
@@ -278,13 +243,10 @@ async def update_cancellation(
         db.rollback()
         print(f"❌ Error updating cancellation: {str(e)}")
         raise HTTPException(status_code=400, detail=str(e))
-    finally:
-        db.close()
 
 @router.post("/delete")
-async def delete_cancellation(cancellation_id: int = Form(...)):
+def delete_cancellation(cancellation_id: int = Form(...), db: Session = Depends(get_db)):
     """Delete a cancellation record"""
-    db = SessionLocal()
     try:
         cancellation = db.query(database.Cancellation).filter(
             database.Cancellation.id == cancellation_id
@@ -294,6 +256,7 @@ async def delete_cancellation(cancellation_id: int = Form(...)):
             raise HTTPException(status_code=404, detail="Cancellation not found")
         
         db.delete(cancellation)
+        database.record_change(db, "cancellations", "DELETE", cancellation_id, {"id": cancellation_id})
         db.commit()
         
         print(f"✅ Cancellation deleted: ID={cancellation_id}")
@@ -306,63 +269,11 @@ async def delete_cancellation(cancellation_id: int = Form(...)):
         db.rollback()
         print(f"❌ Error deleting cancellation: {str(e)}")
         raise HTTPException(status_code=400, detail=str(e))
-    finally:
-        db.close()
 
 @router.get("/patterns")
-async def cancellation_patterns():
+def cancellation_patterns(request: Request, response: Response, db: Session = Depends(get_db)):
     """Identify cancellation patterns and insights"""
-    db = SessionLocal()
-    try:
-        # Peak cancellation times
-        hour_distribution = db.query(
-            func.strftime('%H', database.Cancellation.cancelled_at).label('hour'),
-            func.count(database.Cancellation.id).label('count')
-        ).group_by(func.strftime('%H', database.Cancellation.cancelled_at)).all()
-        
-        # Most common reasons
-        top_reasons = db.query(
-            database.Cancellation.reason,
-            func.count(database.Cancellation.id).label('count')
-        ).filter(
-            database.Cancellation.reason.isnot(None),
-            database.Cancellation.reason != ''
-        ).group_by(database.Cancellation.reason).order_by(
-            func.count(database.Cancellation.id).desc()
-        ).limit(5).all()
-        
-        # Patients with multiple cancellations
-        frequent_cancellers = db.query(
-            database.Patient.name,
-            database.Patient.email,
-            func.count(database.Cancellation.id).label('cancellations')
-        ).join(
-            database.Appointment,
-            database.Patient.id == database.Appointment.patient_id
-        ).join(
-            database.Cancellation,
-            database.Appointment.id == database.Cancellation.appointment_id
-        ).group_by(database.Patient.id).having(
-            func.count(database.Cancellation.id) > 1
-        ).order_by(func.count(database.Cancellation.id).desc()).all()
-        
-        return {
-            "peak_hours": [
-                {"hour": f"{int(h.hour):02d}:00", "count": h.count}
-                for h in hour_distribution
-            ],
-            "top_reasons": [
-                {"reason": r.reason, "count": r.count}
-                for r in top_reasons
-            ],
-            "frequent_cancellers": [
-                {
-                    "patient_name": f.name,
-                    "email": f.email,
-                    "cancellations": f.cancellations
-                }
-                for f in frequent_cancellers
-            ]
-        }
-    finally:
-        db.close()
\ No newline at end of file
+    not_modified = conditional.check(db, request, response, analytics.SOURCE_TABLES, date.today())
+    if not_modified:
+        return not_modified
+    return analytics.patterns(db)
\ No newline at end of file
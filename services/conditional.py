@@ -0,0 +1,45 @@
+"""
+Conditional GET (ETag / If-None-Match) for read endpoints.
+
+A response's ETag hashes the change version (database.change_version) of
+every table the endpoint reads, together with the request path and query
+string and anything else the body depends on (e.g. today's date). Every
+write records a change in its own transaction, so the tag moves exactly when
+the data can have, even when concurrent writes commit out of id order. Responses are
+marked `Cache-Control: no-cache`, so browsers revalidate each poll by sending
+the tag back; a matching tag is answered with an empty 304 before any rows
+are loaded or serialized.
+"""
+from fastapi import Response
+from db import database
+import hashlib
+
+def etag(db, request, tables, *extra):
+    version = database.change_version(db, *tables)
+    key = repr((request.url.path, request.url.query, version, extra))
+    return f'W/"{hashlib.sha1(key.encode()).hexdigest()[:20]}"'
+
+def _opaque(tag):
+    # If-None-Match uses weak comparison: W/"x" matches "x"
+    tag = tag.strip()
+    return tag[2:] if tag.startswith("W/") else tag
+
+def matches(if_none_match, tag):
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    return any(_opaque(t) == _opaque(tag) for t in if_none_match.split(","))
+
+def check(db, request, response, tables, *extra):
+    """
+    Returns a 304 response if the client already holds the current version.
+    Otherwise sets the ETag on `response` and returns None, and the endpoint
+    goes on to build its body.
+    """
+    tag = etag(db, request, tables, *extra)
+    headers = {"ETag": tag, "Cache-Control": "no-cache"}
+    if matches(request.headers.get("if-none-match"), tag):
+        return Response(status_code=304, headers=headers)
+    response.headers.update(headers)
+    return None
@@ -0,0 +1,158 @@
+from fastapi import APIRouter, HTTPException, Request, Response, Depends
+from sqlalchemy import select, func
+from db.database import get_db
+from sqlalchemy.orm import Session
+from db import database
+from db.dialects import hour_of
+from services.cache import ResultCache
+from services import conditional
+from datetime import date, timedelta
+import os
+
+router = APIRouter()
+
+DASHBOARD_CACHE_TTL = float(os.getenv('DASHBOARD_CACHE_TTL', '5'))
+MAX_RECENT = 50
+PERIODS = [("morning", 6, 12), ("afternoon", 12, 18), ("evening", 18, 24)]
+# Every table the summary reads (the rollup moves with slots and appointments)
+SOURCE_TABLES = ["doctors", "patients", "appointment_slots", "appointments", "cancellations"]
+
+dashboard_cache = ResultCache("dashboard", max_entries=16, ttl=DASHBOARD_CACHE_TTL)
+
+def _rate(part, whole):
+    return round(part / whole * 100, 1) if whole else 0
+
+def _appointment_rows(query):
+    return [
+        {
+            "id": r.id,
+            "patient_id": r.patient_id,
+            "patient_name": r.patient_name,
+            "slot_id": r.slot_id,
+            "doctor_name": r.doctor_name,
+            "date": str(r.date) if r.date else None,
+            "start_time": str(r.start_time) if r.start_time else None,
+            "booked_at": str(r.booked_at)
+        }
+        for r in query
+    ]
+
+def _appointments_query(db):
+    return db.query(
+        database.Appointment.id,
+        database.Appointment.patient_id,
+        database.Patient.name.label('patient_name'),
+        database.Appointment.slot_id,
+        database.Doctor.name.label('doctor_name'),
+        database.AppointmentSlot.date,
+        database.AppointmentSlot.start_time,
+        database.Appointment.booked_at
+    ).outerjoin(
+        database.Patient, database.Patient.id == database.Appointment.patient_id
+    ).outerjoin(
+        database.AppointmentSlot, database.AppointmentSlot.id == database.Appointment.slot_id
+    ).outerjoin(
+        database.Doctor, database.Doctor.id == database.AppointmentSlot.doctor_id
+    )
+
+def build_summary(db, today, recent):
+    """Everything the home page shows, from aggregates and bounded reads only"""
+    rollup = database.DoctorDayCapacity
+    slots = database.AppointmentSlot
+
+    total_slots, booked_slots = db.query(
+        func.coalesce(func.sum(rollup.total_slots), 0),
+        func.coalesce(func.sum(rollup.booked_slots), 0)
+    ).one()
+    counts = {
+        "doctors": db.query(func.count(database.Doctor.id)).scalar(),
+        "patients": db.query(func.count(database.Patient.id)).scalar(),
+        "slots": total_slots,
+        "booked_slots": booked_slots,
+        "appointments": db.query(func.count(database.Appointment.id)).scalar(),
+        "cancellations": db.query(func.count(database.Cancellation.id)).scalar()
+    }
+
+    # Today's slots by hour and availability; the IN keeps (is_available, date) usable
+    periods = {name: {"total": 0, "available": 0} for name, _, _ in PERIODS}
+    today_total = today_available = 0
+    for hour, is_available, count in db.execute(
+        select(hour_of(slots.start_time), slots.is_available, func.count(slots.id)).where(
+            slots.is_available.in_([True, False]),
+            slots.date == today
+        ).group_by(hour_of(slots.start_time), slots.is_available)
+    ):
+        today_total += count
+        today_available += count if is_available else 0
+        for name, start, end in PERIODS:
+            if start <= hour < end:
+                periods[name]["total"] += count
+                periods[name]["available"] += count if is_available else 0
+
+    month_start = today.replace(day=1)
+    month_end = (month_start + timedelta(days=32)).replace(day=1)
+    calendar = db.query(
+        rollup.date,
+        func.sum(rollup.total_slots).label('total_slots'),
+        func.sum(rollup.available_slots).label('available_slots')
+    ).filter(rollup.date >= month_start, rollup.date < month_end).group_by(rollup.date).order_by(rollup.date)
+
+    daily = db.query(
+        rollup.date,
+        func.sum(rollup.booked_slots).label('booked')
+    ).group_by(rollup.date).order_by(rollup.date.desc()).limit(7).all()
+
+    specialties = db.query(
+        database.Doctor.specialty,
+        func.count(database.Doctor.id).label('doctors')
+    ).group_by(database.Doctor.specialty).order_by(func.count(database.Doctor.id).desc())
+
+    featured = db.query(database.Doctor).order_by(database.Doctor.id).limit(3)
+
+    recent_appointments = _appointments_query(db).order_by(database.Appointment.id.desc()).limit(recent)
+
+    # Booked slots from today on, in date order, via the (is_available, date) index
+    upcoming = _appointments_query(db).filter(
+        slots.is_available == False,
+        slots.date >= today
+    ).order_by(slots.date, slots.start_time).limit(5)
+
+    return {
+        "date": str(today),
+        "counts": counts,
+        "utilization_rate": _rate(booked_slots, total_slots),
+        "cancellation_rate": _rate(counts["cancellations"], counts["appointments"]),
+        "today": {
+            "total_slots": today_total,
+            "available_slots": today_available,
+            "booked_slots": today_total - today_available,
+            "by_period": periods
+        },
+        "calendar": [
+            {"date": str(c.date), "total_slots": c.total_slots, "available_slots": c.available_slots}
+            for c in calendar
+        ],
+        "daily_bookings": [{"date": str(d.date), "booked": d.booked} for d in reversed(daily)],
+        "specialties": [{"specialty": s.specialty, "doctors": s.doctors} for s in specialties],
+        "featured_doctors": [{"id": d.id, "name": d.name, "specialty": d.specialty} for d in featured],
+        "recent_appointments": _appointment_rows(recent_appointments),
+        "upcoming_appointments": _appointment_rows(upcoming)
+    }
+
+@router.get("/summary")
+def dashboard_summary(request: Request, response: Response, recent: int = 5, db: Session = Depends(get_db)):
+    """
+    Counts, today's utilization, the latest appointments and the other home
+    page widgets in one response whose size does not grow with the tables.
+    Cached for DASHBOARD_CACHE_TTL seconds per data version, and answered
+    with 304 when the client's ETag is current.
+    """
+    if recent < 1 or recent > MAX_RECENT:
+        raise HTTPException(status_code=400, detail=f"recent must be between 1 and {MAX_RECENT}")
+    today = date.today()
+    not_modified = conditional.check(db, request, response, SOURCE_TABLES, today)
+    if not_modified:
+        return not_modified
+    # Keyed on the version too, so a cached body never outlives the ETag it is sent with
+    version = database.change_version(db, *SOURCE_TABLES)
+    return dashboard_cache.get_or_compute((version, today, recent), lambda: build_summary(db, today, recent))
@@ -1,65 +1,82 @@
-from fastapi import APIRouter, HTTPException, Form
-from db.database import SessionLocal
-from db import database
+from fastapi import APIRouter, HTTPException, Form, Request, Response, Depends
+from db.database import get_db
+from sqlalchemy.orm import Session
+from db import database, capacity
+from services.listing import paginate, stream_list, parse_fields, project, page_response
+from services import conditional
 
 router = APIRouter()
 
 def get_doctors(db):
     return db.query(database.Doctor).all()
 
+def serialize_doctor(d):
+    return {"id": d.id, "name": d.name, "specialty": d.specialty}
+
+DOCTOR_FIELDS = ["id", "name", "specialty"]
+
 @router.get("/list")
-async def list_doctors():
-    db = SessionLocal()
-    try:
-        doctors = get_doctors(db)
-        return [{"id": d.id, "name": d.name, "specialty": d.specialty} for d in doctors]
-    finally:
-        db.close()
+def list_doctors(
+    request: Request,
+    response: Response,
+    specialty: str = None,
+    cursor: str = None,
+    limit: int = None,
+    fields: str = None,
+    db: Session = Depends(get_db)
+):
+    """List doctors, optionally filtered, keyset-paginated and projected"""
+    not_modified = conditional.check(db, request, response, ["doctors"])
+    if not_modified:
+        return not_modified
+    fields = parse_fields(fields, DOCTOR_FIELDS)
+    query = db.query(database.Doctor)
+    if specialty:
+        query = query.filter(database.Doctor.specialty == specialty)
+    if limit is None:
+        return stream_list(query, database.Doctor.id, cursor, serialize_doctor, fields, response.headers)
+    doctors, next_cursor = paginate(query, database.Doctor.id, cursor, limit)
+    return page_response([project(serialize_doctor(d), fields) for d in doctors], next_cursor, limit)
 
 @router.post("/")
-async def create_doctor(name: str = Form(...), specialty: str = Form(...)):
-    db = SessionLocal()
+def create_doctor(name: str = Form(...), specialty: str = Form(...), db: Session = Depends(get_db)):
     try:
         doctor = database.Doctor(name=name, specialty=specialty)
         db.add(doctor)
+        db.flush()
+        database.record_change(db, "doctors", "INSERT", doctor.id, serialize_doctor(doctor))
         db.commit()
-        db.refresh(doctor)
         return {"status": "success", "doctor_id": doctor.id}
     except Exception as e:
         db.rollback()
         raise HTTPException(status_code=400, detail=str(e))
-    finally:
-        db.close()
 
 @router.post("/update")
-async def update_doctor(doctor_id: int = Form(...), name: str = Form(...), specialty: str = Form(...)):
-    db = SessionLocal()
+def update_doctor(doctor_id: int = Form(...), name: str = Form(...), specialty: str = Form(...), db: Session = Depends(get_db)):
     try:
         doctor = db.query(database.Doctor).filter(database.Doctor.id == doctor_id).first()
         if not doctor:
             raise HTTPException(status_code=404, detail="Doctor not found")
         doctor.name = name
         doctor.specialty = specialty
+        database.record_change(db, "doctors", "UPDATE", doctor.id, serialize_doctor(doctor))
         db.commit()
         return {"status": "success"}
     except Exception as e:
         db.rollback()
         raise HTTPException(status_code=400, detail=str(e))
-    finally:
-        db.close()
 
 @router.post("/delete")
-async def delete_doctor(doctor_id: int = Form(...)):
-    db = SessionLocal()
+def delete_doctor(doctor_id: int = Form(...), db: Session = Depends(get_db)):
     try:
         doctor = db.query(database.Doctor).filter(database.Doctor.id == doctor_id).first()
         if not doctor:
             raise HTTPException(status_code=404, detail="Doctor not found")
+        capacity.clear_doctor(db, doctor_id)
         db.delete(doctor)
+        database.record_change(db, "doctors", "DELETE", doctor_id, {"id": doctor_id})
         db.commit()
         return {"status": "success"}
     except Exception as e:
         db.rollback()
-        raise HTTPException(status_code=400, detail=str(e))
-    finally:
-        db.close()
\ No newline at end of file
+        raise HTTPException(status_code=400, detail=str(e))
\ No newline at end of file
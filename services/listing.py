@@ -0,0 +1,153 @@
+from fastapi import HTTPException
+from fastapi.responses import StreamingResponse
+from sqlalchemy import tuple_
+from db.database import get_engine
+from datetime import date, time, datetime
+import base64
+import json
+
+MAX_LIMIT = 1000
+STREAM_CHUNK_SIZE = 1000
+
+def encode_cursor(last_id):
+    return base64.urlsafe_b64encode(json.dumps({"id": last_id}).encode()).decode()
+
+def decode_cursor(cursor):
+    try:
+        return int(json.loads(base64.urlsafe_b64decode(cursor.encode()))["id"])
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+def parse_fields(fields, allowed):
+    """Parse a comma-separated fields= value, rejecting unknown names"""
+    if not fields:
+        return None
+    names = [f.strip() for f in fields.split(",") if f.strip()]
+    unknown = [f for f in names if f not in allowed]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(unknown)}")
+    return names
+
+def project(item, fields):
+    if not fields:
+        return item
+    return {f: item[f] for f in fields}
+
+def paginate(query, id_column, cursor=None, limit=None):
+    """
+    Keyset pagination on a unique, indexed id column. Each page is an index
+    range scan starting after the cursor, so deep pages cost the same as the
+    first one. Without a limit the whole (filtered) query is returned.
+
+    Returns (rows, next_cursor).
+    """
+    if cursor:
+        query = query.filter(id_column > decode_cursor(cursor))
+    query = query.order_by(id_column)
+    if limit is None:
+        return query.all(), None
+    if limit < 1:
+        raise HTTPException(status_code=400, detail="limit must be at least 1")
+    limit = min(limit, MAX_LIMIT)
+    rows = query.limit(limit + 1).all()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(_row_id(rows[-1]))
+    return rows, next_cursor
+
+def _row_id(row):
+    # Plain ORM objects expose .id; multi-entity rows carry the keyed entity first
+    return row.id if hasattr(row, "id") else row[0].id
+
+def encode_keyset(values):
+    return base64.urlsafe_b64encode(json.dumps([str(v) for v in values]).encode()).decode()
+
+def decode_keyset(cursor, columns):
+    """Turn a keyset cursor back into values typed like their columns"""
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        if len(values) != len(columns):
+            raise ValueError("wrong number of keys")
+        typed = []
+        for value, column in zip(values, columns):
+            python_type = column.type.python_type
+            if python_type in (date, time, datetime):
+                typed.append(python_type.fromisoformat(value))
+            else:
+                typed.append(python_type(value))
+        return typed
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+def paginate_keyset(query, columns, cursor=None, limit=50, descending=False):
+    """
+    Keyset pagination over several ordering columns, the last of which must be
+    unique (e.g. date, start_time, id). Rows must expose each column by its
+    key. With a matching composite index every page is one index range scan.
+
+    Returns (rows, next_cursor).
+    """
+    if limit < 1:
+        raise HTTPException(status_code=400, detail="limit must be at least 1")
+    limit = min(limit, MAX_LIMIT)
+    if cursor:
+        values = decode_keyset(cursor, columns)
+        after = tuple_(*columns) < tuple_(*values) if descending else tuple_(*columns) > tuple_(*values)
+        query = query.filter(after)
+    query = query.order_by(*[c.desc() if descending else c for c in columns])
+    rows = query.limit(limit + 1).all()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_keyset([getattr(rows[-1], c.key) for c in columns])
+    return rows, next_cursor
+
+def page_response(items, next_cursor, limit):
+    """Paged requests get an envelope; unpaged ones keep the plain list shape"""
+    if limit is None:
+        return items
+    return {"items": items, "next_cursor": next_cursor}
+
+def stream_rows(statement, chunk_size=STREAM_CHUNK_SIZE, connection=None):
+    """
+    Yield lists of rows from a server-side cursor, so only one chunk is held
+    in memory at a time. Rows are lightweight Core rows, not ORM objects.
+    Runs on `connection` if given, otherwise on a connection of its own.
+    """
+    if connection is not None:
+        result = connection.execution_options(yield_per=chunk_size).execute(statement)
+        yield from result.partitions()
+        return
+    with get_engine().connect() as conn:
+        result = conn.execution_options(yield_per=chunk_size).execute(statement)
+        for partition in result.partitions():
+            yield partition
+
+def stream_list(query, id_column, cursor, serialize, fields, headers=None):
+    """
+    The unpaged form of a list endpoint: every row after the cursor as a JSON
+    array, written a chunk at a time. Memory stays bounded by one chunk and
+    the first bytes are sent as soon as the first chunk is fetched.
+    serialize receives Core rows, so it must read columns by name.
+
+    Rows are read on the query's session connection, which the get_db
+    dependency keeps open until the response has been sent.
+    """
+    if cursor:
+        query = query.filter(id_column > decode_cursor(cursor))
+    statement = query.order_by(id_column).statement
+    connection = query.session.connection()
+
+    def body():
+        separator = "["
+        for rows in stream_rows(statement, connection=connection):
+            # Encoded like FastAPI's JSONResponse, so the bytes match the unstreamed form
+            yield separator + ",".join(
+                json.dumps(project(serialize(r), fields), ensure_ascii=False, separators=(",", ":"))
+                for r in rows
+            )
+            separator = ","
+        yield "[]" if separator == "[" else "]"
+
+    return StreamingResponse(body(), media_type="application/json", headers=headers)
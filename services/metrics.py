@@ -0,0 +1,253 @@
+"""
+Request, SQL and pool metrics in Prometheus text format at GET /metrics.
+
+MetricsMiddleware times every HTTP request, streamed bodies included, and
+labels it with the matched route template (e.g. /booking/doctor-slots/{doctor_id})
+so the series count stays bounded. SQLAlchemy cursor events count the
+statements each request runs and the time spent in them; the per-request
+totals go into the same route-labelled histograms, so a slow route can be
+told apart from a route that runs too many or too slow queries. Statements
+run outside a request (broadcast polling, slot index catch-up) are counted
+separately.
+
+Pool occupancy and checkout waits (db/pool.py), the result caches and the
+WebSocket outbound queues (services/realtime.py) are exported from their own counters when /metrics is scraped.
+"""
+from contextvars import ContextVar
+from threading import Lock
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from db.database import pool_stats
+from services.cache import caches
+from services.realtime import manager as websockets
+import time
+
+router = APIRouter()
+
+LATENCY_BUCKETS = [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10]
+QUERY_COUNT_BUCKETS = [0, 1, 2, 5, 10, 20, 50, 100, 500]
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def _labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+def _number(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class Counter:
+    def __init__(self, name, help, labels=()):
+        self.name, self.help, self.labels = name, help, labels
+        self.values = {}
+
+    def inc(self, label_values=(), amount=1):
+        self.values[label_values] = self.values.get(label_values, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        for label_values, value in sorted(self.values.items()):
+            lines.append(f"{self.name}{_labels(self.labels, label_values)} {_number(value)}")
+        return lines
+
+class Histogram:
+    def __init__(self, name, help, buckets, labels=()):
+        self.name, self.help, self.labels = name, help, labels
+        self.buckets = list(buckets) + [float("inf")]
+        self.values = {}  # label values -> [bucket counts, sum, count]
+
+    def observe(self, label_values, value):
+        counts, total, count = self.values.get(label_values) or ([0] * len(self.buckets), 0.0, 0)
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                counts[i] += 1
+                break
+        self.values[label_values] = (counts, total + value, count + 1)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for label_values, (counts, total, count) in sorted(self.values.items()):
+            cumulative = 0
+            for bound, n in zip(self.buckets, counts):
+                cumulative += n
+                le = (("le", _number(bound)),)
+                lines.append(f"{self.name}_bucket{_labels(self.labels, label_values, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labels, label_values)} {_number(total)}")
+            lines.append(f"{self.name}_count{_labels(self.labels, label_values)} {count}")
+        return lines
+
+_lock = Lock()
+requests_total = Counter(
+    "http_requests_total", "HTTP requests by route and status.", ("method", "route", "status"))
+request_duration = Histogram(
+    "http_request_duration_seconds", "HTTP request latency, including streamed bodies.",
+    LATENCY_BUCKETS, ("method", "route"))
+request_db_duration = Histogram(
+    "http_request_db_duration_seconds", "Time spent executing SQL per HTTP request.",
+    LATENCY_BUCKETS, ("method", "route"))
+request_db_queries = Histogram(
+    "http_request_db_queries", "SQL statements executed per HTTP request.",
+    QUERY_COUNT_BUCKETS, ("method", "route"))
+background_queries = Counter(
+    "db_background_queries_total", "SQL statements executed outside HTTP requests.")
+background_db_seconds = Counter(
+    "db_background_duration_seconds_total", "Time spent executing SQL outside HTTP requests.")
+
+class RequestStats:
+    __slots__ = ("queries", "db_seconds")
+
+    def __init__(self):
+        self.queries = 0
+        self.db_seconds = 0.0
+
+# Set by the middleware; the context is copied into the worker thread that
+# runs a sync handler, so cursor events there update the same object
+_current = ContextVar("request_stats", default=None)
+
+# On the Engine class, so they follow the app to whichever engine it is given
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if context is not None:
+        context._metrics_start = time.perf_counter()
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    start = getattr(context, "_metrics_start", None)
+    if start is None:
+        return
+    elapsed = time.perf_counter() - start
+    stats = _current.get()
+    with _lock:
+        if stats is not None:
+            stats.queries += 1
+            stats.db_seconds += elapsed
+        else:
+            background_queries.inc()
+            background_db_seconds.inc(amount=elapsed)
+
+def in_request():
+    """True while an HTTP request is being handled (inside MetricsMiddleware)"""
+    return _current.get() is not None
+
+def _route(scope):
+    route = scope.get("route")
+    return getattr(route, "path", None) or "unmatched"
+
+class MetricsMiddleware:
+    """Pure ASGI middleware, so streamed responses are timed to their last byte"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        stats = RequestStats()
+        token = _current.set(stats)
+        status = 500
+        start = time.perf_counter()
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            _current.reset(token)
+            elapsed = time.perf_counter() - start
+            labels = (scope["method"], _route(scope))
+            with _lock:
+                requests_total.inc(labels + (str(status),))
+                request_duration.observe(labels, elapsed)
+                request_db_duration.observe(labels, stats.db_seconds)
+                request_db_queries.observe(labels, stats.queries)
+
+def _gauge(name, help, value, kind="gauge"):
+    return [f"# HELP {name} {help}", f"# TYPE {name} {kind}", f"{name} {_number(value)}"]
+
+def pool_lines():
+    stats = pool_stats()
+    lines = []
+    if "checked_out" in stats:
+        lines += _gauge("db_pool_size", "Connections the pool keeps open.", stats["size"])
+        lines += _gauge("db_pool_checked_out", "Connections currently in use.", stats["checked_out"])
+        lines += _gauge("db_pool_idle", "Idle connections in the pool.", stats["idle"])
+        lines += _gauge("db_pool_overflow", "Overflow connections currently open.", stats["overflow"])
+    lines += _gauge("db_pool_checkouts_total", "Connection checkouts.", stats["checkouts"], "counter")
+    lines += _gauge("db_pool_overflow_checkouts_total", "Checkouts that opened an overflow connection.",
+                    stats["overflow_checkouts"], "counter")
+    lines += _gauge("db_pool_timeouts_total", "Checkouts that timed out waiting for a connection.",
+                    stats["timeouts"], "counter")
+    name = "db_pool_checkout_wait_seconds"
+    lines += [f"# HELP {name} Time spent waiting for a pooled connection.", f"# TYPE {name} histogram"]
+    cumulative = 0
+    for bound, n in stats["wait_buckets"].items():
+        cumulative += n
+        lines.append(f'{name}_bucket{{le="{_number(bound)}"}} {cumulative}')
+    lines.append(f'{name}_bucket{{le="+Inf"}} {stats["checkouts"] + stats["timeouts"]}')
+    lines.append(f"{name}_sum {_number(stats['wait_seconds_total'])}")
+    lines.append(f"{name}_count {stats['checkouts'] + stats['timeouts']}")
+    return lines
+
+def cache_lines():
+    lines = []
+    for metric, key, help in [
+        ("result_cache_hits_total", "hits", "Result cache hits."),
+        ("result_cache_misses_total", "misses", "Result cache misses."),
+        ("result_cache_evictions_total", "evictions", "Entries evicted to stay within the size limit."),
+        ("result_cache_invalidations_total", "invalidations", "Entries dropped by change-driven invalidation."),
+    ]:
+        lines += [f"# HELP {metric} {help}", f"# TYPE {metric} counter"]
+        for name, cache in sorted(caches.items()):
+            lines.append(f'{metric}{{cache="{_escape(name)}"}} {cache.stats()[key]}')
+    return lines
+
+def websocket_lines():
+    lines = []
+    tables = sorted(websockets.active_connections)
+    depths = {table: websockets.queue_depths(table) for table in tables}
+    for metric, value, help, kind in [
+        ("websocket_connections", lambda t: len(depths[t]), "Open WebSocket connections.", "gauge"),
+        ("websocket_queue_depth", lambda t: sum(depths[t]), "Messages queued for WebSocket clients.", "gauge"),
+        ("websocket_queue_depth_max", lambda t: max(depths[t], default=0),
+         "Longest outbound queue of any WebSocket client.", "gauge"),
+        ("websocket_messages_sent_total", lambda t: websockets.stats[t]["sent"], "Messages sent to WebSocket clients.", "counter"),
+        ("websocket_messages_dropped_total", lambda t: websockets.stats[t]["dropped"],
+         "Messages discarded because a client's queue was full.", "counter"),
+        ("websocket_queues_coalesced_total", lambda t: websockets.stats[t]["coalesced"],
+         "Full queues replaced by a single REFRESH message.", "counter"),
+    ]:
+        lines += [f"# HELP {metric} {help}", f"# TYPE {metric} {kind}"]
+        for table in tables:
+            lines.append(f'{metric}{{table="{table}"}} {value(table)}')
+    metric = "websocket_disconnects_total"
+    lines += [f"# HELP {metric} Connections closed by the server (overflow, timeout, send_error).",
+              f"# TYPE {metric} counter"]
+    for table in tables:
+        for reason, n in sorted(websockets.stats[table]["disconnects"].items()):
+            lines.append(f'{metric}{{table="{table}",reason="{reason}"}} {n}')
+    return lines
+
+def render():
+    with _lock:
+        lines = []
+        for metric in (requests_total, request_duration, request_db_duration, request_db_queries,
+                       background_queries, background_db_seconds):
+            lines += metric.render()
+    return "\n".join(lines + pool_lines() + cache_lines() + websocket_lines()) + "\n"
+
+@router.get("/metrics")
+def metrics():
+    """Prometheus scrape endpoint"""
+    return PlainTextResponse(render(), media_type="text/plain; version=0.0.4")
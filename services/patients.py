@@ -1,63 +1,81 @@
-from fastapi import APIRouter, HTTPException, Form
-from db.database import SessionLocal
+from fastapi import APIRouter, HTTPException, Form, Request, Response, Depends
+from db.database import get_db
+from sqlalchemy.orm import Session
 from db import database
+from services.listing import paginate, stream_list, parse_fields, project, page_response
+from services import conditional
 
 router = APIRouter()
 
 def get_patients(db):
     return db.query(database.Patient).all()
 
+def serialize_patient(p):
+    return {"id": p.id, "name": p.name, "email": p.email}
+
+PATIENT_FIELDS = ["id", "name", "email"]
+
 @router.get("/list")
-async def list_patients():
-    db = SessionLocal()
-    patients = get_patients(db)
-    db.close()
-    return [{"id": p.id, "name": p.name, "email": p.email} for p in patients]
+def list_patients(
+    request: Request,
+    response: Response,
+    email: str = None,
+    cursor: str = None,
+    limit: int = None,
+    fields: str = None,
+    db: Session = Depends(get_db)
+):
+    """List patients, optionally filtered, keyset-paginated and projected"""
+    not_modified = conditional.check(db, request, response, ["patients"])
+    if not_modified:
+        return not_modified
+    fields = parse_fields(fields, PATIENT_FIELDS)
+    query = db.query(database.Patient)
+    if email:
+        query = query.filter(database.Patient.email == email)
+    if limit is None:
+        return stream_list(query, database.Patient.id, cursor, serialize_patient, fields, response.headers)
+    patients, next_cursor = paginate(query, database.Patient.id, cursor, limit)
+    return page_response([project(serialize_patient(p), fields) for p in patients], next_cursor, limit)
 
 @router.post("/")
-async def create_patient(name: str = Form(...), email: str = Form(...)):
-    db = SessionLocal()
+def create_patient(name: str = Form(...), email: str = Form(...), db: Session = Depends(get_db)):
     try:
         patient = database.Patient(name=name, email=email)
         db.add(patient)
+        db.flush()
+        database.record_change(db, "patients", "INSERT", patient.id, serialize_patient(patient))
         db.commit()
-        db.refresh(patient)
         return {"status": "success", "patient_id": patient.id}
     except Exception as e:
         db.rollback()
         raise HTTPException(status_code=400, detail=str(e))
-    finally:
-        db.close()
 
 @router.post("/update")
-async def update_patient(patient_id: int = Form(...), name: str = Form(...), email: str = Form(...)):
-    db = SessionLocal()
+def update_patient(patient_id: int = Form(...), name: str = Form(...), email: str = Form(...), db: Session = Depends(get_db)):
     try:
         patient = db.query(database.Patient).filter(database.Patient.id == patient_id).first()
         if not patient:
             raise HTTPException(status_code=404, detail="Patient not found")
         patient.name = name
         patient.email = email
+        database.record_change(db, "patients", "UPDATE", patient.id, serialize_patient(patient))
         db.commit()
         return {"status": "success"}
     except Exception as e:
         db.rollback()
         raise HTTPException(status_code=400, detail=str(e))
-    finally:
-        db.close()
 
 @router.post("/delete")
-async def delete_patient(patient_id: int = Form(...)):
-    db = SessionLocal()
+def delete_patient(patient_id: int = Form(...), db: Session = Depends(get_db)):
     try:
         patient = db.query(database.Patient).filter(database.Patient.id == patient_id).first()
         if not patient:
             raise HTTPException(status_code=404, detail="Patient not found")
         db.delete(patient)
+        database.record_change(db, "patients", "DELETE", patient_id, {"id": patient_id})
         db.commit()
         return {"status": "success"}
     except Exception as e:
         db.rollback()
-        raise HTTPException(status_code=400, detail=str(e))
-    finally:
-        db.close()
\ No newline at end of file
+        raise HTTPException(status_code=400, detail=str(e))
\ No newline at end of file
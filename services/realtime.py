@@ -0,0 +1,188 @@
+"""
+WebSocket fan-out of committed changes.
+
+Every connection gets a bounded outbound queue and its own writer task, so
+broadcast() only enqueues and one slow client cannot hold up the others.
+When a client falls WS_QUEUE_SIZE messages behind, WS_OVERFLOW decides:
+  coalesce     replace its backlog with a single REFRESH message (default);
+               the page reloads the list instead of replaying every delta
+  drop-oldest  discard the oldest queued message
+  disconnect   close the connection; the page reconnects and reloads
+A send that fails or takes longer than WS_SEND_TIMEOUT seconds closes the
+connection and removes it.
+"""
+from collections import deque
+from fastapi import APIRouter, WebSocket, WebSocketDisconnect
+from services import broadcast
+import asyncio
+import json
+import os
+
+router = APIRouter()
+
+TABLES = ["doctors", "patients", "appointment_slots", "appointments", "cancellations"]
+MAX_BATCH = 500
+WS_QUEUE_SIZE = int(os.getenv('WS_QUEUE_SIZE', '100'))
+WS_OVERFLOW = os.getenv('WS_OVERFLOW', 'coalesce')
+WS_SEND_TIMEOUT = float(os.getenv('WS_SEND_TIMEOUT', '10'))
+OVERFLOW_POLICIES = ("coalesce", "drop-oldest", "disconnect")
+
+if WS_OVERFLOW not in OVERFLOW_POLICIES:
+    raise ValueError(f"WS_OVERFLOW must be one of {', '.join(OVERFLOW_POLICIES)}, not {WS_OVERFLOW!r}")
+
+def _refresh_message(table_name):
+    return json.dumps({"table": table_name, "action": "REFRESH"})
+
+class Connection:
+    """One client socket: its pending messages and the task writing them"""
+
+    def __init__(self, manager, websocket: WebSocket, table_name: str):
+        self.manager = manager
+        self.websocket = websocket
+        self.table_name = table_name
+        self.queue = deque()
+        self.ready = asyncio.Event()
+        self.closed = False
+        self.writer = asyncio.create_task(self.run())
+
+    def offer(self, message: str):
+        """Queue a message without waiting; apply the overflow policy when full"""
+        if self.closed:
+            return
+        stats = self.manager.stats[self.table_name]
+        if len(self.queue) >= self.manager.queue_size:
+            if self.manager.overflow == "disconnect":
+                stats["dropped"] += len(self.queue) + 1
+                self.manager.prune(self, "overflow")
+                return
+            if self.manager.overflow == "coalesce":
+                stats["dropped"] += len(self.queue) + 1
+                stats["coalesced"] += 1
+                self.queue.clear()
+                message = _refresh_message(self.table_name)
+            else:
+                stats["dropped"] += 1
+                self.queue.popleft()
+        self.queue.append(message)
+        self.ready.set()
+
+    async def run(self):
+        stats = self.manager.stats[self.table_name]
+        try:
+            while True:
+                if not self.queue:
+                    self.ready.clear()
+                    await self.ready.wait()
+                    continue
+                await asyncio.wait_for(self.websocket.send_text(self.queue.popleft()), self.manager.send_timeout)
+                stats["sent"] += 1
+        except asyncio.TimeoutError:
+            self.manager.prune(self, "timeout")
+        except Exception:
+            self.manager.prune(self, "send_error")
+
+    async def close(self):
+        try:
+            await self.websocket.close(code=1013)  # try again later
+        except Exception:
+            pass
+
+class WebSocketManager:
+    def __init__(self, queue_size=WS_QUEUE_SIZE, overflow=WS_OVERFLOW, send_timeout=WS_SEND_TIMEOUT):
+        self.queue_size = queue_size
+        self.overflow = overflow
+        self.send_timeout = send_timeout
+        self.active_connections = {table: {} for table in TABLES}
+        self.stats = {table: {"sent": 0, "dropped": 0, "coalesced": 0, "disconnects": {}} for table in TABLES}
+
+    async def connect(self, websocket: WebSocket, table_name: str):
+        await websocket.accept()
+        self.active_connections[table_name][websocket] = Connection(self, websocket, table_name)
+
+    async def disconnect(self, websocket: WebSocket, table_name: str):
+        connection = self.active_connections[table_name].pop(websocket, None)
+        if connection is not None:
+            connection.closed = True
+            connection.writer.cancel()
+
+    def prune(self, connection: Connection, reason: str):
+        """Drop a connection that cannot keep up or cannot be written to"""
+        if connection.closed:
+            return
+        connection.closed = True
+        self.active_connections[connection.table_name].pop(connection.websocket, None)
+        disconnects = self.stats[connection.table_name]["disconnects"]
+        disconnects[reason] = disconnects.get(reason, 0) + 1
+        connection.queue.clear()
+        if connection.writer is not asyncio.current_task():
+            connection.writer.cancel()
+        asyncio.ensure_future(connection.close())
+
+    def has_subscribers(self, table_name: str):
+        return bool(self.active_connections[table_name])
+
+    def broadcast(self, table_name: str, message: str):
+        """Queue a message for every subscriber of the table; returns immediately"""
+        for connection in list(self.active_connections[table_name].values()):
+            connection.offer(message)
+
+    def queue_depths(self, table_name: str):
+        return [len(c.queue) for c in self.active_connections[table_name].values()]
+
+manager = WebSocketManager()
+
+@broadcast.subscribe
+def push_changes(changes):
+    """Queue each table's share of a delivered batch for that table's subscribers"""
+    by_table = {}
+    for change in changes:
+        by_table.setdefault(change[1], []).append(change)
+    for table_name, table_changes in by_table.items():
+        if table_name not in manager.active_connections or not manager.has_subscribers(table_name):
+            continue
+        if len(table_changes) > MAX_BATCH or any(c[2] == broadcast.REFRESH for c in table_changes):
+            # Too many deltas to be worth patching; tell clients to reload
+            message = {"table": table_name, "action": "REFRESH"}
+        else:
+            message = {
+                "table": table_name,
+                "changes": [
+                    {"change_id": change_id, "action": action, "id": record_id, "data": data}
+                    for change_id, _, action, record_id, data in table_changes
+                ]
+            }
+        try:
+            manager.broadcast(table_name, json.dumps(message))
+        except Exception as e:
+            print(f"❌ WebSocket push error for {table_name}: {str(e)}")
+
+async def websocket_endpoint(websocket: WebSocket, table_name: str):
+    await manager.connect(websocket, table_name)
+    try:
+        # The feed pushes updates; we only read to notice the client going away
+        while True:
+            await websocket.receive_text()
+    except (WebSocketDisconnect, RuntimeError):
+        pass  # RuntimeError: we closed it after an overflow or failed send
+    finally:
+        await manager.disconnect(websocket, table_name)
+
+@router.websocket("/doctors")
+async def websocket_doctors(websocket: WebSocket):
+    await websocket_endpoint(websocket, "doctors")
+
+@router.websocket("/patients")
+async def websocket_patients(websocket: WebSocket):
+    await websocket_endpoint(websocket, "patients")
+
+@router.websocket("/appointment_slots")
+async def websocket_slots(websocket: WebSocket):
+    await websocket_endpoint(websocket, "appointment_slots")
+
+@router.websocket("/appointments")
+async def websocket_appointments(websocket: WebSocket):
+    await websocket_endpoint(websocket, "appointments")
+
+@router.websocket("/cancellations")
+async def websocket_cancellations(websocket: WebSocket):
+    await websocket_endpoint(websocket, "cancellations")
@@ -0,0 +1,294 @@
+"""
+Memory-resident index of free slots for "next available" lookups.
+
+Free slots from today onwards are loaded at startup into lists ordered by
+(date, start_time), one per doctor and one per specialty, so the next N
+slots after a point in time are a bisect and a slice away. The index is
+kept current from the committed changes services.broadcast delivers, this
+process's and other workers'. Row changes are applied in place on the event
+loop; bulk changes, whose rows have to be re-read, are queued for a
+background task, so no request waits for a reload. Applying a change is
+idempotent, so seeing the same change twice is harmless.
+"""
+from bisect import bisect_left, insort
+from collections import defaultdict
+from datetime import date, datetime, time
+from threading import RLock
+from starlette.concurrency import run_in_threadpool
+from sqlalchemy import select, func
+from db.database import get_engine
+from db import database
+from services import broadcast
+import asyncio
+
+SOURCE_TABLES = ["appointment_slots", "doctors"]
+
+def _specialty_key(specialty):
+    return (specialty or "").strip().lower()
+
+def _parse(value, parse):
+    return value if not isinstance(value, str) else parse(value)
+
+class SlotIndex:
+    def __init__(self):
+        self._lock = RLock()
+        self.slots = {}  # slot_id -> (doctor_id, date, start_time, end_time)
+        self.by_doctor = defaultdict(list)  # doctor_id -> [(date, start_time, slot_id)]
+        self.by_specialty = defaultdict(list)  # specialty -> [(date, start_time, slot_id)]
+        self.doctors = {}  # doctor_id -> (name, specialty)
+        self.last_change_id = 0  # highest change id applied or covered by the last load
+        # Database reads queued by apply() for refresh()
+        self.full_reload = False
+        self.new_doctors = False
+        self.stale_doctors = set()
+        # Changes delivered while load() or reload_doctors() reads, replayed on what it read
+        self.reading = None
+        self.loaded = False
+
+    def _free_slots(self, conn, since, doctor_ids=None):
+        slots = database.AppointmentSlot.__table__
+        query = select(slots.c.id, slots.c.doctor_id, slots.c.date, slots.c.start_time, slots.c.end_time).where(
+            slots.c.is_available == True,
+            slots.c.date >= since
+        )
+        if doctor_ids is not None:
+            query = query.where(slots.c.doctor_id.in_(doctor_ids))
+        return conn.execution_options(yield_per=10_000).execute(query)
+
+    def load(self, since=None):
+        """(Re)build the whole index from the database, then swap it in"""
+        since = since or date.today()
+        self._begin_read()
+        with get_engine().connect() as conn:
+            last_change_id = conn.execute(select(func.max(database.Change.id))).scalar() or 0
+            doctors = {r.id: (r.name, r.specialty) for r in conn.execute(
+                select(database.Doctor.id, database.Doctor.name, database.Doctor.specialty)
+            )}
+            slots = {}
+            by_doctor = defaultdict(list)
+            for r in self._free_slots(conn, since):
+                if r.doctor_id in doctors:
+                    slots[r.id] = (r.doctor_id, r.date, r.start_time, r.end_time)
+                    by_doctor[r.doctor_id].append((r.date, r.start_time, r.id))
+        by_specialty = defaultdict(list)
+        for doctor_id, entries in by_doctor.items():
+            entries.sort()
+            by_specialty[_specialty_key(doctors[doctor_id][1])].extend(entries)
+        for entries in by_specialty.values():
+            entries.sort()
+        with self._lock:
+            self.slots, self.by_doctor, self.by_specialty, self.doctors = slots, by_doctor, by_specialty, doctors
+            self.last_change_id = last_change_id
+            self.loaded = True
+            self._end_read()
+        print(f"✅ Slot index loaded: {len(slots)} free slots, {len(doctors)} doctors")
+
+    def reload_doctors(self, doctor_ids, since=None):
+        """Re-read some doctors' free slots in one query, e.g. after a bulk schedule generation or import"""
+        since = since or date.today()
+        self._begin_read()
+        with get_engine().connect() as conn:
+            rows = self._free_slots(conn, since, list(doctor_ids)).all()
+        with self._lock:
+            for doctor_id in doctor_ids:
+                for _, _, slot_id in list(self.by_doctor.get(doctor_id, [])):
+                    self._remove_slot(slot_id)
+            for r in rows:
+                self._add_slot(r.id, r.doctor_id, r.date, r.start_time, r.end_time)
+            self._end_read()
+
+    def add_new_doctors(self):
+        """Pick up doctors inserted in bulk; they have no slots in the index yet"""
+        self._begin_read()
+        with get_engine().connect() as conn:
+            rows = conn.execute(select(database.Doctor.id, database.Doctor.name, database.Doctor.specialty)).all()
+        with self._lock:
+            for r in rows:
+                self.doctors.setdefault(r.id, (r.name, r.specialty))
+            self._end_read()
+
+    def _begin_read(self):
+        with self._lock:
+            self.reading = []
+
+    def _end_read(self):
+        """Re-apply the changes delivered during the read; the caller holds the lock"""
+        changes, self.reading = self.reading, None
+        self.apply_changes(changes)
+
+    def _lists(self, doctor_id):
+        lists = [self.by_doctor[doctor_id]]
+        if doctor_id in self.doctors:
+            lists.append(self.by_specialty[_specialty_key(self.doctors[doctor_id][1])])
+        return lists
+
+    def _remove_slot(self, slot_id):
+        slot = self.slots.pop(slot_id, None)
+        if slot is None:
+            return
+        doctor_id, day, start, _ = slot
+        entry = (day, start, slot_id)
+        for entries in self._lists(doctor_id):
+            i = bisect_left(entries, entry)
+            if i < len(entries) and entries[i] == entry:
+                del entries[i]
+
+    def _add_slot(self, slot_id, doctor_id, day, start, end):
+        if doctor_id not in self.doctors:
+            return
+        self.slots[slot_id] = (doctor_id, day, start, end)
+        for entries in self._lists(doctor_id):
+            insort(entries, (day, start, slot_id))
+
+    def apply_slot(self, data):
+        """Set one slot to the state in a change payload"""
+        with self._lock:
+            self._remove_slot(data["id"])
+            if data.get("is_available") and data.get("doctor_id") is not None:
+                self._add_slot(
+                    data["id"],
+                    data["doctor_id"],
+                    _parse(data["date"], date.fromisoformat),
+                    _parse(data["start_time"], time.fromisoformat),
+                    _parse(data["end_time"], time.fromisoformat)
+                )
+
+    def apply_doctor(self, doctor_id, data):
+        with self._lock:
+            old = self.doctors.get(doctor_id)
+            entries = self.by_doctor.get(doctor_id, [])
+            if old is not None:
+                specialty = self.by_specialty[_specialty_key(old[1])]
+                moved = set(entries)
+                specialty[:] = [e for e in specialty if e not in moved]
+            if data is None:
+                self.doctors.pop(doctor_id, None)
+                for _, _, slot_id in self.by_doctor.pop(doctor_id, []):
+                    self.slots.pop(slot_id, None)
+                return
+            self.doctors[doctor_id] = (data["name"], data["specialty"])
+            specialty = self.by_specialty[_specialty_key(data["specialty"])]
+            for entry in entries:
+                insort(specialty, entry)
+
+    def apply(self, table_name, action, record_id, data):
+        """Apply one committed change in place; returns False if it queued database reads for refresh()"""
+        if action == broadcast.REFRESH or action.startswith("BULK"):
+            data = data or {}
+            doctor_ids = data.get("doctor_ids") or ([data["doctor_id"]] if data.get("doctor_id") is not None else [])
+            with self._lock:
+                if table_name == "doctors" and action == "BULK_INSERT":
+                    self.new_doctors = True
+                elif table_name == "appointment_slots" and action.startswith("BULK") and doctor_ids:
+                    self.stale_doctors.update(doctor_ids)
+                else:
+                    self.full_reload = True
+            return False
+        if table_name == "appointment_slots":
+            if action == "DELETE":
+                with self._lock:
+                    self._remove_slot(record_id)
+            elif data:
+                self.apply_slot(data)
+        elif table_name == "doctors":
+            if action == "DELETE":
+                self.apply_doctor(record_id, None)
+            elif data:
+                self.apply_doctor(record_id, data)
+        return True
+
+    def apply_changes(self, changes):
+        """Apply a delivered batch of changes; returns True if refresh() has work queued"""
+        with self._lock:
+            if self.reading is not None:
+                self.reading.extend(changes)
+            if not self.loaded:
+                return False
+            queued = False
+            for change_id, table_name, action, record_id, data in changes:
+                if table_name in SOURCE_TABLES and not self.apply(table_name, action, record_id, data):
+                    queued = True
+                self.last_change_id = max(self.last_change_id, change_id or 0)
+            return queued
+
+    def refresh(self):
+        """Run the database reads queued by apply(), until replayed changes queue no more; called from the background task"""
+        while True:
+            with self._lock:
+                full_reload, new_doctors, stale_doctors = self.full_reload, self.new_doctors, self.stale_doctors
+                self.full_reload, self.new_doctors, self.stale_doctors = False, False, set()
+            if full_reload:
+                self.load()
+                continue
+            if not (new_doctors or stale_doctors):
+                return
+            # New doctors first, so their slots have a doctor to be indexed under
+            if new_doctors:
+                self.add_new_doctors()
+            if stale_doctors:
+                self.reload_doctors(sorted(stale_doctors))
+
+    def next_available(self, doctor_id=None, specialty=None, after=None, limit=10):
+        """The first `limit` free slots starting at or after `after`"""
+        after = after or datetime.now()
+        start = (after.date(), after.time().replace(microsecond=0), 0)
+        with self._lock:
+            if doctor_id is not None:
+                entries = self.by_doctor.get(doctor_id, [])
+                if specialty is not None and _specialty_key(self.doctors.get(doctor_id, ("", ""))[1]) != _specialty_key(specialty):
+                    entries = []
+            else:
+                entries = self.by_specialty.get(_specialty_key(specialty), [])
+            i = bisect_left(entries, start)
+            results = []
+            for day, begin, slot_id in entries[i:i + limit]:
+                doctor = self.slots[slot_id][0]
+                name, doctor_specialty = self.doctors[doctor]
+                results.append({
+                    "slot_id": slot_id,
+                    "doctor_id": doctor,
+                    "doctor_name": name,
+                    "specialty": doctor_specialty,
+                    "date": str(day),
+                    "start_time": str(begin),
+                    "end_time": str(self.slots[slot_id][3])
+                })
+            return results
+
+slot_index = SlotIndex()
+
+_refresh_needed = None
+_refresh_task = None
+
+@broadcast.subscribe
+def apply_broadcast(changes):
+    if slot_index.apply_changes(changes) and _refresh_needed is not None:
+        _refresh_needed.set()
+
+async def run_refreshes():
+    while True:
+        await _refresh_needed.wait()
+        _refresh_needed.clear()
+        try:
+            await run_in_threadpool(slot_index.refresh)
+        except Exception as e:
+            print(f"❌ Slot index refresh error: {str(e)}")
+
+async def start_slot_index():
+    global _refresh_needed, _refresh_task
+    _refresh_needed = asyncio.Event()
+    await run_in_threadpool(slot_index.load)
+    _refresh_task = asyncio.create_task(run_refreshes())
+    # Changes replayed after the load may have queued reads
+    _refresh_needed.set()
+
+async def stop_slot_index():
+    global _refresh_needed, _refresh_task
+    if _refresh_task:
+        _refresh_task.cancel()
+        try:
+            await _refresh_task
+        except asyncio.CancelledError:
+            pass
+        _refresh_task = None
+    _refresh_needed = None
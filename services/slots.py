@@ -1,40 +1,83 @@
-from fastapi import APIRouter, HTTPException, Form
-from db.database import SessionLocal
-from db import database
+from fastapi import APIRouter, HTTPException, Form, Request, Response, Depends
+from db.database import get_db
+from sqlalchemy.orm import Session
+from db import database, capacity
+from services.listing import paginate, stream_list, parse_fields, project, page_response
+from services import conditional
+from datetime import date as date_type, time as time_type, datetime, timedelta
+from collections import defaultdict
 
 router = APIRouter()
 
+WEEKDAYS = ["mon", "tue", "wed", "thu", "fri", "sat", "sun"]
+MAX_GENERATED_SLOTS = 200_000
+INSERT_BATCH_SIZE = 5_000
+
 def get_slots(db):
     return db.query(database.AppointmentSlot).all()
 
+def serialize_slot(s):
+    return {
+        "id": s.id,
+        "doctor_id": s.doctor_id,
+        "date": str(s.date),
+        "start_time": str(s.start_time),
+        "end_time": str(s.end_time),
+        "is_available": s.is_available
+    }
+
+def parse_slot_times(date, start_time, end_time):
+    """Convert the ISO strings posted by the forms into date/time objects"""
+    return date_type.fromisoformat(date), time_type.fromisoformat(start_time), time_type.fromisoformat(end_time)
+
+SLOT_FIELDS = ["id", "doctor_id", "date", "start_time", "end_time", "is_available"]
+
 @router.get("/list")
-async def list_slots():
-    db = SessionLocal()
+def list_slots(
+    request: Request,
+    response: Response,
+    doctor_id: int = None,
+    start_date: str = None,
+    end_date: str = None,
+    is_available: bool = None,
+    cursor: str = None,
+    limit: int = None,
+    fields: str = None,
+    db: Session = Depends(get_db)
+):
+    """List slots, optionally filtered, keyset-paginated and projected"""
     try:
-        slots = get_slots(db)
-        return [
-            {
-                "id": s.id,
-                "doctor_id": s.doctor_id,
-                "date": str(s.date),
-                "start_time": str(s.start_time),
-                "end_time": str(s.end_time),
-                "is_available": s.is_available
-            } for s in slots
-        ]
-    finally:
-        db.close()
+        not_modified = conditional.check(db, request, response, ["appointment_slots"])
+        if not_modified:
+            return not_modified
+        fields = parse_fields(fields, SLOT_FIELDS)
+        query = db.query(database.AppointmentSlot)
+        if doctor_id is not None:
+            query = query.filter(database.AppointmentSlot.doctor_id == doctor_id)
+        if start_date:
+            query = query.filter(database.AppointmentSlot.date >= date_type.fromisoformat(start_date))
+        if end_date:
+            query = query.filter(database.AppointmentSlot.date <= date_type.fromisoformat(end_date))
+        if is_available is not None:
+            query = query.filter(database.AppointmentSlot.is_available == is_available)
+        if limit is None:
+            return stream_list(query, database.AppointmentSlot.id, cursor, serialize_slot, fields, response.headers)
+        slots, next_cursor = paginate(query, database.AppointmentSlot.id, cursor, limit)
+        return page_response([project(serialize_slot(s), fields) for s in slots], next_cursor, limit)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
 @router.post("/")
-async def create_slot(
+def create_slot(
     doctor_id: int = Form(...),
     date: str = Form(...),
     start_time: str = Form(...),
     end_time: str = Form(...),
-    is_available: bool = Form(True)
+    is_available: bool = Form(True),
+    db: Session = Depends(get_db)
 ):
-    db = SessionLocal()
     try:
+        date, start_time, end_time = parse_slot_times(date, start_time, end_time)
         slot = database.AppointmentSlot(
             doctor_id=doctor_id,
             date=date,
@@ -43,54 +86,204 @@ async def create_slot(
             is_available=is_available
         )
         db.add(slot)
+        db.flush()
+        capacity.adjust(db, doctor_id, date, **capacity.slot_deltas(is_available))
+        database.record_change(db, "appointment_slots", "INSERT", slot.id, serialize_slot(slot))
         db.commit()
-        db.refresh(slot)
         return {"status": "success", "slot_id": slot.id}
     except Exception as e:
         db.rollback()
         raise HTTPException(status_code=400, detail=str(e))
-    finally:
-        db.close()
 
 @router.post("/update")
-async def update_slot(
+def update_slot(
     slot_id: int = Form(...),
     doctor_id: int = Form(...),
     date: str = Form(...),
     start_time: str = Form(...),
     end_time: str = Form(...),
-    is_available: bool = Form(...)
+    is_available: bool = Form(...),
+    db: Session = Depends(get_db)
 ):
-    db = SessionLocal()
     try:
         slot = db.query(database.AppointmentSlot).filter(database.AppointmentSlot.id == slot_id).first()
         if not slot:
             raise HTTPException(status_code=404, detail="Slot not found")
+        date, start_time, end_time = parse_slot_times(date, start_time, end_time)
+
+        # Move the slot (and its appointments) from its old doctor-day to the new one
+        deltas = capacity.new_deltas()
+        booked = capacity.appointment_count(db, slot.id) if (slot.doctor_id, slot.date) != (doctor_id, date) else 0
+        capacity.add(deltas, slot.doctor_id, slot.date, confirmed_appointments=-booked,
+                     **capacity.slot_deltas(slot.is_available, -1))
+        capacity.add(deltas, doctor_id, date, confirmed_appointments=booked,
+                     **capacity.slot_deltas(is_available))
+        capacity.apply(db, deltas)
+
+        previous_doctor_id = slot.doctor_id
         slot.doctor_id = doctor_id
         slot.date = date
         slot.start_time = start_time
         slot.end_time = end_time
         slot.is_available = is_available
+        data = serialize_slot(slot)
+        if previous_doctor_id != doctor_id:
+            data["previous_doctor_id"] = previous_doctor_id
+        database.record_change(db, "appointment_slots", "UPDATE", slot.id, data)
         db.commit()
         return {"status": "success"}
     except Exception as e:
         db.rollback()
         raise HTTPException(status_code=400, detail=str(e))
-    finally:
-        db.close()
 
 @router.post("/delete")
-async def delete_slot(slot_id: int = Form(...)):
-    db = SessionLocal()
+def delete_slot(slot_id: int = Form(...), db: Session = Depends(get_db)):
     try:
         slot = db.query(database.AppointmentSlot).filter(database.AppointmentSlot.id == slot_id).first()
         if not slot:
             raise HTTPException(status_code=404, detail="Slot not found")
+        capacity.adjust(db, slot.doctor_id, slot.date,
+                        confirmed_appointments=-capacity.appointment_count(db, slot.id),
+                        **capacity.slot_deltas(slot.is_available, -1))
         db.delete(slot)
+        database.record_change(db, "appointment_slots", "DELETE", slot_id, {"id": slot_id, "doctor_id": slot.doctor_id})
         db.commit()
         return {"status": "success"}
     except Exception as e:
         db.rollback()
         raise HTTPException(status_code=400, detail=str(e))
-    finally:
-        db.close()
\ No newline at end of file
+
+def parse_weekdays(weekdays):
+    """Accept "mon,tue,fri" or ISO weekday numbers "0,1,4" (Monday is 0)"""
+    days = set()
+    for part in weekdays.split(","):
+        part = part.strip().lower()
+        if not part:
+            continue
+        if part[:3] in WEEKDAYS:
+            days.add(WEEKDAYS.index(part[:3]))
+        elif part.isdigit() and int(part) < 7:
+            days.add(int(part))
+        else:
+            raise ValueError(f"Invalid weekday: {part}")
+    return days
+
+def expand_schedule(start_date, end_date, weekdays, day_start, day_end, slot_minutes, skip_dates):
+    """Yield (date, start_time, end_time) for every slot the template describes"""
+    length = timedelta(minutes=slot_minutes)
+    day = start_date
+    while day <= end_date:
+        if day.weekday() in weekdays and day not in skip_dates:
+            start = datetime.combine(day, day_start)
+            close = datetime.combine(day, day_end)
+            while start + length <= close:
+                yield day, start.time(), (start + length).time()
+                start += length
+        day += timedelta(days=1)
+
+@router.post("/generate")
+def generate_slots(
+    doctor_id: int = Form(...),
+    start_date: str = Form(...),
+    end_date: str = Form(...),
+    weekdays: str = Form("mon,tue,wed,thu,fri"),
+    day_start: str = Form("09:00"),
+    day_end: str = Form("17:00"),
+    slot_minutes: int = Form(20),
+    skip_dates: str = Form(""),
+    on_overlap: str = Form("skip"),
+    db: Session = Depends(get_db)
+):
+    """
+    Expand a recurring schedule template (e.g. Mon-Fri 09:00-17:00, 20-minute
+    slots, between two dates, minus skipped dates) into slots, and insert them
+    with batched bulk INSERTs in a single transaction.
+
+    Existing slots for the doctor in the range are loaded once and checked in
+    memory: on_overlap=skip leaves overlapping template slots out, on_overlap=fail
+    rejects the whole template.
+    """
+    try:
+        start_date = date_type.fromisoformat(start_date)
+        end_date = date_type.fromisoformat(end_date)
+        day_start = time_type.fromisoformat(day_start)
+        day_end = time_type.fromisoformat(day_end)
+        days = parse_weekdays(weekdays)
+        skipped = {date_type.fromisoformat(d.strip()) for d in skip_dates.split(",") if d.strip()}
+        if end_date < start_date:
+            raise HTTPException(status_code=400, detail="end_date is before start_date")
+        if slot_minutes < 1 or day_end <= day_start:
+            raise HTTPException(status_code=400, detail="Invalid daily hours or slot length")
+        if on_overlap not in ("skip", "fail"):
+            raise HTTPException(status_code=400, detail="on_overlap must be 'skip' or 'fail'")
+
+        doctor = db.query(database.Doctor.id).filter(database.Doctor.id == doctor_id).first()
+        if not doctor:
+            raise HTTPException(status_code=404, detail="Doctor not found")
+
+        # One indexed range read of the doctor's existing slots, grouped by day
+        existing = defaultdict(list)
+        for row in db.query(
+            database.AppointmentSlot.date,
+            database.AppointmentSlot.start_time,
+            database.AppointmentSlot.end_time
+        ).filter(
+            database.AppointmentSlot.doctor_id == doctor_id,
+            database.AppointmentSlot.date >= start_date,
+            database.AppointmentSlot.date <= end_date
+        ):
+            existing[row.date].append((row.start_time, row.end_time))
+
+        rows = []
+        overlaps = 0
+        for day, start, end in expand_schedule(start_date, end_date, days, day_start, day_end, slot_minutes, skipped):
+            if any(start < taken_end and taken_start < end for taken_start, taken_end in existing.get(day, ())):
+                overlaps += 1
+                continue
+            rows.append({
+                "doctor_id": doctor_id,
+                "date": day,
+                "start_time": start,
+                "end_time": end,
+                "is_available": True
+            })
+            if len(rows) > MAX_GENERATED_SLOTS:
+                raise HTTPException(status_code=400, detail=f"Template expands to more than {MAX_GENERATED_SLOTS} slots")
+
+        if overlaps and on_overlap == "fail":
+            raise HTTPException(status_code=400, detail=f"{overlaps} template slots overlap existing slots")
+
+        table = database.AppointmentSlot.__table__
+        for i in range(0, len(rows), INSERT_BATCH_SIZE):
+            db.execute(table.insert(), rows[i:i + INSERT_BATCH_SIZE])
+
+        per_day = capacity.new_deltas()
+        for row in rows:
+            capacity.add(per_day, doctor_id, row["date"], total_slots=1, available_slots=1)
+        capacity.apply(db, per_day)
+
+        if rows:
+            # One summary change instead of a row per slot; clients reload the list
+            database.record_change(db, "appointment_slots", "BULK_INSERT", 0, {
+                "doctor_id": doctor_id,
+                "start_date": str(start_date),
+                "end_date": str(end_date),
+                "count": len(rows)
+            })
+        db.commit()
+
+        print(f"✅ Generated {len(rows)} slots for doctor {doctor_id} ({overlaps} overlapping skipped)")
+
+        return {
+            "status": "success",
+            "created": len(rows),
+            "skipped_overlaps": overlaps,
+            "skipped_dates": len(skipped)
+        }
+    except HTTPException:
+        db.rollback()
+        raise
+    except Exception as e:
+        db.rollback()
+        print(f"❌ Error generating slots: {str(e)}")
+        raise HTTPException(status_code=400, detail=str(e))
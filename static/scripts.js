@@ -1,23 +1,148 @@
 let sockets = {};
 
 // WebSocket initialization
-function initWebSocket(table) {
+function initWebSocket(table, reconnecting = false) {
     sockets[table] = new WebSocket(`ws://localhost:8080/ws/${table}`);
+    sockets[table].onopen = function() {
+        // Changes made while we were away (or dropped by the server) were not delivered
+        if (reconnecting) refreshList(table);
+    };
     sockets[table].onmessage = function(event) {
         if (event.data === `update_${table}`) {
             console.log(`Received WebSocket update for ${table}`);
             refreshList(table);
+            return;
+        }
+        const message = JSON.parse(event.data);
+        console.log(`Received WebSocket changes for ${table}:`, message);
+        // Let pages with their own rendering patch their views too
+        document.dispatchEvent(new CustomEvent('table-changes', { detail: message }));
+        if (message.action === 'REFRESH' || message.changes.some(c => c.action.startsWith('BULK'))) {
+            refreshList(table);
+        } else {
+            applyChanges(table, message.changes);
         }
     };
     sockets[table].onclose = function() {
         console.log(`WebSocket closed for ${table}, reconnecting...`);
-        setTimeout(() => initWebSocket(table), 5000);
+        setTimeout(() => initWebSocket(table, true), 5000);
     };
     sockets[table].onerror = function(error) {
         console.error(`WebSocket error for ${table}:`, error);
     };
 }
 
+// Patch the rendered rows in place from WebSocket deltas instead of re-fetching the list
+function applyChanges(table, changes) {
+    const tableBody = document.querySelector(`#${table}-table tbody`);
+    if (!tableBody) return;
+    changes.forEach(change => {
+        const existing = tableBody.querySelector(`tr[data-id="${change.id}"]`);
+        if (change.action === 'DELETE') {
+            if (existing) existing.remove();
+            return;
+        }
+        if (!change.data) return;
+        const item = existing ? { ...JSON.parse(existing.dataset.item), ...change.data } : change.data;
+        const row = buildRow(table, item);
+        if (existing) {
+            existing.replaceWith(row);
+        } else {
+            tableBody.appendChild(row);
+        }
+    });
+    const noDataMessage = document.querySelector(`#${table}-list p`);
+    if (noDataMessage && tableBody.children.length > 0) noDataMessage.remove();
+    filterList(table);
+}
+
+// Build a table row for one item of /<table>/list
+function buildRow(table, item) {
+    const row = document.createElement('tr');
+    row.className = 'border-t';
+    row.dataset.id = item.id;
+    row.dataset.item = JSON.stringify(item);
+    row.dataset.name = item.name || item.date || item.id;
+    row.dataset.filter = item.specialty || item.email || item.is_available || item.appointment_id || item.reason || '';
+    if (table === 'doctors') {
+        row.innerHTML = `
+            <td class="p-3">${item.id}</td>
+            <td class="p-3">${item.name}</td>
+            <td class="p-3">${item.specialty}</td>
+            <td class="p-3 flex space-x-2">
+                <button onclick="openEditModal('${table}', ${item.id}, '${item.name.replace(/'/g, "\\'")}', '${item.specialty.replace(/'/g, "\\'")}')" class="text-blue-600 hover:text-blue-800">
+                    <i class="fas fa-edit"></i>
+                </button>
+                <button onclick="deleteEntity(${item.id}, 'Doctor', '/${table}/delete')" class="text-red-600 hover:text-red-800">
+                    <i class="fas fa-trash"></i>
+                </button>
+            </td>
+        `;
+    } else if (table === 'patients') {
+        row.innerHTML = `
+            <td class="p-3">${item.id}</td>
+            <td class="p-3">${item.name}</td>
+            <td class="p-3">${item.email}</td>
+            <td class="p-3 flex space-x-2">
+                <button onclick="openEditModal('${table}', ${item.id}, '${item.name.replace(/'/g, "\\'")}', '${item.email.replace(/'/g, "\\'")}')" class="text-blue-600 hover:text-blue-800">
+                    <i class="fas fa-edit"></i>
+                </button>
+                <button onclick="deleteEntity(${item.id}, 'Patient', '/${table}/delete')" class="text-red-600 hover:text-red-800">
+                    <i class="fas fa-trash"></i>
+                </button>
+            </td>
+        `;
+    } else if (table === 'appointment_slots') {
+        row.innerHTML = `
+            <td class="p-3">${item.id}</td>
+            <td class="p-3">${item.doctor_id}</td>
+            <td class="p-3">${item.date}</td>
+            <td class="p-3">${item.start_time}</td>
+            <td class="p-3">${item.end_time}</td>
+            <td class="p-3">${item.is_available}</td>
+            <td class="p-3 flex space-x-2">
+                <button onclick="openEditModal('${table}', ${item.id}, ${item.doctor_id}, '${item.date}', '${item.start_time}', '${item.end_time}', ${item.is_available})" class="text-blue-600 hover:text-blue-800">
+                    <i class="fas fa-edit"></i>
+                </button>
+                <button onclick="deleteEntity(${item.id}, 'Slot', '/${table}/delete')" class="text-red-600 hover:text-red-800">
+                    <i class="fas fa-trash"></i>
+                </button>
+            </td>
+        `;
+    } else if (table === 'appointments') {
+        row.innerHTML = `
+            <td class="p-3">${item.id}</td>
+            <td class="p-3">${item.patient_id}</td>
+            <td class="p-3">${item.slot_id}</td>
+            <td class="p-3">${item.booked_at}</td>
+            <td class="p-3 flex space-x-2">
+                <button onclick="openEditModal('${table}', ${item.id}, ${item.patient_id}, ${item.slot_id})" class="text-blue-600 hover:text-blue-800">
+                    <i class="fas fa-edit"></i>
+                </button>
+                <button onclick="deleteEntity(${item.id}, 'Appointment', '/${table}/delete')" class="text-red-600 hover:text-red-800">
+                    <i class="fas fa-trash"></i>
+                </button>
+            </td>
+        `;
+    } else if (table === 'cancellations') {
+        row.innerHTML = `
+            <td class="p-3">${item.id}</td>
+            <td class="p-3">${item.appointment_id}</td>
+            <td class="p-3">${item.reason || ''}</td>
+            <td class="p-3">${item.cancelled_at}</td>
+            <td class="p-3 flex space-x-2">
+                <button onclick="openEditModal('${table}', ${item.id}, ${item.appointment_id}, '${item.reason ? item.reason.replace(/'/g, "\\'") : ''}')" class="text-blue-600 hover:text-blue-800">
+                    <i class="fas fa-edit"></i>
+                </button>
+                <button onclick="deleteEntity(${item.id}, 'Cancellation', '/${table}/delete')" class="text-red-600 hover:text-red-800">
+                    <i class="fas fa-trash"></i>
+                </button>
+            </td>
+        `;
+    }
+    return row;
+}
+
 // Refresh list via WebSocket updates
 async function refreshList(table) {
     try {
@@ -31,86 +156,7 @@ async function refreshList(table) {
         if (data.length > 0) {
             tableBody.innerHTML = '';
             data.forEach(item => {
-                const row = document.createElement('tr');
-                row.className = 'border-t';
-                row.dataset.name = item.name || item.date || item.id;
-                row.dataset.filter = item.specialty || item.email || item.is_available || item.appointment_id || item.reason || '';
-                if (table === 'doctors') {
-                    row.innerHTML = `
-                        <td class="p-3">${item.id}</td>
-                        <td class="p-3">${item.name}</td>
-                        <td class="p-3">${item.specialty}</td>
-                        <td class="p-3 flex space-x-2">
-                            <button onclick="openEditModal('${table}', ${item.id}, '${item.name.replace(/'/g, "\\'")}', '${item.specialty.replace(/'/g, "\\'")}')" class="text-blue-600 hover:text-blue-800">
-                                <i class="fas fa-edit"></i>
-                            </button>
-                            <button onclick="deleteEntity(${item.id}, 'Doctor', '/${table}/delete')" class="text-red-600 hover:text-red-800">
-                                <i class="fas fa-trash"></i>
-                            </button>
-                        </td>
-                    `;
-                } else if (table === 'patients') {
-                    row.innerHTML = `
-                        <td class="p-3">${item.id}</td>
-                        <td class="p-3">${item.name}</td>
-                        <td class="p-3">${item.email}</td>
-                        <td class="p-3 flex space-x-2">
-                            <button onclick="openEditModal('${table}', ${item.id}, '${item.name.replace(/'/g, "\\'")}', '${item.email.replace(/'/g, "\\'")}')" class="text-blue-600 hover:text-blue-800">
-                                <i class="fas fa-edit"></i>
-                            </button>
-                            <button onclick="deleteEntity(${item.id}, 'Patient', '/${table}/delete')" class="text-red-600 hover:text-red-800">
-                                <i class="fas fa-trash"></i>
-                            </button>
-                        </td>
-                    `;
-                } else if (table === 'appointment_slots') {
-                    row.innerHTML = `
-                        <td class="p-3">${item.id}</td>
-                        <td class="p-3">${item.doctor_id}</td>
-                        <td class="p-3">${item.date}</td>
-                        <td class="p-3">${item.start_time}</td>
-                        <td class="p-3">${item.end_time}</td>
-                        <td class="p-3">${item.is_available}</td>
-                        <td class="p-3 flex space-x-2">
-                            <button onclick="openEditModal('${table}', ${item.id}, ${item.doctor_id}, '${item.date}', '${item.start_time}', '${item.end_time}', ${item.is_available})" class="text-blue-600 hover:text-blue-800">
-                                <i class="fas fa-edit"></i>
-                            </button>
-                            <button onclick="deleteEntity(${item.id}, 'Slot', '/${table}/delete')" class="text-red-600 hover:text-red-800">
-                                <i class="fas fa-trash"></i>
-                            </button>
-                        </td>
-                    `;
-                } else if (table === 'appointments') {
-                    row.innerHTML = `
-                        <td class="p-3">${item.id}</td>
-                        <td class="p-3">${item.patient_id}</td>
-                        <td class="p-3">${item.slot_id}</td>
-                        <td class="p-3">${item.booked_at}</td>
-                        <td class="p-3 flex space-x-2">
-                            <button onclick="openEditModal('${table}', ${item.id}, ${item.patient_id}, ${item.slot_id})" class="text-blue-600 hover:text-blue-800">
-                                <i class="fas fa-edit"></i>
-                            </button>
-                            <button onclick="deleteEntity(${item.id}, 'Appointment', '/${table}/delete')" class="text-red-600 hover:text-red-800">
-                                <i class="fas fa-trash"></i>
-                            </button>
-                        </td>
-                    `;
-                } else if (table === 'cancellations') {
-                    row.innerHTML = `
-                        <td class="p-3">${item.id}</td>
-                        <td class="p-3">${item.appointment_id}</td>
-                        <td class="p-3">${item.reason || ''}</td>
-                        <td class="p-3">${item.cancelled_at}</td>
-                        <td class="p-3 flex space-x-2">
-                            <button onclick="openEditModal('${table}', ${item.id}, ${item.appointment_id}, '${item.reason ? item.reason.replace(/'/g, "\\'") : ''}')" class="text-blue-600 hover:text-blue-800">
-                                <i class="fas fa-edit"></i>
-                            </button>
-                            <button onclick="deleteEntity(${item.id}, 'Cancellation', '/${table}/delete')" class="text-red-600 hover:text-red-800">
-                                <i class="fas fa-trash"></i>
-                            </button>
-                        </td>
-                    `;
-                }
+                const row = buildRow(table, item);
                 tableBody.appendChild(row);
             });
             if (noDataMessage) noDataMessage.remove();
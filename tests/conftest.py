@@ -0,0 +1,61 @@
+import pytest
+import pytest_asyncio
+from httpx import ASGITransport, AsyncClient
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from contextlib import contextmanager
+from main import app
+from db import database
+from services import metrics
+from services.cache import caches
+
+# A fresh SQLite file and empty caches per test; the app, its background tasks
+# and the tests all use that file
+@pytest_asyncio.fixture
+async def test_db(tmp_path):
+    previous = database.engine
+    engine = database.init_engine(f"sqlite:///{tmp_path / 'test.db'}")
+    database.init_db(engine)
+    for cache in caches.values():
+        cache.clear()
+    # next(test_db()) gives a session on the test database
+    yield database.get_db
+    engine.dispose()
+    database.engine = previous
+
+# Requests go through the app's lifespan, so the slot index and broadcast run as in production
+@pytest_asyncio.fixture
+async def client(test_db):
+    async with app.router.lifespan_context(app):
+        async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test", follow_redirects=True) as c:
+            yield c
+
+@pytest.fixture
+def query_budget():
+    """
+    Fail if app requests made inside the block issue more than `budget` SQL
+    statements. Statements from background tasks (broadcast polling, slot
+    index) are not counted. The failure lists every statement, so an N+1
+    pattern is obvious:
+
+        with query_budget(2):
+            await client.get("/doctors/list")
+    """
+    @contextmanager
+    def budget(max_statements):
+        statements = []
+
+        def record(conn, cursor, statement, parameters, context, executemany):
+            if metrics.in_request():
+                statements.append(statement)
+
+        event.listen(Engine, "before_cursor_execute", record)
+        try:
+            yield statements
+        finally:
+            event.remove(Engine, "before_cursor_execute", record)
+        assert len(statements) <= max_statements, (
+            f"{len(statements)} SQL statements, budget {max_statements}:\n" + "\n".join(statements)
+        )
+
+    return budget
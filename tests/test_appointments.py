@@ -3,17 +3,19 @@ import pytest_asyncio
 from httpx import AsyncClient
 from db import database
 from fastapi import status
-from datetime import date, time
+from datetime import date, datetime, time
 
 @pytest_asyncio.fixture
 async def setup_appointment(test_db):
     db = next(test_db())
     doctor = database.Doctor(name="Dr. Test", specialty="Cardiology")
     patient = database.Patient(name="Alice Test", email="alice@test.com")
+    db.add_all([doctor, patient])
+    db.flush()
     slot = database.AppointmentSlot(doctor_id=doctor.id, date=date(2025, 10, 18), start_time=time(10, 0), end_time=time(10, 30))
-    db.add_all([doctor, patient, slot])
+    db.add(slot)
     db.commit()
-    appointment = database.Appointment(patient_id=patient.id, slot_id=slot.id, booked_at="2025-10-18 10:00:00")
+    appointment = database.Appointment(patient_id=patient.id, slot_id=slot.id, booked_at=datetime(2025, 10, 18, 10, 0))
     db.add(appointment)
     db.commit()
     db.refresh(appointment)
@@ -34,7 +36,7 @@ async def test_list_appointments(client: AsyncClient, setup_appointment):
 
 @pytest.mark.asyncio
 async def test_create_appointment(client: AsyncClient, setup_appointment):
-    response = await client.post("/appointments", data={"patient_id": setup_appointment.patient_id, "slot_id": setup_appointment.slot_id})
+    response = await client.post("/appointments/", data={"patient_id": setup_appointment.patient_id, "slot_id": setup_appointment.slot_id})
     assert response.status_code == status.HTTP_200_OK
     assert response.json()["status"] == "success"
     assert response.json()["appointment_id"] > 0
@@ -49,4 +51,16 @@ async def test_update_appointment(client: AsyncClient, setup_appointment):
 async def test_delete_appointment(client: AsyncClient, setup_appointment):
     response = await client.post("/appointments/delete", data={"appointment_id": setup_appointment.id})
     assert response.status_code == status.HTTP_200_OK
-    assert response.json()["status"] == "success"
\ No newline at end of file
+    assert response.json()["status"] == "success"
+
+@pytest.mark.asyncio
+async def test_view_appointments(client: AsyncClient, setup_appointment):
+    response = await client.get("/appointments/view", params={"patient_id": setup_appointment.patient_id, "limit": 1})
+    assert response.status_code == status.HTTP_200_OK
+    item = response.json()["items"][0]
+    assert item["id"] == setup_appointment.id
+    assert item["patient_name"] == "Alice Test"
+    assert item["date"] == "2025-10-18"
+    assert item["cancelled"] is False
+    response = await client.get("/appointments/view", params={"cursor": "not-a-cursor"})
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
@@ -0,0 +1,115 @@
+import pytest
+import pytest_asyncio
+from httpx import AsyncClient
+from db import database
+from fastapi import status
+from datetime import date, time
+
+@pytest_asyncio.fixture
+async def setup_booking(test_db):
+    db = next(test_db())
+    doctor = database.Doctor(name="Dr. Test", specialty="Cardiology")
+    patient = database.Patient(name="Alice Test", email="alice@test.com")
+    db.add_all([doctor, patient])
+    db.commit()
+    slot = database.AppointmentSlot(doctor_id=doctor.id, date=date(2025, 10, 18), start_time=time(10, 0), end_time=time(10, 30), is_available=True)
+    db.add(slot)
+    db.commit()
+    db.refresh(slot)
+    yield {"patient_id": patient.id, "slot_id": slot.id}
+    db.query(database.Appointment).filter(database.Appointment.slot_id == slot.id).delete()
+    db.delete(slot)
+    db.delete(patient)
+    db.delete(doctor)
+    db.commit()
+
+@pytest.mark.asyncio
+async def test_book_appointment(client: AsyncClient, setup_booking):
+    response = await client.post("/booking/book-appointment", data=setup_booking)
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json()["status"] == "success"
+    assert response.json()["slot_id"] == setup_booking["slot_id"]
+
+@pytest.mark.asyncio
+async def test_book_taken_slot_rejected(client: AsyncClient, setup_booking):
+    first = await client.post("/booking/book-appointment", data=setup_booking)
+    second = await client.post("/booking/book-appointment", data=setup_booking)
+    assert first.status_code == status.HTTP_200_OK
+    assert second.status_code == status.HTTP_400_BAD_REQUEST
+    assert second.json()["detail"] == "Slot is no longer available"
+
+@pytest.mark.asyncio
+async def test_book_unknown_patient_releases_slot(client: AsyncClient, setup_booking):
+    response = await client.post("/booking/book-appointment", data={"patient_id": 999999, "slot_id": setup_booking["slot_id"]})
+    assert response.status_code == status.HTTP_404_NOT_FOUND
+    retry = await client.post("/booking/book-appointment", data=setup_booking)
+    assert retry.status_code == status.HTTP_200_OK
+
+@pytest.mark.asyncio
+async def test_capacity_analysis_tracks_bookings(client: AsyncClient, setup_booking):
+    doctor = await client.post("/doctors/", data={"name": "Dr. Capacity", "specialty": "Neurology"})
+    doctor_id = doctor.json()["doctor_id"]
+    slot = await client.post("/appointment_slots/", data={"doctor_id": doctor_id, "date": "2025-10-20", "start_time": "09:00", "end_time": "09:30"})
+    await client.post("/appointment_slots/", data={"doctor_id": doctor_id, "date": "2025-10-21", "start_time": "09:00", "end_time": "09:30"})
+    await client.post("/booking/book-appointment", data={"patient_id": setup_booking["patient_id"], "slot_id": slot.json()["slot_id"]})
+    response = await client.get("/booking/capacity-analysis", params={"start_date": "2025-10-20", "end_date": "2025-10-21"})
+    assert response.status_code == status.HTTP_200_OK
+    row = next(r for r in response.json() if r["doctor_id"] == doctor_id)
+    assert row["total_slots"] == 2
+    assert row["booked_slots"] == 1
+    assert row["available_slots"] == 1
+    assert row["confirmed_appointments"] == 1
+    assert row["utilization_rate"] == 50.0
+
+@pytest.mark.asyncio
+async def test_search_availability_cache_invalidated_by_booking(client: AsyncClient, setup_booking):
+    first = await client.get("/booking/search-availability", params={"specialty": "cardiology"})
+    cached = await client.get("/booking/search-availability", params={"specialty": "Cardiology"})
+    assert first.json() == cached.json()
+    stats = (await client.get("/booking/cache-stats")).json()["availability"]
+    assert stats["hits"] >= 1
+    await client.post("/booking/book-appointment", data=setup_booking)
+    after = await client.get("/booking/search-availability", params={"specialty": "cardiology"})
+    available = sum(r["available_slots"] for r in after.json())
+    assert available == sum(r["available_slots"] for r in first.json()) - 1
+
+@pytest.mark.asyncio
+async def test_next_available_follows_bookings(client: AsyncClient, setup_booking):
+    doctor = await client.post("/doctors/", data={"name": "Dr. Next", "specialty": "Oncology"})
+    doctor_id = doctor.json()["doctor_id"]
+    first = await client.post("/appointment_slots/", data={"doctor_id": doctor_id, "date": "2099-01-05", "start_time": "09:00", "end_time": "09:30"})
+    second = await client.post("/appointment_slots/", data={"doctor_id": doctor_id, "date": "2099-01-05", "start_time": "09:30", "end_time": "10:00"})
+    response = await client.get("/booking/next-available", params={"specialty": "oncology", "after": "2099-01-01"})
+    assert response.status_code == status.HTTP_200_OK
+    assert [s["slot_id"] for s in response.json()][:2] == [first.json()["slot_id"], second.json()["slot_id"]]
+    await client.post("/booking/book-appointment", data={"patient_id": setup_booking["patient_id"], "slot_id": first.json()["slot_id"]})
+    response = await client.get("/booking/next-available", params={"doctor_id": doctor_id, "after": "2099-01-01", "limit": 1})
+    assert response.json()[0]["slot_id"] == second.json()["slot_id"]
+
+@pytest.mark.asyncio
+async def test_book_batch_all_or_nothing(client: AsyncClient, setup_booking):
+    patient_id, slot_id = setup_booking["patient_id"], setup_booking["slot_id"]
+    failed = await client.post("/booking/book-batch", data={"bookings": f"{patient_id}:{slot_id},999999:{slot_id + 1000000}"})
+    assert failed.status_code == status.HTTP_400_BAD_REQUEST
+    errors = [r["error"] for r in failed.json()["detail"]["results"]]
+    assert errors == ["Not booked: another booking in the batch failed", "Slot not found"]
+    # Nothing was claimed, so the slot can still be booked
+    retry = await client.post("/booking/book-batch", data={"bookings": f"{patient_id}:{slot_id}"})
+    assert retry.status_code == status.HTTP_200_OK
+    assert retry.json()["results"][0]["status"] == "booked"
+
+@pytest.mark.asyncio
+async def test_book_batch_best_effort(client: AsyncClient, setup_booking):
+    patient_id, slot_id = setup_booking["patient_id"], setup_booking["slot_id"]
+    doctor = await client.post("/doctors/", data={"name": "Dr. Batch", "specialty": "Radiology"})
+    second = await client.post("/appointment_slots/", data={"doctor_id": doctor.json()["doctor_id"], "date": "2025-10-18", "start_time": "11:00", "end_time": "11:30"})
+    second_id = second.json()["slot_id"]
+    await client.post("/booking/book-appointment", data=setup_booking)
+    response = await client.post("/booking/book-batch", data={
+        "bookings": f"{patient_id}:{slot_id},{patient_id}:{second_id},{patient_id}:{second_id}",
+        "mode": "best_effort"
+    })
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json()["status"] == "partial"
+    assert [r["status"] for r in response.json()["results"]] == ["failed", "booked", "failed"]
+    assert response.json()["results"][0]["error"] == "Slot is no longer available"
@@ -0,0 +1,34 @@
+import asyncio
+import pytest
+from services.broadcast import UnixSocketBroadcast
+
+async def _next(queue):
+    return await asyncio.wait_for(queue.get(), 5)
+
+@pytest.mark.asyncio
+async def test_unix_socket_broadcast_relays_between_processes(tmp_path):
+    path = str(tmp_path / "bus.sock")
+    inboxes = [asyncio.Queue() for _ in range(3)]
+    buses = [UnixSocketBroadcast(inbox.put_nowait, path=path, catch_up=False) for inbox in inboxes]
+    for bus in buses:
+        await bus.start()
+        await bus.connected.wait()
+    hub, first, second = buses
+    assert hub.is_hub and not first.is_hub and not second.is_hub
+
+    change = (1, "doctors", "INSERT", 7, {"id": 7, "name": "Dr. Bus", "specialty": "Cardiology"})
+    first.publish([change])
+    # Every member, the sender included, gets the batch
+    for inbox in inboxes:
+        assert await _next(inbox) == [change]
+
+    # The hub goes away; a peer takes over and delivery carries on
+    await hub.stop()
+    await asyncio.sleep(0.5)
+    assert first.is_hub or second.is_hub
+    second.publish([(2, "doctors", "DELETE", 7, {"id": 7})])
+    assert (await _next(inboxes[1]))[0][2] == "DELETE"
+    assert (await _next(inboxes[2]))[0][2] == "DELETE"
+
+    for bus in (first, second):
+        await bus.stop()
@@ -0,0 +1,70 @@
+import pytest
+import pytest_asyncio
+import asyncio
+import json
+from httpx import AsyncClient
+from db import database
+from fastapi import status
+
+@pytest_asyncio.fixture
+async def setup_doctor(test_db):
+    db = next(test_db())
+    doctor = database.Doctor(name="Dr. Test", specialty="Cardiology")
+    db.add(doctor)
+    db.commit()
+    db.refresh(doctor)
+    yield doctor
+    db.query(database.Doctor).delete()
+    db.commit()
+
+@pytest.mark.asyncio
+async def test_export_doctors_ndjson(client: AsyncClient, setup_doctor):
+    response = await client.get("/bulk/doctors/export")
+    assert response.status_code == status.HTTP_200_OK
+    rows = [json.loads(line) for line in response.text.splitlines()]
+    assert {"id": setup_doctor.id, "name": "Dr. Test", "specialty": "Cardiology"} in rows
+
+@pytest.mark.asyncio
+async def test_export_doctors_csv(client: AsyncClient, setup_doctor):
+    response = await client.get("/bulk/doctors/export", params={"format": "csv"})
+    assert response.status_code == status.HTTP_200_OK
+    assert response.text.splitlines()[0] == "id,name,specialty"
+
+@pytest.mark.asyncio
+async def test_import_doctors_reports_bad_batch(client: AsyncClient, setup_doctor):
+    body = "name,specialty\nDr. Csv,Neurology\n,Missing Name\n"
+    response = await client.post("/bulk/doctors/import", params={"format": "csv"}, files={"file": ("doctors.csv", body)})
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json()["status"] == "partial"
+    assert response.json()["batches"][0]["error"].startswith("line 3: name")
+
+@pytest.mark.asyncio
+async def test_import_doctors_with_and_without_ids(client: AsyncClient, test_db):
+    lines = [
+        {"id": 600, "name": "Dr. Explicit", "specialty": "Neurology"},
+        {"name": "Dr. Generated", "specialty": "Neurology"},
+        {"id": 602, "name": "Dr. Explicit Too", "specialty": "Neurology"},
+    ]
+    body = "\n".join(json.dumps(line) for line in lines)
+    response = await client.post("/bulk/doctors/import", files={"file": ("doctors.ndjson", body)})
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json()["imported"] == 3
+    db = next(test_db())
+    ids = {d.name: d.id for d in db.query(database.Doctor)}
+    assert ids["Dr. Explicit"] == 600 and ids["Dr. Explicit Too"] == 602
+    assert ids["Dr. Generated"] not in (600, 602)
+
+@pytest.mark.asyncio
+async def test_imported_slots_reach_next_available(client: AsyncClient, test_db):
+    doctor = await client.post("/doctors/", data={"name": "Dr. Imported", "specialty": "Oncology"})
+    doctor_id = doctor.json()["doctor_id"]
+    body = json.dumps({"doctor_id": doctor_id, "date": "2099-03-02", "start_time": "09:00", "end_time": "09:30"})
+    response = await client.post("/bulk/appointment_slots/import", files={"file": ("slots.ndjson", body)})
+    assert response.json()["imported"] == 1
+    # The slot index re-reads the doctor in a background task, not in the import request
+    for _ in range(50):
+        slots = (await client.get("/booking/next-available", params={"doctor_id": doctor_id, "after": "2099-03-01"})).json()
+        if slots:
+            break
+        await asyncio.sleep(0.02)
+    assert [(s["date"], s["start_time"]) for s in slots] == [("2099-03-02", "09:00:00")]
@@ -3,17 +3,23 @@ import pytest_asyncio
 from httpx import AsyncClient
 from db import database
 from fastapi import status
-from datetime import date, time
+from datetime import date, datetime, time
 
 @pytest_asyncio.fixture
 async def setup_cancellation(test_db):
     db = next(test_db())
     doctor = database.Doctor(name="Dr. Test", specialty="Cardiology")
     patient = database.Patient(name="Alice Test", email="alice@test.com")
+    db.add_all([doctor, patient])
+    db.flush()
     slot = database.AppointmentSlot(doctor_id=doctor.id, date=date(2025, 10, 18), start_time=time(10, 0), end_time=time(10, 30))
-    appointment = database.Appointment(patient_id=patient.id, slot_id=slot.id, booked_at="2025-10-18 10:00:00")
-    cancellation = database.Cancellation(appointment_id=appointment.id, reason="No show", cancelled_at="2025-10-18 10:00:00")
-    db.add_all([doctor, patient, slot, appointment, cancellation])
+    db.add(slot)
+    db.flush()
+    appointment = database.Appointment(patient_id=patient.id, slot_id=slot.id, booked_at=datetime(2025, 10, 18, 10, 0))
+    db.add(appointment)
+    db.flush()
+    cancellation = database.Cancellation(appointment_id=appointment.id, reason="No show", cancelled_at=datetime(2025, 10, 18, 10, 0))
+    db.add(cancellation)
     db.commit()
     db.refresh(cancellation)
     yield cancellation
@@ -33,11 +39,19 @@ async def test_list_cancellations(client: AsyncClient, setup_cancellation):
     assert response.json()[0]["reason"] == "No show"
 
 @pytest.mark.asyncio
-async def test_create_cancellation(client: AsyncClient, setup_cancellation):
-    response = await client.post("/cancellations", data={"appointment_id": setup_cancellation.appointment_id, "reason": "Patient request"})
+async def test_create_cancellation(client: AsyncClient, test_db, setup_cancellation):
+    # The fixture's appointment is already cancelled; rebook its slot and cancel that
+    db = next(test_db())
+    cancelled = db.get(database.Appointment, setup_cancellation.appointment_id)
+    appointment = database.Appointment(patient_id=cancelled.patient_id, slot_id=cancelled.slot_id, booked_at=datetime(2025, 10, 18, 11, 0))
+    db.add(appointment)
+    db.commit()
+    response = await client.post("/cancellations/", data={"appointment_id": appointment.id, "reason": "Patient request"})
     assert response.status_code == status.HTTP_200_OK
     assert response.json()["status"] == "success"
     assert response.json()["cancellation_id"] > 0
+    again = await client.post("/cancellations/", data={"appointment_id": appointment.id, "reason": "Patient request"})
+    assert again.status_code == status.HTTP_400_BAD_REQUEST
 
 @pytest.mark.asyncio
 async def test_update_cancellation(client: AsyncClient, setup_cancellation):
@@ -49,4 +63,22 @@ async def test_update_cancellation(client: AsyncClient, setup_cancellation):
 async def test_delete_cancellation(client: AsyncClient, setup_cancellation):
     response = await client.post("/cancellations/delete", data={"cancellation_id": setup_cancellation.id})
     assert response.status_code == status.HTTP_200_OK
-    assert response.json()["status"] == "success"
\ No newline at end of file
+    assert response.json()["status"] == "success"
+
+@pytest.mark.asyncio
+async def test_analytics_refresh_after_cancellation_change(client: AsyncClient, setup_cancellation):
+    before = await client.get("/cancellations/analytics")
+    assert before.status_code == status.HTTP_200_OK
+    assert before.json()["total_cancellations"] >= 1
+    await client.post("/cancellations/delete", data={"cancellation_id": setup_cancellation.id})
+    after = await client.get("/cancellations/analytics")
+    assert after.json()["total_cancellations"] == before.json()["total_cancellations"] - 1
+
+@pytest.mark.asyncio
+async def test_trends_and_patterns(client: AsyncClient, setup_cancellation):
+    trends = await client.get("/cancellations/trends")
+    patterns = await client.get("/cancellations/patterns")
+    assert trends.status_code == status.HTTP_200_OK
+    assert patterns.status_code == status.HTTP_200_OK
+    assert {"daily_trends", "by_day_of_week"} <= trends.json().keys()
+    assert any(r["reason"] == "No show" for r in patterns.json()["top_reasons"])
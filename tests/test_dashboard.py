@@ -0,0 +1,33 @@
+import pytest
+import pytest_asyncio
+from httpx import AsyncClient
+from db import database
+from fastapi import status
+
+@pytest_asyncio.fixture
+async def setup_dashboard(test_db):
+    db = next(test_db())
+    doctor = database.Doctor(name="Dr. Test", specialty="Cardiology")
+    patient = database.Patient(name="Alice Test", email="alice@test.com")
+    db.add_all([doctor, patient])
+    db.commit()
+    yield {"doctor_id": doctor.id, "patient_id": patient.id}
+    db.delete(patient)
+    db.delete(doctor)
+    db.commit()
+
+@pytest.mark.asyncio
+async def test_dashboard_summary(client: AsyncClient, setup_dashboard):
+    response = await client.get("/dashboard/summary", params={"recent": 3})
+    assert response.status_code == status.HTTP_200_OK
+    summary = response.json()
+    assert summary["counts"]["doctors"] >= 1
+    assert summary["counts"]["patients"] >= 1
+    assert {"total_slots", "available_slots", "booked_slots", "by_period"} <= summary["today"].keys()
+    assert len(summary["recent_appointments"]) <= 3
+    assert any(s["specialty"] == "Cardiology" for s in summary["specialties"])
+
+@pytest.mark.asyncio
+async def test_dashboard_summary_rejects_large_recent(client: AsyncClient):
+    response = await client.get("/dashboard/summary", params={"recent": 1000})
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
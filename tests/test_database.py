@@ -0,0 +1,32 @@
+import os
+import subprocess
+import sys
+from sqlalchemy import inspect
+from db import database
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def test_importing_the_app_does_not_touch_the_database(tmp_path):
+    path = tmp_path / "app.db"
+    env = dict(os.environ, DATABASE_URL=f"sqlite:///{path}")
+    subprocess.run([sys.executable, "-c", "import main; from db import database; assert database.engine is None"],
+                   cwd=ROOT, env=env, check=True)
+    assert not path.exists()
+
+def test_init_engine_swaps_the_database_sessions_use(tmp_path, monkeypatch):
+    monkeypatch.setattr(database, "engine", None)
+    first = database.init_engine(f"sqlite:///{tmp_path / 'first.db'}")
+    database.init_db()
+    assert "doctors" in inspect(first).get_table_names()
+    with database.SessionLocal() as db:
+        db.add(database.Doctor(name="Dr. First", specialty="Cardiology"))
+        db.commit()
+
+    second = database.init_engine(f"sqlite:///{tmp_path / 'second.db'}")
+    database.init_db()
+    with database.SessionLocal() as db:
+        assert db.get_bind() is second
+        assert db.query(database.Doctor).count() == 0
+    # Up to date: nothing to create or migrate
+    assert database.init_db() == []
+    second.dispose()
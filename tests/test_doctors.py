@@ -3,6 +3,7 @@ import pytest_asyncio
 from httpx import AsyncClient
 from db import database
 from fastapi import status
+from sqlalchemy import event
 
 @pytest_asyncio.fixture
 async def setup_doctor(test_db):
@@ -25,7 +26,7 @@ async def test_list_doctors(client: AsyncClient, setup_doctor):
 
 @pytest.mark.asyncio
 async def test_create_doctor(client: AsyncClient):
-    response = await client.post("/doctors", data={"name": "Dr. New", "specialty": "Neurology"})
+    response = await client.post("/doctors/", data={"name": "Dr. New", "specialty": "Neurology"})
     assert response.status_code == status.HTTP_200_OK
     assert response.json()["status"] == "success"
     assert response.json()["doctor_id"] > 0
@@ -40,4 +41,49 @@ async def test_update_doctor(client: AsyncClient, setup_doctor):
 async def test_delete_doctor(client: AsyncClient, setup_doctor):
     response = await client.post("/doctors/delete", data={"doctor_id": setup_doctor.id})
     assert response.status_code == status.HTTP_200_OK
-    assert response.json()["status"] == "success"
\ No newline at end of file
+    assert response.json()["status"] == "success"
+
+@pytest.mark.asyncio
+async def test_list_doctors_not_modified(client: AsyncClient, setup_doctor):
+    response = await client.get("/doctors/list")
+    etag = response.headers["ETag"]
+    response = await client.get("/doctors/list", headers={"If-None-Match": etag})
+    assert response.status_code == status.HTTP_304_NOT_MODIFIED
+    await client.post("/doctors/update", data={"doctor_id": setup_doctor.id, "name": "Dr. Renamed", "specialty": "Cardiology"})
+    response = await client.get("/doctors/list", headers={"If-None-Match": etag})
+    assert response.status_code == status.HTTP_200_OK
+    assert response.headers["ETag"] != etag
+
+@pytest.mark.asyncio
+async def test_list_doctors_etag_moves_when_a_lower_change_id_commits_late(client: AsyncClient, test_db, setup_doctor):
+    # Concurrent transactions can commit their change rows out of id order
+    db = next(test_db())
+    latest = db.query(database.Change.id).order_by(database.Change.id.desc()).limit(1).scalar() or 0
+    db.add(database.Change(id=latest + 2, table_name="doctors", action="UPDATE", record_id=setup_doctor.id))
+    db.commit()
+    etag = (await client.get("/doctors/list")).headers["ETag"]
+    db.add(database.Change(id=latest + 1, table_name="doctors", action="UPDATE", record_id=setup_doctor.id))
+    db.commit()
+    response = await client.get("/doctors/list", headers={"If-None-Match": etag})
+    assert response.status_code == status.HTTP_200_OK
+
+def _enforce_foreign_keys(dbapi_connection, connection_record):
+    dbapi_connection.execute("PRAGMA foreign_keys=ON")
+
+@pytest.mark.asyncio
+async def test_delete_doctor_after_slots_with_foreign_keys(client: AsyncClient, setup_doctor):
+    # MySQL always enforces foreign keys; make SQLite do the same
+    engine = database.get_engine()
+    event.listen(engine, "connect", _enforce_foreign_keys)
+    engine.dispose()
+    response = await client.post("/appointment_slots/", data={"doctor_id": setup_doctor.id, "date": "2030-01-07", "start_time": "09:00", "end_time": "09:30"})
+    assert response.status_code == status.HTTP_200_OK
+    slot_id = response.json()["slot_id"]
+    # A doctor who still has slots can't be deleted
+    response = await client.post("/doctors/delete", data={"doctor_id": setup_doctor.id})
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+    response = await client.post("/appointment_slots/delete", data={"slot_id": slot_id})
+    assert response.status_code == status.HTTP_200_OK
+    # ...but once they're gone, no capacity rows are left to block it
+    response = await client.post("/doctors/delete", data={"doctor_id": setup_doctor.id})
+    assert response.status_code == status.HTTP_200_OK
@@ -0,0 +1,16 @@
+import pytest
+from httpx import AsyncClient
+from fastapi import status
+
+@pytest.mark.asyncio
+async def test_metrics_report_route_latency_and_queries(client: AsyncClient):
+    await client.get("/doctors/list")
+    response = await client.get("/metrics")
+    assert response.status_code == status.HTTP_200_OK
+    assert response.headers["content-type"].startswith("text/plain")
+    body = response.text
+    assert 'http_requests_total{method="GET",route="/doctors/list",status="200"}' in body
+    assert 'http_request_duration_seconds_count{method="GET",route="/doctors/list"}' in body
+    assert 'http_request_db_queries_bucket{method="GET",route="/doctors/list",le="+Inf"}' in body
+    assert "db_pool_checkouts_total" in body
+    assert 'websocket_queue_depth{table="doctors"}' in body
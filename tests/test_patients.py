@@ -25,7 +25,7 @@ async def test_list_patients(client: AsyncClient, setup_patient):
 
 @pytest.mark.asyncio
 async def test_create_patient(client: AsyncClient):
-    response = await client.post("/patients", data={"name": "Bob New", "email": "bob@test.com"})
+    response = await client.post("/patients/", data={"name": "Bob New", "email": "bob@test.com"})
     assert response.status_code == status.HTTP_200_OK
     assert response.json()["status"] == "success"
     assert response.json()["patient_id"] > 0
@@ -0,0 +1,24 @@
+import pytest
+from sqlalchemy import create_engine, exc
+from db import pool
+
+def test_metered_pool_counts_checkouts_and_timeouts(tmp_path):
+    engine = create_engine(
+        f"sqlite:///{tmp_path / 'pool.db'}",
+        poolclass=pool.MeteredQueuePool,
+        pool_size=1,
+        max_overflow=0,
+        pool_timeout=0.1
+    )
+    before = pool.metrics.snapshot()
+    held = engine.connect()
+    assert pool.stats(engine.pool)["checked_out"] == 1
+    with pytest.raises(exc.TimeoutError):
+        engine.connect()
+    held.close()
+    after = pool.stats(engine.pool)
+    assert after["checked_out"] == 0
+    assert after["checkouts"] == before["checkouts"] + 1
+    assert after["timeouts"] == before["timeouts"] + 1
+    assert after["wait_seconds_max"] >= 0.1
+    engine.dispose()
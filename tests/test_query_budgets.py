@@ -0,0 +1,84 @@
+import pytest
+import pytest_asyncio
+from httpx import AsyncClient
+from db import database
+from fastapi import status
+from datetime import date, datetime, time
+
+# Enough rows that a query per row (N+1) blows every budget below
+ROWS = 5
+
+@pytest_asyncio.fixture
+async def setup_clinic(test_db):
+    """
+    ROWS doctors, each with a booked slot (id 2i-1) and a free slot (id 2i),
+    ROWS patients, one appointment per booked slot and a cancellation for
+    every appointment except the first.
+    """
+    db = next(test_db())
+    for i in range(1, ROWS + 1):
+        db.add(database.Doctor(id=i, name=f"Dr. Budget {i}", specialty="Cardiology"))
+        db.add(database.Patient(id=i, name=f"Patient {i}", email=f"patient{i}@test.com"))
+        db.add(database.AppointmentSlot(id=2 * i - 1, doctor_id=i, date=date(2030, 1, 7), start_time=time(9, 0), end_time=time(9, 30), is_available=False))
+        db.add(database.AppointmentSlot(id=2 * i, doctor_id=i, date=date(2030, 1, 8), start_time=time(9, 0), end_time=time(9, 30), is_available=True))
+        db.add(database.Appointment(id=i, patient_id=i, slot_id=2 * i - 1, booked_at=datetime(2029, 12, 1, 10, 0)))
+        if i > 1:
+            db.add(database.Cancellation(appointment_id=i, reason="Budget", cancelled_at=datetime(2029, 12, 2, 10, 0)))
+    db.commit()
+    yield db
+    db.close()
+
+# GET path -> max SQL statements per request, independent of ROWS
+READ_BUDGETS = [
+    ("/doctors/list", 2),
+    ("/doctors/list?limit=2", 2),
+    ("/patients/list", 2),
+    ("/appointment_slots/list", 2),
+    ("/appointment_slots/list?limit=2", 2),
+    ("/appointments/list", 2),
+    ("/appointments/list?limit=2", 2),
+    ("/appointments/view", 2),
+    ("/appointments/view-stats", 5),
+    ("/appointments/check-cancellation/2", 1),
+    ("/cancellations/list", 2),
+    ("/cancellations/list?limit=2", 2),
+    ("/cancellations/analytics", 4),
+    ("/cancellations/trends", 2),
+    ("/cancellations/patterns", 2),
+    ("/dashboard/summary", 14),
+    ("/booking/search-availability?specialty=Cardiology", 1),
+    ("/booking/doctor-slots/1", 1),
+    ("/booking/capacity-analysis", 1),
+    ("/booking/next-available?specialty=Cardiology", 0),
+    ("/bulk/appointment_slots/export", 1),
+]
+
+# (POST path, form data) -> max SQL statements per request
+WRITE_BUDGETS = [
+    ("/doctors/", {"name": "Dr. New", "specialty": "Neurology"}, 3),
+    ("/doctors/delete", {"doctor_id": 1}, 4),
+    ("/appointments/", {"patient_id": 1, "slot_id": 2}, 7),
+    ("/booking/book-appointment", {"patient_id": 2, "slot_id": 4}, 7),
+    # Same statements however many pairs
+    ("/booking/book-batch", {"bookings": "3:8,4:10"}, 6),
+    ("/appointments/update", {"appointment_id": 1, "patient_id": 1, "slot_id": 6}, 14),
+    ("/appointments/cancel", {"appointment_id": 1, "reason": "Budget"}, 9),
+    ("/appointments/delete", {"appointment_id": 1}, 8),
+    ("/appointment_slots/delete", {"slot_id": 2}, 6),
+    ("/appointment_slots/generate", {"doctor_id": 1, "start_date": "2030-02-04", "end_date": "2030-02-08", "day_end": "12:00"}, 6),
+]
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("path,budget", READ_BUDGETS)
+async def test_read_query_budget(client: AsyncClient, setup_clinic, query_budget, path, budget):
+    with query_budget(budget):
+        response = await client.get(path)
+    assert response.status_code == status.HTTP_200_OK
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("path,data,budget", WRITE_BUDGETS)
+async def test_write_query_budget(client: AsyncClient, setup_clinic, query_budget, path, data, budget):
+    with query_budget(budget):
+        response = await client.post(path, data=data)
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json()["status"] == "success"
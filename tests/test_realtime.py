@@ -0,0 +1,81 @@
+import asyncio
+import json
+import pytest
+from services.realtime import WebSocketManager
+
+class FakeSocket:
+    def __init__(self, stalled=False):
+        self.sent = []
+        self.closed = False
+        self.unblock = asyncio.Event()
+        if not stalled:
+            self.unblock.set()
+
+    async def accept(self):
+        pass
+
+    async def send_text(self, message):
+        await self.unblock.wait()
+        self.sent.append(message)
+
+    async def close(self, code=1000):
+        self.closed = True
+
+async def _settle():
+    await asyncio.sleep(0.01)
+
+@pytest.mark.asyncio
+async def test_slow_client_does_not_hold_up_others():
+    manager = WebSocketManager(queue_size=3, overflow="coalesce")
+    fast, slow = FakeSocket(), FakeSocket(stalled=True)
+    await manager.connect(fast, "doctors")
+    await manager.connect(slow, "doctors")
+    for i in range(10):
+        manager.broadcast("doctors", f"m{i}")
+        await _settle()
+    assert fast.sent == [f"m{i}" for i in range(10)]
+    # The slow client's backlog collapsed into one REFRESH, then newer messages
+    slow.unblock.set()
+    await _settle()
+    assert slow.sent[0] == "m0" and slow.sent[-1] == "m9" and len(slow.sent) <= 4
+    assert {"table": "doctors", "action": "REFRESH"} in [json.loads(m) for m in slow.sent if m[0] == "{"]
+    assert manager.stats["doctors"]["coalesced"] >= 1
+
+@pytest.mark.asyncio
+async def test_overflow_policies_drop_oldest_and_disconnect():
+    manager = WebSocketManager(queue_size=2, overflow="drop-oldest")
+    slow = FakeSocket(stalled=True)
+    await manager.connect(slow, "doctors")
+    for i in range(5):
+        manager.broadcast("doctors", f"m{i}")
+        await _settle()
+    slow.unblock.set()
+    await _settle()
+    # m0 was already being sent; m1 and m2 were dropped
+    assert slow.sent == ["m0", "m3", "m4"]
+    assert manager.stats["doctors"]["dropped"] == 2
+
+    manager = WebSocketManager(queue_size=2, overflow="disconnect")
+    slow = FakeSocket(stalled=True)
+    await manager.connect(slow, "doctors")
+    for i in range(4):
+        manager.broadcast("doctors", f"m{i}")
+    await _settle()
+    assert slow.closed and not manager.has_subscribers("doctors")
+    assert manager.stats["doctors"]["disconnects"] == {"overflow": 1}
+
+@pytest.mark.asyncio
+async def test_failed_send_prunes_connection():
+    manager = WebSocketManager(send_timeout=0.05)
+    broken, stalled = FakeSocket(), FakeSocket(stalled=True)
+
+    async def fail(message):
+        raise ConnectionResetError()
+    broken.send_text = fail
+    await manager.connect(broken, "doctors")
+    await manager.connect(stalled, "doctors")
+    manager.broadcast("doctors", "m0")
+    await asyncio.sleep(0.2)
+    assert broken.closed and stalled.closed
+    assert not manager.has_subscribers("doctors")
+    assert manager.stats["doctors"]["disconnects"] == {"send_error": 1, "timeout": 1}
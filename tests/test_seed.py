@@ -0,0 +1,42 @@
+from sqlalchemy import create_engine, select, func
+from datetime import date, datetime, time
+from db import database, seed
+
+OPTIONS = dict(doctors=10, patients=50, slots=2000, as_of=date(2025, 6, 2))
+
+def test_generate_is_deterministic():
+    first = list(seed.generate(seed.default_options(**OPTIONS)))
+    second = list(seed.generate(seed.default_options(**OPTIONS)))
+    other = list(seed.generate(seed.default_options(seed=7, **OPTIONS)))
+    assert first == second
+    assert first != other
+    assert sum(1 for table, _ in first if table == "appointment_slots") == 2000
+
+def test_generated_timelines_are_consistent():
+    rows = list(seed.generate(seed.default_options(**OPTIONS)))
+    now = datetime.combine(OPTIONS["as_of"], time(12, 0))
+    slots = {r["id"]: r for table, r in rows if table == "appointment_slots"}
+    appointments = {r["id"]: r for table, r in rows if table == "appointments"}
+    cancellations = [r for table, r in rows if table == "cancellations"]
+    assert appointments and cancellations
+    for appointment in appointments.values():
+        slot = slots[appointment["slot_id"]]
+        assert appointment["booked_at"] <= min(datetime.combine(slot["date"], slot["start_time"]), now)
+    for cancellation in cancellations:
+        appointment = appointments[cancellation["appointment_id"]]
+        slot = slots[appointment["slot_id"]]
+        assert appointment["booked_at"] <= cancellation["cancelled_at"] <= now
+        # Cancelling released the slot
+        assert slot["is_available"]
+
+def test_load_inserts_rows_and_rebuilds_rollup(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'seed.db'}")
+    database.Base.metadata.create_all(engine)
+    counts, _ = seed.load(engine, seed.default_options(**OPTIONS))
+    with engine.connect() as conn:
+        assert seed.existing_rows(conn) == counts
+        assert conn.execute(select(func.sum(database.DoctorDayCapacity.total_slots))).scalar() == 2000
+    # Same rows as the ORM would write, dates and times included
+    with database.SessionLocal(bind=engine) as db:
+        slot = db.get(database.AppointmentSlot, 1)
+        assert isinstance(slot.date, date) and isinstance(slot.start_time, time)
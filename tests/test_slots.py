@@ -47,4 +47,35 @@ async def test_update_slot(client: AsyncClient, setup_slot):
 async def test_delete_slot(client: AsyncClient, setup_slot):
     response = await client.post("/appointment_slots/delete", data={"slot_id": setup_slot.id})
     assert response.status_code == status.HTTP_200_OK
-    assert response.json()["status"] == "success"
\ No newline at end of file
+    assert response.json()["status"] == "success"
+
+@pytest.mark.asyncio
+async def test_list_slots_paginated(client: AsyncClient, setup_slot):
+    response = await client.get("/appointment_slots/list", params={"doctor_id": setup_slot.doctor_id, "limit": 1, "fields": "id,date"})
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json()["items"] == [{"id": setup_slot.id, "date": "2025-10-18"}]
+    assert response.json()["next_cursor"] is None
+
+@pytest.mark.asyncio
+async def test_list_slots_streamed_projection(client: AsyncClient, setup_slot):
+    response = await client.get("/appointment_slots/list", params={"doctor_id": setup_slot.doctor_id, "fields": "id,is_available"})
+    assert response.status_code == status.HTTP_200_OK
+    assert response.headers["content-type"] == "application/json"
+    assert response.json() == [{"id": setup_slot.id, "is_available": True}]
+
+@pytest.mark.asyncio
+async def test_generate_slots_from_template(client: AsyncClient, setup_slot):
+    response = await client.post("/appointment_slots/generate", data={
+        "doctor_id": setup_slot.doctor_id,
+        "start_date": "2025-10-13",
+        "end_date": "2025-10-19",
+        "weekdays": "mon,tue,wed,thu,fri,sat",
+        "day_start": "09:00",
+        "day_end": "11:00",
+        "slot_minutes": 30,
+        "skip_dates": "2025-10-14"
+    })
+    assert response.status_code == status.HTTP_200_OK
+    # 5 working days x 4 slots, minus the 10:00 slot that overlaps the existing one on the 18th
+    assert response.json()["created"] == 19
+    assert response.json()["skipped_overlaps"] == 1